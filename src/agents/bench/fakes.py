@@ -0,0 +1,187 @@
+"""ベンチマーク用の外部依存の代替（Bedrock のチャットモデル・Tavily）と差し込み処理。
+
+Titan 埋め込みと S3 Vectors は toddler-rag/rag/fakes.py の FakeBedrock / FakeS3Vectors を使う。
+install_fakes() は Strands の既定モデル（BedrockModel）と rag.aws の共有クライアントを差し替えるので、
+各エージェントのモジュールを import する前に呼ぶこと。
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from strands.models.model import Model
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TODDLER_RAG_DIR = os.path.join(AGENTS_DIR, "toddler-rag")
+if TODDLER_RAG_DIR not in sys.path:
+    sys.path.append(TODDLER_RAG_DIR)
+
+from rag.aws import REGION, set_client  # noqa: E402
+from rag.fakes import FakeBedrock, FakeS3Vectors, fake_embedding  # noqa: E402
+
+# 最初のターンで呼ぶツール（見つかった最初のもの）。オーケストレータは並列ファンアウトを優先する
+DEFAULT_TOOL_PREFERENCE = ("ask_agents_parallel", "search_toddler_index", "web_search")
+_WORDS = ["ぶーぶ", "わんわん", "まんま", "ねんね", "くっく", "にゃんにゃん", "ないない", "あんよ", "です", "ね"]
+
+
+class FakeChatModel(Model):
+    """トークン速度と初回トークンまでの遅延を指定できる Strands モデル。
+
+    ツールがあれば最初のターンで 1 回だけ呼び（必須の文字列引数にはユーザーの発話を入れる）、
+    ツール結果を受け取ったら回答テキストを tokens_per_sec の速度で流す。
+    """
+
+    def __init__(self, first_token_latency: float = 0.3, tokens_per_sec: float = 50.0, output_tokens: int = 40,
+                 tool_preference: Sequence[str] = DEFAULT_TOOL_PREFERENCE, seed: Optional[int] = None, **config: Any):
+        self.config = {
+            "model_id": "fake",
+            "first_token_latency": first_token_latency,
+            "tokens_per_sec": tokens_per_sec,
+            "output_tokens": output_tokens,
+            **config,
+        }
+        self.tool_preference = tuple(tool_preference)
+        self._rng = random.Random(seed)
+
+    def update_config(self, **model_config: Any) -> None:
+        self.config.update(model_config)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.config
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        raise NotImplementedError("FakeChatModel does not support structured output")
+
+    @staticmethod
+    def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+        for message in reversed(messages):
+            if message.get("role") != "user":
+                continue
+            texts = [block["text"] for block in message.get("content", []) if "text" in block]
+            if texts:
+                return " ".join(texts)
+        return ""
+
+    def _pick_tool(self, tool_specs: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        by_name = {spec["name"]: spec for spec in tool_specs or []}
+        for name in self.tool_preference:
+            if name in by_name:
+                return by_name[name]
+        return None
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        started = time.perf_counter()
+        last = messages[-1] if messages else {}
+        answered_tool = any("toolResult" in block for block in last.get("content", []))
+        tool = None if answered_tool else self._pick_tool(tool_specs)
+        input_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+        await asyncio.sleep(self.config["first_token_latency"])
+        yield {"messageStart": {"role": "assistant"}}
+        if tool is not None:
+            schema = tool.get("inputSchema", {}).get("json", {})
+            text = self._last_user_text(messages)
+            arguments = {
+                name: text
+                for name in schema.get("required", [])
+                if schema.get("properties", {}).get(name, {}).get("type") == "string"
+            }
+            tool_use_id = f"tooluse_{self._rng.getrandbits(48):012x}"
+            yield {"contentBlockStart": {"start": {"toolUse": {"toolUseId": tool_use_id, "name": tool["name"]}}}}
+            yield {"contentBlockDelta": {"delta": {"toolUse": {"input": json.dumps(arguments, ensure_ascii=False)}}}}
+            yield {"contentBlockStop": {}}
+            yield {"messageStop": {"stopReason": "tool_use"}}
+            output_tokens = 20
+        else:
+            interval = 1.0 / self.config["tokens_per_sec"] if self.config["tokens_per_sec"] > 0 else 0.0
+            for i in range(self.config["output_tokens"]):
+                if i and interval:
+                    await asyncio.sleep(interval)
+                yield {"contentBlockDelta": {"delta": {"text": self._rng.choice(_WORDS)}}}
+            yield {"contentBlockStop": {}}
+            yield {"messageStop": {"stopReason": "end_turn"}}
+            output_tokens = self.config["output_tokens"]
+        yield {
+            "metadata": {
+                "usage": {"inputTokens": input_tokens, "outputTokens": output_tokens,
+                          "totalTokens": input_tokens + output_tokens},
+                "metrics": {"latencyMs": int((time.perf_counter() - started) * 1000)},
+            }
+        }
+
+
+class FakeTavily:
+    """TavilyClient.search の代替。"""
+
+    def __init__(self, latency: float = 0.3, results: int = 8, seed: int = 0):
+        self.latency = latency
+        self.results = results
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def search(self, query: str, max_results: int = 5, **kwargs: Any) -> Dict[str, Any]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return {
+            "query": query,
+            "results": [
+                {
+                    "title": f"{query} - result {i}",
+                    "url": f"https://example.com/{abs(hash(query)) % 1000}/{i}",
+                    "content": f"{query} について。" + "".join(self._rng.choice(_WORDS) for _ in range(60)),
+                    "score": 1.0 - i / (self.results + 1),
+                }
+                for i in range(min(max_results, self.results))
+            ],
+        }
+
+
+def seed_index(s3vectors: FakeS3Vectors, bucket: str, index: str, count: int = 200, dimension: int = 1024) -> None:
+    """検索が空にならないよう、幼児語っぽいテキストのベクトルを入れておく。"""
+    vectors = []
+    for i in range(count):
+        text = f"{_WORDS[i % len(_WORDS)]} {i}"
+        vectors.append({
+            "key": f"bench-{i}",
+            "data": {"float32": fake_embedding(text, dimension)},
+            "metadata": {"source_text": text, "source_file": "bench.pdf", "page_number": 1, "chunk_number": i},
+        })
+    for start in range(0, len(vectors), 500):
+        s3vectors.put_vectors(vectorBucketName=bucket, indexName=index, vectors=vectors[start:start + 500])
+
+
+def install_fakes(
+    first_token_latency: float = 0.3,
+    tokens_per_sec: float = 50.0,
+    output_tokens: int = 40,
+    embed_latency: float = 0.02,
+    vector_latency: float = 0.01,
+    seed_vectors: int = 200,
+) -> Dict[str, Any]:
+    """Strands の BedrockModel と rag.aws の bedrock-runtime / s3vectors クライアントを代替に差し替える。"""
+    import strands.agent.agent
+    import strands.models
+    import strands.models.bedrock
+
+    def fake_bedrock_model(*args: Any, **kwargs: Any) -> FakeChatModel:
+        return FakeChatModel(first_token_latency, tokens_per_sec, output_tokens)
+
+    for module in (strands.agent.agent, strands.models, strands.models.bedrock):
+        module.BedrockModel = fake_bedrock_model
+
+    dimension = int(os.getenv("EMBED_DIMENSIONS", 1024))
+    bedrock = FakeBedrock(dimension=dimension, latency=embed_latency)
+    s3vectors = FakeS3Vectors(latency=vector_latency, dimension=dimension)
+    seed_index(
+        s3vectors,
+        os.getenv("VECTOR_BUCKET_NAME", "tollder-vector-bucket"),
+        os.getenv("VECTOR_INDEX_NAME", "tollder-index"),
+        seed_vectors,
+        dimension,
+    )
+    set_client("bedrock-runtime", bedrock, os.getenv("AWS_REGION", REGION))
+    set_client("s3vectors", s3vectors, os.getenv("AWS_REGION", REGION))
+    return {"bedrock": bedrock, "s3vectors": s3vectors}
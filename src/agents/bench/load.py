@@ -0,0 +1,232 @@
+"""main エージェントのストリーミング API への負荷試験。
+
+/stream, /stream_sse などに同時実行数を指定してリクエストを送り、
+最初の本文バイトまでの時間 (TTFB)・完了までの時間の p50/p95/p99 と RPS を出す。
+--start を付けると serve.py で web_search / toddler_rag / main を代替の依存つきで起動し、終了時に止める。
+
+例:
+    python src/agents/bench/load.py --start --concurrency 16 --requests 200
+    python src/agents/bench/load.py --url http://localhost:8000 --token $API_TOKENS --endpoints stream_sse
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BENCH_DIR)
+
+from report import format_table, summarize  # noqa: E402
+
+DEFAULT_PROMPTS = ["ぶーぶ", "わんわんいた", "まんまたべる", "ねんねする", "くっくはく", "にゃんにゃんどこ"]
+# SSE / NDJSON の keep-alive は本文ではないので TTFB に数えない
+HEARTBEATS = (b": ping", b'{"type": "heartbeat"}', b'{"type":"heartbeat"}')
+# serve.py で起動するときの A2A エージェントのポート（main の A2A_AGENTS の既定値と同じ）
+AGENT_PORTS = {"web_search": 9000, "toddler_rag": 9001}
+
+
+@dataclass
+class Sample:
+    endpoint: str
+    status: int
+    ttfb: Optional[float]
+    total: float
+    bytes: int
+    error: Optional[str] = None
+
+
+def is_heartbeat(chunk: bytes) -> bool:
+    lines = [line.strip() for line in chunk.split(b"\n") if line.strip()]
+    return bool(lines) and all(line.startswith(HEARTBEATS) for line in lines)
+
+
+async def one_request(client: httpx.AsyncClient, endpoint: str, prompt: str, cache_bypass: bool) -> Sample:
+    headers = {"X-Cache-Bypass": "1"} if cache_bypass else {}
+    started = time.perf_counter()
+    ttfb = None
+    size = 0
+    try:
+        async with client.stream("POST", f"/{endpoint}", json={"prompt": prompt}, headers=headers) as response:
+            async for chunk in response.aiter_raw():
+                if ttfb is None and chunk and not is_heartbeat(chunk):
+                    ttfb = time.perf_counter() - started
+                size += len(chunk)
+            error = None if response.status_code == 200 else f"HTTP {response.status_code}"
+            return Sample(endpoint, response.status_code, ttfb, time.perf_counter() - started, size, error)
+    except httpx.HTTPError as e:
+        return Sample(endpoint, 0, ttfb, time.perf_counter() - started, size, f"{type(e).__name__}: {e}")
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    prompts: List[str],
+    concurrency: int,
+    requests: int,
+    duration: Optional[float],
+    cache_bypass: bool,
+) -> Dict[str, object]:
+    """concurrency 本のワーカーで requests 件（duration 指定時はその秒数）を送る。"""
+    samples: List[Sample] = []
+    issued = 0
+    started = time.perf_counter()
+
+    def next_index() -> Optional[int]:
+        nonlocal issued
+        if duration is not None:
+            if time.perf_counter() - started >= duration:
+                return None
+        elif issued >= requests:
+            return None
+        issued += 1
+        return issued - 1
+
+    async def worker() -> None:
+        while (i := next_index()) is not None:
+            samples.append(await one_request(client, endpoint, prompts[i % len(prompts)], cache_bypass))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    ok = [s for s in samples if s.error is None]
+    ttfb = summarize([s.ttfb for s in ok if s.ttfb is not None])
+    total = summarize([s.total for s in ok])
+    errors = [s.error for s in samples if s.error is not None]
+    return {
+        "endpoint": endpoint,
+        "requests": len(samples),
+        "errors": len(errors),
+        "rps": len(ok) / wall if wall > 0 else 0.0,
+        "ttfb_p50": ttfb["p50"],
+        "ttfb_p95": ttfb["p95"],
+        "ttfb_p99": ttfb["p99"],
+        "total_p50": total["p50"],
+        "total_p95": total["p95"],
+        "total_p99": total["p99"],
+        "kb_per_req": sum(s.bytes for s in ok) / len(ok) / 1024 if ok else 0.0,
+        "error_samples": sorted(set(errors))[:5],
+    }
+
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as sock:
+            sock.settimeout(0.5)
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"port {port} did not open within {timeout:.0f}s")
+
+
+def start_stack(port: int, env: Dict[str, str], timeout: float) -> List[subprocess.Popen]:
+    """A2A エージェント 2 つを立ち上げてから main を起動する（main の起動時ディスカバリを成功させるため）。"""
+    serve = os.path.join(BENCH_DIR, "serve.py")
+    procs = []
+    try:
+        for name, agent_port in AGENT_PORTS.items():
+            procs.append(subprocess.Popen([sys.executable, serve, name, "--port", str(agent_port)], env=env))
+        for agent_port in AGENT_PORTS.values():
+            wait_for_port(agent_port, timeout)
+        procs.append(subprocess.Popen([sys.executable, serve, "main", "--port", str(port)], env=env))
+        wait_for_port(port, timeout)
+    except Exception:
+        stop_stack(procs)
+        raise
+    return procs
+
+
+def stop_stack(procs: List[subprocess.Popen]) -> None:
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def run(args: argparse.Namespace, prompts: List[str]) -> List[Dict[str, object]]:
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=args.timeout) as client:
+        if args.warmup:
+            await asyncio.gather(*(one_request(client, e, prompts[0], args.cache_bypass) for e in args.endpoints))
+        return [
+            await run_endpoint(
+                client, endpoint, prompts, args.concurrency, args.requests, args.duration, args.cache_bypass
+            )
+            for endpoint in args.endpoints
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the streaming endpoints of the main agent")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default=os.getenv("API_TOKENS", "bench"))
+    parser.add_argument("--endpoints", nargs="+", default=["stream", "stream_sse"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="エンドポイントごとのリクエスト数")
+    parser.add_argument("--duration", type=float, help="指定するとリクエスト数の代わりにこの秒数だけ流す")
+    parser.add_argument("--prompts", help="1 行 1 プロンプトのファイル")
+    parser.add_argument("--cache-bypass", action="store_true", help="回答キャッシュを使わない (X-Cache-Bypass)")
+    parser.add_argument("--warmup", action="store_true", help="計測前に各エンドポイントへ 1 回ずつ送る")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="結果を JSON で書き出すパス")
+    parser.add_argument("--start", action="store_true", help="serve.py で代替の依存つきスタックを起動する")
+    parser.add_argument("--start-timeout", type=float, default=60)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--output-tokens", type=int, default=40)
+    parser.add_argument("--embed-ms", type=float, default=20)
+    parser.add_argument("--vector-ms", type=float, default=10)
+    parser.add_argument("--tavily-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    if args.prompts:
+        with open(args.prompts, "r", encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    else:
+        prompts = DEFAULT_PROMPTS
+
+    procs: List[subprocess.Popen] = []
+    if args.start:
+        port = httpx.URL(args.url).port or 8000
+        env = {
+            **os.environ,
+            "API_TOKENS": args.token,
+            "BENCH_FIRST_TOKEN_MS": str(args.first_token_ms),
+            "BENCH_TOKENS_PER_SEC": str(args.tokens_per_sec),
+            "BENCH_OUTPUT_TOKENS": str(args.output_tokens),
+            "BENCH_EMBED_MS": str(args.embed_ms),
+            "BENCH_VECTOR_MS": str(args.vector_ms),
+            "BENCH_TAVILY_MS": str(args.tavily_ms),
+        }
+        procs = start_stack(port, env, args.start_timeout)
+    try:
+        results = asyncio.run(run(args, prompts))
+    finally:
+        stop_stack(procs)
+
+    columns = ["endpoint", "requests", "errors", "rps", "ttfb_p50", "ttfb_p95", "ttfb_p99",
+               "total_p50", "total_p95", "total_p99", "kb_per_req"]
+    print(f"concurrency={args.concurrency} (latencies in seconds)")
+    print(format_table(results, columns))
+    for result in results:
+        for error in result["error_samples"]:
+            print(f"  {result['endpoint']}: {error}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"concurrency": args.concurrency, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""代替の依存を使ったマイクロベンチ。
+
+    python src/agents/bench/micro.py ingest   # scripts/embedding.py の抽出〜埋め込み〜登録
+    python src/agents/bench/micro.py search   # toddler-rag の search_toddler_index（埋め込みキャッシュのヒット/ミス別）
+
+Bedrock / S3 Vectors の遅延は --embed-ms / --vector-ms で与える。
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+TODDLER_RAG_DIR = os.path.join(os.path.dirname(BENCH_DIR), "toddler-rag")
+sys.path.append(BENCH_DIR)
+
+from fakes import install_fakes  # noqa: E402
+from report import format_table, summarize  # noqa: E402
+
+SEARCH_PROMPTS = ["ぶーぶ", "わんわん", "まんま", "ねんね", "くっく", "にゃんにゃん", "ないない", "あんよ"]
+
+
+def load_script(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_ingest(args: argparse.Namespace) -> None:
+    """一時ディレクトリのマニフェスト・字句インデックスで、毎回全件（--full 相当）を登録する。"""
+    workdir = tempfile.mkdtemp(prefix="bench-ingest-")
+    os.environ["MANIFEST_PATH"] = os.path.join(workdir, "index_manifest.json")
+    os.environ["LEXICAL_INDEX_PATH"] = os.path.join(workdir, "lexical_index.json")
+    fakes = install_fakes(embed_latency=args.embed_ms / 1000, vector_latency=args.vector_ms / 1000, seed_vectors=0)
+    sys.path.append(TODDLER_RAG_DIR)
+    embedding = load_script(os.path.join(TODDLER_RAG_DIR, "scripts", "embedding.py"), "bench_embedding")
+    embedding.pdf_dir = args.pdf_dir
+
+    rows = []
+    for run in range(args.runs):
+        started = time.perf_counter()
+        stats = embedding.main(bedrock=fakes["bedrock"], s3vectors=fakes["s3vectors"], full=True)
+        elapsed = time.perf_counter() - started
+        if stats is None:
+            return
+        rows.append({
+            "run": run + 1,
+            "chunks": stats.uploaded,
+            "wall_s": elapsed,
+            "chunks_per_s": stats.uploaded / elapsed if elapsed > 0 else 0.0,
+            "embed_calls": fakes["bedrock"].calls,
+        })
+        fakes["bedrock"].calls = 0
+    print(f"\ningest (embed {args.embed_ms:.0f}ms, vector {args.vector_ms:.0f}ms, EMBED_MAX_RPS={embedding.EMBED_MAX_RPS})")
+    print(format_table(rows, ["run", "chunks", "wall_s", "chunks_per_s", "embed_calls"]))
+
+
+def load_toddler_agent():
+    """toddler-rag/agent.py を読み込む（import だけではサーバもクライアントも作られない）。"""
+    sys.path.insert(0, TODDLER_RAG_DIR)
+    return load_script(os.path.join(TODDLER_RAG_DIR, "agent.py"), "bench_toddler_agent")
+
+
+def timed_calls(fn: Callable[[str], Any], prompts: List[str]) -> List[float]:
+    samples = []
+    for prompt in prompts:
+        started = time.perf_counter()
+        fn(prompt)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def concurrent_tool_calls(tool: Callable, prompts: List[str], concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(prompt: str) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            await tool(prompt)
+            samples.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(p) for p in prompts))
+    return samples
+
+
+def bench_search(args: argparse.Namespace) -> None:
+    os.environ.setdefault("VECTOR_BACKEND", "s3")
+    install_fakes(embed_latency=args.embed_ms / 1000, vector_latency=args.vector_ms / 1000)
+    agent = load_toddler_agent()
+    find_similar = agent.find_similar
+    embed_cache = agent.embed_cache.get()
+
+    # 1 回目は埋め込みキャッシュのミス、2 回目以降はヒット
+    misses = [f"{SEARCH_PROMPTS[i % len(SEARCH_PROMPTS)]} {i}" for i in range(args.iterations)]
+    rows = [{"case": "find_similar miss", **summarize(timed_calls(find_similar, misses))}]
+    rows.append({"case": "find_similar hit", **summarize(timed_calls(find_similar, misses))})
+
+    tool = agent.search_toddler_index
+    prompts = [f"{SEARCH_PROMPTS[i % len(SEARCH_PROMPTS)]} tool {i}" for i in range(args.iterations)]
+    started = time.perf_counter()
+    samples = asyncio.run(concurrent_tool_calls(tool, prompts, args.concurrency))
+    wall = time.perf_counter() - started
+    rows.append({"case": f"tool x{args.concurrency} miss", **summarize(samples), "ops_per_s": len(samples) / wall})
+
+    print(f"search_toddler_index (embed {args.embed_ms:.0f}ms, vector {args.vector_ms:.0f}ms; seconds)")
+    print(format_table(rows, ["case", "p50", "p95", "p99", "mean", "max", "ops_per_s"]))
+    print(f"embed cache: {embed_cache.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro benchmarks for ingest and toddler search with fake AWS")
+    parser.add_argument("target", choices=["ingest", "search"])
+    parser.add_argument("--embed-ms", type=float, default=20)
+    parser.add_argument("--vector-ms", type=float, default=10)
+    parser.add_argument("--runs", type=int, default=1, help="ingest: 全件登録の繰り返し回数")
+    parser.add_argument("--pdf-dir", default=os.path.join(TODDLER_RAG_DIR, "pdf"))
+    parser.add_argument("--iterations", type=int, default=200, help="search: ケースごとの呼び出し回数")
+    parser.add_argument("--concurrency", type=int, default=8, help="search: ツール呼び出しの同時実行数")
+    args = parser.parse_args()
+
+    if args.target == "ingest":
+        bench_ingest(args)
+    else:
+        bench_search(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""ベンチ結果の集計（パーセンタイル）と表示。"""
+import math
+from typing import Dict, Iterable, List, Sequence
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: Sequence[float], p: float) -> float:
+    """最近傍順位法のパーセンタイル（サンプルが空なら NaN）。"""
+    if not samples:
+        return math.nan
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    summary = {f"p{p}": percentile(samples, p) for p in PERCENTILES}
+    summary["mean"] = sum(samples) / len(samples) if samples else math.nan
+    summary["max"] = max(samples) if samples else math.nan
+    return summary
+
+
+def format_table(rows: Iterable[Dict[str, object]], columns: List[str]) -> str:
+    """数値は小数 3 桁（秒なら ms 単位の精度）に揃えた固定幅の表にする。"""
+    def cell(value: object) -> str:
+        if isinstance(value, float):
+            return "-" if math.isnan(value) else f"{value:.3f}"
+        return str(value)
+
+    body = [[cell(row.get(c, "")) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in body)) if body else len(c) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(r, widths)) for r in body]
+    return "\n".join(lines)
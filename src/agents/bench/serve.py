@@ -0,0 +1,93 @@
+"""代替の依存（fakes.py）を差し込んだ状態で各エージェントを起動する。
+
+使い方:
+    python src/agents/bench/serve.py web_search --port 9000
+    python src/agents/bench/serve.py toddler_rag --port 9001
+    python src/agents/bench/serve.py main --port 8000
+
+モデル・外部 API の遅延は BENCH_* 環境変数で調整する（load.py --start はこれを子プロセスに渡す）。
+"""
+import argparse
+import os
+import runpy
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENTS_DIR = os.path.dirname(BENCH_DIR)
+REPO_ROOT = os.path.dirname(os.path.dirname(AGENTS_DIR))
+sys.path.append(BENCH_DIR)
+
+from fakes import FakeTavily, install_fakes  # noqa: E402
+
+FIRST_TOKEN_MS = float(os.getenv("BENCH_FIRST_TOKEN_MS", 300))
+TOKENS_PER_SEC = float(os.getenv("BENCH_TOKENS_PER_SEC", 50))
+OUTPUT_TOKENS = int(os.getenv("BENCH_OUTPUT_TOKENS", 40))
+EMBED_MS = float(os.getenv("BENCH_EMBED_MS", 20))
+VECTOR_MS = float(os.getenv("BENCH_VECTOR_MS", 10))
+TAVILY_MS = float(os.getenv("BENCH_TAVILY_MS", 300))
+SEED_VECTORS = int(os.getenv("BENCH_SEED_VECTORS", 200))
+# ベンチ用の既定値（実環境の .env より優先する）
+BENCH_ENV = {
+    "API_TOKENS": "bench",
+    "VECTOR_BACKEND": "s3",
+    "ANSWER_CACHE_ENABLED": "false",
+    "AGENT_CARD_CACHE_PATH": os.path.join(BENCH_DIR, ".agent_cards.json"),
+}
+
+AGENTS = ("main", "web_search", "toddler_rag")
+DEFAULT_PORTS = {"main": 8000, "web_search": 9000, "toddler_rag": 9001}
+
+
+def serve_web_search(port: int) -> None:
+    os.environ["WEB_SEARCH_PORT"] = str(port)
+    agent_dir = os.path.join(AGENTS_DIR, "web_search")
+    sys.path[:0] = [agent_dir, AGENTS_DIR]
+    import tools.web_search
+
+    tools.web_search._client = FakeTavily(latency=TAVILY_MS / 1000)
+    runpy.run_path(os.path.join(agent_dir, "agent.py"), run_name="__main__")
+
+
+def serve_toddler_rag(port: int) -> None:
+    os.environ["TODDLER_RAG_PORT"] = str(port)
+    agent_dir = os.path.join(AGENTS_DIR, "toddler-rag")
+    sys.path.insert(0, agent_dir)
+    runpy.run_path(os.path.join(agent_dir, "agent.py"), run_name="__main__")
+
+
+def serve_main(port: int) -> None:
+    import uvicorn
+
+    sys.path.insert(0, REPO_ROOT)
+    from src.agents.main.agent import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run an agent against fake Bedrock / S3 Vectors / Tavily")
+    parser.add_argument("agent", choices=AGENTS)
+    parser.add_argument("--port", type=int, help="既定は main 8000 / web_search 9000 / toddler_rag 9001")
+    args = parser.parse_args()
+
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    install_fakes(
+        first_token_latency=FIRST_TOKEN_MS / 1000,
+        tokens_per_sec=TOKENS_PER_SEC,
+        output_tokens=OUTPUT_TOKENS,
+        embed_latency=EMBED_MS / 1000,
+        vector_latency=VECTOR_MS / 1000,
+        seed_vectors=SEED_VECTORS,
+    )
+    port = args.port or DEFAULT_PORTS[args.agent]
+    if args.agent == "web_search":
+        serve_web_search(port)
+    elif args.agent == "toddler_rag":
+        serve_toddler_rag(port)
+    else:
+        serve_main(port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""エントリポイントごとの起動時間の内訳。
+
+新しいプロセスで python -X importtime のもと agent モジュールを import し、create_app() と warm-up を実行して
+  - import / create_app / warm-up それぞれの時間と、warm-up の段階ごとの時間（common.startup.StartupTimer）
+  - 起動全体で import にかかった時間のトップレベルパッケージ別の内訳（遅延 import も含む、self 時間の合計）
+を表示する。--fakes を付けると Bedrock / S3 Vectors / Tavily を代替に差し替える（AWS の資格情報なしで動く）。
+このとき strands は代替の差し込みで先に読まれるので、import 内訳には出るが段階ごとの時間には入らない。
+
+    python src/agents/bench/startup.py --fakes
+    python src/agents/bench/startup.py main --top 15
+"""
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENTS_DIR = os.path.dirname(BENCH_DIR)
+REPO_ROOT = os.path.dirname(os.path.dirname(AGENTS_DIR))
+AGENT_FILES = {
+    "web_search": os.path.join(AGENTS_DIR, "web_search", "agent.py"),
+    "toddler_rag": os.path.join(AGENTS_DIR, "toddler-rag", "agent.py"),
+}
+AGENTS = ("main", *AGENT_FILES)
+# "import time: self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def load_agent(name: str) -> Any:
+    if name == "main":
+        sys.path.insert(0, REPO_ROOT)
+        return importlib.import_module("src.agents.main.agent")
+    path = AGENT_FILES[name]
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location(f"{name}_agent", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(name: str, fakes: bool) -> Dict[str, Any]:
+    """子プロセス側: import → create_app → warm-up を順に実行して計測する。"""
+    if fakes:
+        sys.path.append(BENCH_DIR)
+        from fakes import FakeTavily, install_fakes
+
+        install_fakes(first_token_latency=0.0, embed_latency=0.0, vector_latency=0.0)
+    started = time.perf_counter()
+    module = load_agent(name)
+    imported = time.perf_counter()
+    if name != "main":
+        module.create_app()
+    created = time.perf_counter()
+    if fakes and name == "web_search":
+        import tools.web_search
+
+        tools.web_search._client = FakeTavily(latency=0.0)
+    module.warm_up(module.startup, module.warm_up_steps())
+    finished = time.perf_counter()
+    return {
+        "import": imported - started,
+        "create_app": created - imported,
+        "warm_up": finished - created,
+        "total": finished - started,
+        "phases": module.startup.as_dict()["phases"],
+    }
+
+
+def import_breakdown(stderr: str) -> List[Tuple[str, float]]:
+    """-X importtime の出力を、トップレベルのパッケージごとの self 時間（秒）にまとめる。"""
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            totals[match.group(3).split(".")[0]] += int(match.group(1)) / 1e6
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def profile(name: str, fakes: bool) -> Tuple[Dict[str, Any], List[Tuple[str, float]]]:
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), name, "--child"]
+    if fakes:
+        command.append("--fakes")
+    proc = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"{name} failed to start:\n{tail}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), import_breakdown(proc.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report where agent startup time goes")
+    parser.add_argument("agents", nargs="*", help=f"{', '.join(AGENTS)}（既定はすべて）")
+    parser.add_argument("--fakes", action="store_true", help="Bedrock / S3 Vectors / Tavily を代替に差し替える")
+    parser.add_argument("--top", type=int, default=10, help="表示する import 内訳の件数")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = [name for name in args.agents if name not in AGENTS]
+    if unknown:
+        parser.error(f"unknown agent: {', '.join(unknown)}")
+    args.agents = args.agents or list(AGENTS)
+
+    if args.child:
+        print(json.dumps(measure(args.agents[0], args.fakes)))
+        return
+
+    for name in args.agents:
+        timings, imports = profile(name, args.fakes)
+        print(
+            f"== {name}: total {timings['total']:.3f}s "
+            f"(import {timings['import']:.3f}s, create_app {timings['create_app']:.3f}s, "
+            f"warm-up {timings['warm_up']:.3f}s)"
+        )
+        for label, seconds in sorted(timings["phases"].items(), key=lambda item: -item[1]):
+            print(f"  {label:<28} {seconds:7.3f}s")
+        total_import = sum(seconds for _, seconds in imports)
+        print(f"  imports over the whole startup: {total_import:.3f}s (-X importtime overhead included)")
+        for package, seconds in imports[:args.top]:
+            print(f"    {package:<26} {seconds:7.3f}s  {seconds / total_import:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""リクエストのデッドライン伝播とヘッジ呼び出し。
+
+- HTTP の入口（DeadlineMiddleware）でデッドラインを決め、contextvars で下流の処理・ツールへ伝える
+- A2A 呼び出しでは残り時間を X-Request-Timeout-Ms ヘッダで渡す（時計のずれを避けるため相対値）
+- 外向きの呼び出しは残り時間をタイムアウトにする。冪等な呼び出しは p95 を超えたら
+  同じ呼び出しをもう 1 本投げ、先に返った方を使う（ヘッジ）
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, TypeVar
+
+from .metrics import OUTBOUND_DURATION
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """残り秒数。デッドラインがなければ None。"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def timeout_for(default: Optional[float] = None) -> Optional[float]:
+    """外向き呼び出しに使うタイムアウト（default と残り時間の小さい方）。期限切れなら例外。"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return left if default is None else min(default, left)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """seconds 後をデッドラインにする（既存のデッドラインより延ばすことはない）。"""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_headers() -> Dict[str, str]:
+    left = remaining()
+    if left is None:
+        return {}
+    return {DEADLINE_HEADER: str(max(0, int(left * 1000)))}
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(0.0, float(value) / 1000) if value else None
+    except ValueError:
+        return None
+
+
+async def with_deadline(events: AsyncIterator[T]) -> AsyncIterator[T]:
+    """非同期イテレータを残り時間で打ち切る（期限切れは DeadlineExceeded）。"""
+    iterator = events.__aiter__()
+    try:
+        while True:
+            # wait_for と違って新しいタスクを作らず、その場でキャンセルする（イテレータ内の contextvars が保たれる）。
+            # yield の間は計らないよう、1 要素ごとに残り時間で掛け直す
+            scope = asyncio.timeout(timeout_for())
+            try:
+                async with scope:
+                    item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            except TimeoutError:
+                if not scope.expired():
+                    raise
+                raise DeadlineExceeded("request deadline exceeded") from None
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+async def httpx_deadline_hook(request: Any) -> None:
+    """httpx.AsyncClient の request フック。残り時間をタイムアウトとヘッダに反映する。"""
+    left = timeout_for()
+    if left is None:
+        return
+    request.headers.update(deadline_headers())
+    current = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        key: left if current.get(key) is None else min(current[key], left)
+        for key in ("connect", "read", "write", "pool")
+    }
+
+
+class DeadlineMiddleware:
+    """ASGI ミドルウェア。ヘッダ（なければ default_timeout）からリクエストのデッドラインを設定する。
+
+    enforce=True ならデッドラインでリクエスト処理自体を打ち切り、応答前なら 504 を返す。
+    """
+
+    def __init__(self, app: Any, default_timeout: float = 120.0, max_timeout: Optional[float] = None,
+                 exempt_paths: tuple = (), enforce: bool = False):
+        self.app = app
+        self.default_timeout = default_timeout
+        self.max_timeout = max_timeout
+        self.exempt_paths = exempt_paths
+        self.enforce = enforce
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope.get("path") in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        timeout = parse_timeout(headers.get(DEADLINE_HEADER.lower()))
+        if timeout is None:
+            timeout = self.default_timeout
+        if self.max_timeout is not None:
+            timeout = min(timeout, self.max_timeout)
+        with deadline_scope(timeout):
+            if not self.enforce:
+                await self.app(scope, receive, send)
+                return
+            started = False
+
+            async def tracking_send(message: Dict[str, Any]) -> None:
+                nonlocal started
+                started = True
+                await send(message)
+
+            try:
+                await asyncio.wait_for(self.app(scope, receive, tracking_send), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Deadline of {timeout:.1f}s exceeded: {scope.get('path')}")
+                if not started:
+                    await send({"type": "http.response.start", "status": 504,
+                                "headers": [(b"content-type", b"text/plain; charset=utf-8")]})
+                    await send({"type": "http.response.body", "body": b"Deadline exceeded"})
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class Hedger:
+    """同期の外向き呼び出しをデッドライン付きで実行し、必要ならヘッジする。
+
+    ヘッジの遅延は直近の成功レイテンシの quantile（既定 p95）。サンプルが min_samples 未満の間はヘッジしない。
+    fn は冪等であること（2 本とも実行されうる）。
+    timeout には呼び出し先のタイムアウト（boto3 クライアントの read_timeout など）と同じ値を渡す。
+    hedge=False で、リクエストの残り時間が timeout 以上ならスレッドを挟まずその場で呼ぶ（打ち切りは呼び出し先に任せる）。
+    残り時間の方が短いときはスレッドプールで実行して残り時間だけ待ち、過ぎたら DeadlineExceeded にする。
+    """
+
+    def __init__(self, name: str, hedge: bool = False, quantile: float = 0.95, min_delay: float = 0.05,
+                 min_samples: int = 20, executor: Optional[ThreadPoolExecutor] = None):
+        self.name = name
+        self.hedge = hedge
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latency = LatencyTracker()
+        self.executor = executor or _executor()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    def _delay(self) -> Optional[float]:
+        if not self.hedge or len(self.latency) < self.min_samples:
+            return None
+        p = self.latency.quantile(self.quantile)
+        return None if p is None else max(self.min_delay, p)
+
+    def _submit(self, fn: Callable[[], T]):
+        # スレッドプールに渡すとコンテキストが引き継がれないため明示的にコピーする
+        ctx = contextvars.copy_context()
+        start = time.perf_counter()
+
+        def run() -> T:
+            result = ctx.run(fn)
+            self.latency.record(time.perf_counter() - start)
+            return result
+
+        return self.executor.submit(run)
+
+    def call(self, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = self._call(fn, timeout)
+            status = "ok"
+            return result
+        except DeadlineExceeded:
+            status = "timeout"
+            raise
+        finally:
+            OUTBOUND_DURATION.observe(time.perf_counter() - started, target=self.name, status=status)
+
+    def _call(self, fn: Callable[[], T], timeout: Optional[float]) -> T:
+        try:
+            budget = timeout_for(timeout)
+        except DeadlineExceeded:
+            self.deadline_exceeded += 1
+            raise
+        self.calls += 1
+        if not self.hedge and (budget is None or (timeout is not None and budget >= timeout)):
+            start = time.perf_counter()
+            result = fn()
+            self.latency.record(time.perf_counter() - start)
+            return result
+        started = time.monotonic()
+        futures = [self._submit(fn)]
+        delay = self._delay()
+        if delay is not None and (budget is None or delay < budget):
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                self.hedged += 1
+                futures.append(self._submit(fn))
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            left = None if budget is None else budget - (time.monotonic() - started)
+            if left is not None and left <= 0:
+                break
+            done, pending = wait(pending, timeout=left, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        self.deadline_exceeded += 1
+        raise DeadlineExceeded(f"{self.name}: no response within {budget:.2f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.quantile(0.95)
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+_shared_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    # 期限切れで見捨てた呼び出しがスレッドを占有し続けても枯渇しにくいよう、大きめに取る
+    global _shared_executor
+    with _executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="outbound")
+        return _shared_executor
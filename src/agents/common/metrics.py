@@ -0,0 +1,422 @@
+"""段階ごとのレイテンシ計測、Prometheus 形式の /metrics、トレース ID の伝播。
+
+- ヒストグラム・カウンタはプロセス内で集計し、MetricsMiddleware が GET /metrics でテキスト形式を返す
+  （サービス名・インスタンスはスクレイプ側のラベルで付く前提なので、ここでは付けない）
+- MetricsMiddleware は X-Trace-Id（なければ traceparent、どちらもなければ新規）を contextvars に入れ、
+  応答ヘッダにも返す。A2A などの外向き httpx 呼び出しは httpx_metrics_hooks で同じ ID を付けて送る
+- Strands のエージェントには AgentMetricsHooks を渡すと、ツール・モデル呼び出しの時間とトークン数を記録する
+"""
+import contextvars
+import logging
+import math
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    # strands の import は重いので、フックの登録時（エージェント生成時）まで遅らせる
+    from strands.hooks import (
+        AfterInvocationEvent,
+        AfterModelCallEvent,
+        AfterToolCallEvent,
+        BeforeInvocationEvent,
+        BeforeModelCallEvent,
+        BeforeToolCallEvent,
+        HookRegistry,
+    )
+
+logger = logging.getLogger(__name__)
+
+TRACE_HEADER = "X-Trace-Id"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_TRACEPARENT = re.compile(r"^[0-9a-f]{2}-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}$")
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+@contextmanager
+def trace_scope(trace_id: Optional[str] = None) -> Iterator[str]:
+    trace_id = trace_id or new_trace_id()
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def trace_headers() -> Dict[str, str]:
+    trace_id = _trace_id.get()
+    return {TRACE_HEADER: trace_id} if trace_id else {}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        # ラベル値の組 -> [各バケットの件数..., 合計, 件数]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            for bound, value in zip(self.buckets, series):
+                labels = _format_labels(self.labels, key, 'le="' + _format_value(bound) + '"')
+                lines.append(f"{self.name}_bucket{labels} {_format_value(value)}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {_format_value(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS,
+                  labels: Sequence[str] = ()) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help, buckets, labels))
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help, labels))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request duration until the response body is complete.",
+    labels=("method", "path", "status"),
+)
+HTTP_RESPONSE_BYTES = REGISTRY.histogram(
+    "http_response_bytes", "HTTP response body size.", BYTES_BUCKETS, labels=("method", "path"),
+)
+STREAM_TTFT = REGISTRY.histogram(
+    "stream_time_to_first_token_seconds", "Time from request start to the first text chunk.", labels=("route",),
+)
+STREAM_DURATION = REGISTRY.histogram(
+    "stream_duration_seconds", "Total duration of a streamed answer.", labels=("route", "outcome"),
+)
+STREAM_TEXT_BYTES = REGISTRY.histogram(
+    "stream_text_bytes", "UTF-8 bytes of answer text per stream.", BYTES_BUCKETS, labels=("route",),
+)
+TOOL_DURATION = REGISTRY.histogram(
+    "agent_tool_duration_seconds", "Duration of one tool call (sub-agent tools included).", labels=("tool", "status"),
+)
+MODEL_CALL_DURATION = REGISTRY.histogram(
+    "agent_model_call_duration_seconds", "Duration of one model call in the agent loop.", labels=("status",),
+)
+INVOCATION_TOKENS = REGISTRY.histogram(
+    "agent_invocation_tokens", "Model tokens used by one agent invocation.", TOKEN_BUCKETS, labels=("kind",),
+)
+TOKENS_TOTAL = REGISTRY.counter("agent_tokens_total", "Model tokens used.", labels=("kind",))
+OUTBOUND_DURATION = REGISTRY.histogram(
+    "outbound_request_duration_seconds",
+    "Outbound call latency (Bedrock embeddings, vector queries, Tavily, A2A hops).",
+    labels=("target", "status"),
+)
+
+
+async def instrument_stream(events: AsyncIterator[Dict[str, Any]], route: str,
+                            started: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+    """StreamEvent の列を流しながら、最初のテキストまでの時間・全体の時間・テキスト量を記録する。"""
+    started = time.perf_counter() if started is None else started
+    first = True
+    size = 0
+    outcome = "error"
+    try:
+        async for event in events:
+            if event.get("type") == "text":
+                if first:
+                    first = False
+                    STREAM_TTFT.observe(time.perf_counter() - started, route=route)
+                size += len(event["text"].encode("utf-8"))
+            yield event
+        outcome = "ok"
+    except GeneratorExit:
+        # クライアント切断などで途中で閉じられた
+        outcome = "cancelled"
+        raise
+    finally:
+        STREAM_DURATION.observe(time.perf_counter() - started, route=route, outcome=outcome)
+        STREAM_TEXT_BYTES.observe(size, route=route)
+
+
+def _usage(agent: Any) -> Dict[str, int]:
+    metrics = getattr(agent, "event_loop_metrics", None)
+    return dict(getattr(metrics, "accumulated_usage", None) or {})
+
+
+class AgentMetricsHooks:
+    """Strands の Agent(hooks=[...]) に渡す（HookProvider プロトコル）。1 インスタンスを複数のエージェントで共有してよい。"""
+
+    def __init__(self):
+        self._started: Dict[Any, float] = {}
+        self._usage: Dict[int, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def register_hooks(self, registry: "HookRegistry", **kwargs: Any) -> None:
+        from strands.hooks import (
+            AfterInvocationEvent,
+            AfterModelCallEvent,
+            AfterToolCallEvent,
+            BeforeInvocationEvent,
+            BeforeModelCallEvent,
+            BeforeToolCallEvent,
+        )
+
+        registry.add_callback(BeforeInvocationEvent, self._before_invocation)
+        registry.add_callback(AfterInvocationEvent, self._after_invocation)
+        registry.add_callback(BeforeModelCallEvent, self._before_model)
+        registry.add_callback(AfterModelCallEvent, self._after_model)
+        registry.add_callback(BeforeToolCallEvent, self._before_tool)
+        registry.add_callback(AfterToolCallEvent, self._after_tool)
+
+    def _start(self, key: Any) -> None:
+        with self._lock:
+            self._started[key] = time.perf_counter()
+
+    def _elapsed(self, key: Any) -> Optional[float]:
+        with self._lock:
+            started = self._started.pop(key, None)
+        return None if started is None else time.perf_counter() - started
+
+    def _before_invocation(self, event: "BeforeInvocationEvent") -> None:
+        # accumulated_usage はエージェントの生存期間の累計なので、呼び出し前の値との差を取る
+        with self._lock:
+            self._usage[id(event.agent)] = _usage(event.agent)
+
+    def _after_invocation(self, event: "AfterInvocationEvent") -> None:
+        with self._lock:
+            before = self._usage.pop(id(event.agent), {})
+        after = _usage(event.agent)
+        for kind, field in (("input", "inputTokens"), ("output", "outputTokens")):
+            used = after.get(field, 0) - before.get(field, 0)
+            if used > 0:
+                INVOCATION_TOKENS.observe(used, kind=kind)
+                TOKENS_TOTAL.inc(used, kind=kind)
+
+    def _before_model(self, event: "BeforeModelCallEvent") -> None:
+        self._start(("model", id(event.agent)))
+
+    def _after_model(self, event: "AfterModelCallEvent") -> None:
+        elapsed = self._elapsed(("model", id(event.agent)))
+        if elapsed is not None:
+            MODEL_CALL_DURATION.observe(elapsed, status="error" if event.exception else "ok")
+
+    def _before_tool(self, event: "BeforeToolCallEvent") -> None:
+        self._start(("tool", event.tool_use.get("toolUseId")))
+
+    def _after_tool(self, event: "AfterToolCallEvent") -> None:
+        elapsed = self._elapsed(("tool", event.tool_use.get("toolUseId")))
+        if elapsed is None:
+            return
+        failed = event.exception is not None or (event.result or {}).get("status") == "error"
+        TOOL_DURATION.observe(elapsed, tool=event.tool_use.get("name", ""), status="error" if failed else "success")
+
+
+agent_metrics_hooks = AgentMetricsHooks()
+
+
+def httpx_metrics_hooks(targets: Optional[Dict[str, str]] = None) -> Dict[str, List[Callable]]:
+    """httpx.AsyncClient の event_hooks。トレース ID を付けて送り、応答ヘッダまでの時間を記録する。
+
+    targets は URL の接頭辞 -> ラベル名（A2A エージェント名など）。一致しなければホスト名を使う。
+    """
+    prefixes = sorted((targets or {}).items(), key=lambda item: -len(item[0]))
+
+    def target_for(url: str) -> str:
+        for prefix, name in prefixes:
+            if url.startswith(prefix.rstrip("/")):
+                return f"a2a.{name}"
+        return f"http.{urlsplit(url).netloc}"
+
+    async def on_request(request: Any) -> None:
+        request.headers.update(trace_headers())
+        request.extensions["metrics_started"] = time.perf_counter()
+
+    async def on_response(response: Any) -> None:
+        started = response.request.extensions.get("metrics_started")
+        if started is not None:
+            OUTBOUND_DURATION.observe(
+                time.perf_counter() - started,
+                target=target_for(str(response.request.url)),
+                status="ok" if response.status_code < 400 else "error",
+            )
+
+    return {"request": [on_request], "response": [on_response]}
+
+
+def _incoming_trace_id(headers: Dict[str, str]) -> Optional[str]:
+    trace_id = headers.get(TRACE_HEADER.lower())
+    if trace_id and len(trace_id) <= 128:
+        return trace_id
+    match = _TRACEPARENT.match(headers.get("traceparent", ""))
+    return match.group(1) if match else None
+
+
+def _route_path(scope: Dict[str, Any], status: int) -> str:
+    """ラベル用のパス。ルートのテンプレート（/sessions/{id} など）にして、ラベルの種類を抑える。"""
+    route = scope.get("route")
+    if getattr(route, "path", None):
+        return route.path
+    if status == 404:
+        return "unmatched"
+    path = scope.get("path", "")
+    for name, value in (scope.get("path_params") or {}).items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI ミドルウェア。GET metrics_path でメトリクスを返し、それ以外のリクエストは計測してトレース ID を付ける。
+
+    ミドルウェアが返す /metrics は認証を通らない。認証付きのアプリでは metrics_path=None にして、
+    アプリ側で認証を掛けたルートから REGISTRY.render() を返す。
+    """
+
+    def __init__(self, app: Any, metrics_path: Optional[str] = "/metrics", registry: Registry = REGISTRY):
+        self.app = app
+        self.metrics_path = metrics_path
+        self.registry = registry
+
+    async def _serve_metrics(self, send: Callable) -> None:
+        body = self.registry.render().encode("utf-8")
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", CONTENT_TYPE.encode("latin-1"))]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.metrics_path is not None and scope.get("path") == self.metrics_path and scope.get("method") == "GET":
+            await self._serve_metrics(send)
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        with trace_scope(_incoming_trace_id(headers)) as trace_id:
+            async def tracking_send(message: Dict[str, Any]) -> None:
+                nonlocal status, size
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (TRACE_HEADER.lower().encode("latin-1"), trace_id.encode("latin-1"))]}
+                elif message["type"] == "http.response.body":
+                    size += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, tracking_send)
+            finally:
+                # ルートのテンプレート（/sessions/{id} など）があればそれを使い、ラベルの種類を抑える
+                path = _route_path(scope, status)
+                method = scope.get("method", "")
+                HTTP_DURATION.observe(time.perf_counter() - started, method=method, path=path, status=status)
+                HTTP_RESPONSE_BYTES.observe(size, method=method, path=path)
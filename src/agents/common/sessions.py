@@ -0,0 +1,186 @@
+"""セッションごとの会話履歴ストア。
+
+- 履歴はセッション ID ごとに保持し、リクエスト時にその履歴だけを Agent に渡す
+- メッセージ数のスライディングウィンドウ + トークン予算で履歴を切り詰める
+- 予算を超えて切り落とした部分は、summarizer があれば要約として残す
+- アイドル時間・セッション数・合計サイズの上限で古いセッションから追い出す
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+Summarizer = Callable[[List[Message], str], Awaitable[str]]
+
+
+def estimate_tokens(messages: List[Message]) -> int:
+    """ASCII は 4 文字 ≒ 1 トークン、それ以外は 1 文字 ≒ 1 トークンで概算する。"""
+    text = json.dumps([m.get("content", []) for m in messages], ensure_ascii=False, default=str)
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def _transcript(messages: List[Message]) -> str:
+    lines = []
+    for m in messages:
+        texts = [block["text"] for block in m.get("content", []) if "text" in block]
+        if texts:
+            lines.append(f"{m.get('role')}: {' '.join(texts)}")
+    return "\n".join(lines)
+
+
+def llm_summarizer(create_agent: Callable[[], Any]) -> Summarizer:
+    """Strands Agent を使って、切り落とした履歴を既存の要約に統合する summarizer を作る。"""
+
+    async def summarize(messages: List[Message], previous: str) -> str:
+        agent = create_agent()
+        result = await agent.invoke_async(
+            "以下の会話を、今後の応答に必要な事実・ユーザーの要望を中心に日本語で簡潔に要約してください。\n"
+            f"# これまでの要約\n{previous or '(なし)'}\n# 追加の会話\n{_transcript(messages)}"
+        )
+        return str(result).strip()
+
+    return summarize
+
+
+def _is_turn_start(message: Message) -> bool:
+    """ユーザーのテキスト発話か（toolResult だけのメッセージは直前の toolUse と切り離せない）。"""
+    if message.get("role") != "user":
+        return False
+    content = message.get("content", [])
+    return any("text" in block for block in content) and not any("toolResult" in block for block in content)
+
+
+@dataclass
+class Session:
+    session_id: str
+    messages: List[Message] = field(default_factory=list)
+    summary: str = ""
+    last_used: float = field(default_factory=time.monotonic)
+    size_bytes: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_messages: int = 20,
+        token_budget: int = 4000,
+        max_sessions: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 30 * 60,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.summarizer = summarizer
+        self.evicted = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes = 0
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.last_used > self.idle_ttl and not s.lock.locked()]:
+            self._drop(sid)
+        for sid in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions and self._bytes <= self.max_bytes:
+                break
+            if not self._sessions[sid].lock.locked():
+                self._drop(sid)
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size_bytes
+        self.evicted += 1
+
+    def get(self, session_id: str) -> Session:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            self._sessions[session_id] = session
+            self._evict()
+        self._sessions.move_to_end(session_id)
+        session.touch()
+        return session
+
+    def _window_start(self, messages: List[Message]) -> int:
+        """max_messages 以内に収まる最初のターン開始位置。"""
+        start = max(0, len(messages) - self.max_messages)
+        while start < len(messages) and not _is_turn_start(messages[start]):
+            start += 1
+        return start
+
+    async def save(self, session: Session, messages: List[Message]) -> None:
+        """リクエスト後の全履歴を受け取り、ウィンドウ・予算に収めて保存する。"""
+        start = self._window_start(messages)
+        kept = messages[start:]
+        dropped = messages[:start]
+        # トークン予算を超える間は、ターン単位で古いものから落とす
+        while len(kept) > 1 and estimate_tokens(kept) > self.token_budget:
+            cut = 1
+            while cut < len(kept) and not _is_turn_start(kept[cut]):
+                cut += 1
+            if cut >= len(kept):
+                break
+            dropped += kept[:cut]
+            kept = kept[cut:]
+        if dropped and self.summarizer is not None:
+            try:
+                session.summary = await self.summarizer(dropped, session.summary)
+            except Exception:
+                logger.exception(f"Session summarization failed: {session.session_id}")
+        session.messages = kept
+        self._bytes -= session.size_bytes
+        session.size_bytes = len(json.dumps(kept, ensure_ascii=False, default=str).encode("utf-8")) + len(session.summary.encode("utf-8"))
+        self._bytes += session.size_bytes
+        session.touch()
+        self._evict()
+
+    @asynccontextmanager
+    async def bind(self, agent: Any, session_id: Optional[str], system_prompt: str) -> AsyncIterator[Any]:
+        """agent にセッションの履歴・要約を載せ、正常終了したら履歴を保存する。
+
+        session_id がない場合は履歴なしで実行し、何も保存しない。
+        同じセッションへの同時リクエストは順番に処理する。
+        """
+        if not session_id:
+            agent.messages = []
+            agent.system_prompt = system_prompt
+            try:
+                yield agent
+            finally:
+                agent.messages = []
+            return
+
+        session = self.get(session_id)
+        async with session.lock:
+            agent.messages = list(session.messages)
+            agent.system_prompt = (
+                f"{system_prompt}\n\n# これまでの会話の要約\n{session.summary}" if session.summary else system_prompt
+            )
+            try:
+                yield agent
+                # 途中で失敗したターンは toolUse/toolResult が揃わないことがあるため保存しない
+                await self.save(session, agent.messages)
+            finally:
+                agent.messages = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "evicted_total": self.evicted,
+        }
@@ -0,0 +1,98 @@
+"""起動の高速化と計測（app factory から使う）。
+
+- import 時に副作用（サーバ起動・クライアント生成・ディスカバリ）を起こさないよう、重いオブジェクトは Lazy で初回利用時に作る
+- warm-up フックで Lazy を先に作っておけば、最初のリクエストがクライアント生成やインデックス読み込みを待たない
+- StartupTimer は import・初期化・ウォームアップの段階ごとの時間を記録し、起動ログと /health に出す
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """初回の get() で factory を呼んで作り、以降は同じものを返す（スレッドセーフ）。"""
+
+    def __init__(self, factory: Callable[[], T], name: str = ""):
+        self.factory = factory
+        self.name = name or getattr(factory, "__name__", "lazy")
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def get(self) -> T:
+        if self._ready:
+            return self._value  # type: ignore[return-value]
+        with self._lock:
+            if not self._ready:
+                self._value = self.factory()
+                self._ready = True
+        return self._value  # type: ignore[return-value]
+
+    def set(self, value: T) -> None:
+        """作成済みのものに差し替える（ベンチマーク・検証用）。"""
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+
+class StartupTimer:
+    """段階ごとの所要時間。phase() は入れ子にせず、順に呼ぶ。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, label: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases.append((label, time.perf_counter() - started))
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            phases = list(self.phases)
+        return {
+            "total_seconds": round(sum(s for _, s in phases), 4),
+            "ready": self.ready_at is not None,
+            "phases": {label: round(seconds, 4) for label, seconds in phases},
+        }
+
+    def report(self) -> str:
+        with self._lock:
+            phases = list(self.phases)
+        total = sum(s for _, s in phases) or 1e-9
+        width = max([len(label) for label, _ in phases] + [5])
+        lines = [f"{self.name} startup: {total:.3f}s"]
+        for label, seconds in sorted(phases, key=lambda p: -p[1]):
+            lines.append(f"  {label.ljust(width)}  {seconds:7.3f}s  {seconds / total:6.1%}")
+        return "\n".join(lines)
+
+
+def warm_up(timer: StartupTimer, steps: Dict[str, Callable[[], Any]]) -> None:
+    """クライアントやキャッシュを先に作る。1 つ失敗しても残りは続け、最初のリクエストで作り直させる。"""
+    for label, step in steps.items():
+        try:
+            with timer.phase(f"warm {label}"):
+                step()
+        except Exception as e:
+            logger.warning(f"Warm-up step {label!r} failed, deferring to first use: {type(e).__name__}: {e}")
+    timer.mark_ready()
+    logger.info(timer.report())
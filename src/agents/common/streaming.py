@@ -0,0 +1,243 @@
+"""ストリーミング応答の共通ライター（plain text / SSE / NDJSON）。
+
+- モデルのデルタを時間窓とバイト数でまとめて書き出す（最初のテキストだけは即座に送って TTFB を保つ）
+- SSE は複数行のテキストも 1 イベントとして正しく送り、イベント ID とハートビートを付ける
+- NDJSON はテキストに加えてツール呼び出しのイベントも流す
+"""
+import asyncio
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# {"type": "text", "text": ...} / {"type": "tool_use", ...} / {"type": "tool_result", ...} / {"type": "heartbeat"}
+StreamEvent = Dict[str, Any]
+
+
+async def agent_events(stream: AsyncIterator[Any]) -> AsyncIterator[StreamEvent]:
+    """Strands の stream_async のイベントを StreamEvent に変換する。"""
+    async for event in stream:
+        if not isinstance(event, dict):
+            continue
+        # Strands event objects typically contain 'data' for incremental text
+        chunk = event.get("data")
+        if isinstance(chunk, str) and chunk:
+            yield {"type": "text", "text": chunk}
+        message = event.get("message")
+        if isinstance(message, dict):
+            for block in message.get("content", []):
+                if "toolUse" in block:
+                    tool_use = block["toolUse"]
+                    yield {
+                        "type": "tool_use",
+                        "tool_use_id": tool_use.get("toolUseId"),
+                        "name": tool_use.get("name"),
+                        "input": tool_use.get("input"),
+                    }
+                elif "toolResult" in block:
+                    tool_result = block["toolResult"]
+                    yield {
+                        "type": "tool_result",
+                        "tool_use_id": tool_result.get("toolUseId"),
+                        "status": tool_result.get("status"),
+                    }
+
+
+async def text_events(chunks: Iterable[str]) -> AsyncIterator[StreamEvent]:
+    for chunk in chunks:
+        yield {"type": "text", "text": chunk}
+
+
+class _Done:
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def coalesce(
+    events: AsyncIterator[StreamEvent],
+    window: float = 0.05,
+    max_bytes: int = 4096,
+    heartbeat: Optional[float] = None,
+) -> AsyncIterator[StreamEvent]:
+    """テキストイベントを window 秒 / max_bytes バイトまでまとめる。
+
+    最初のテキストはまとめずに返す。テキスト以外のイベントの前ではバッファを吐き出して順序を保つ。
+    heartbeat 秒イベントがなければ {"type": "heartbeat"} を返す。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=64)
+
+    async def pump() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_Done())
+        except Exception as e:
+            await queue.put(_Done(e))
+
+    task = asyncio.create_task(pump())
+    buffer: list = []
+    size = 0
+    deadline = 0.0
+    first = True
+
+    def flush() -> StreamEvent:
+        nonlocal buffer, size
+        event = {"type": "text", "text": "".join(buffer)}
+        buffer, size = [], 0
+        return event
+
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if buffer else heartbeat
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush() if buffer else {"type": "heartbeat"}
+                continue
+            if isinstance(item, _Done):
+                if buffer:
+                    yield flush()
+                if item.error is not None:
+                    raise item.error
+                return
+            if item["type"] != "text":
+                if buffer:
+                    yield flush()
+                yield item
+            elif first:
+                first = False
+                yield item
+            else:
+                if not buffer:
+                    deadline = loop.time() + window
+                buffer.append(item["text"])
+                size += len(item["text"].encode("utf-8"))
+                if size >= max_bytes:
+                    yield flush()
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+class TextWriter:
+    """テキストをそのまま流す。ツールイベントとハートビートは送らない。"""
+
+    media_type = "text/plain; charset=utf-8"
+    heartbeat = False
+
+    def __init__(self):
+        self.sent_text = False
+
+    def encode(self, event: StreamEvent) -> bytes:
+        if event["type"] != "text":
+            return b""
+        self.sent_text = True
+        return event["text"].encode("utf-8")
+
+    def end(self) -> bytes:
+        return b""
+
+    def error(self, exc: Exception) -> bytes:
+        prefix = "\n" if self.sent_text else ""
+        return f"{prefix}Error: {type(exc).__name__}: {exc}\n".encode("utf-8")
+
+
+class SSEWriter:
+    """テキストは既定の message イベント、ツールは tool_use / tool_result イベント（data は JSON）。"""
+
+    media_type = "text/event-stream"
+    heartbeat = True
+
+    def __init__(self):
+        self.event_id = 0
+
+    def _frame(self, data: str, event: Optional[str] = None) -> bytes:
+        self.event_id += 1
+        lines = [f"id: {self.event_id}"]
+        if event:
+            lines.append(f"event: {event}")
+        # data の改行はそれぞれ data: 行にする（受信側で \n で再結合される）
+        lines += [f"data: {line}" for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+        return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+    def encode(self, event: StreamEvent) -> bytes:
+        if event["type"] == "heartbeat":
+            return b": ping\n\n"
+        if event["type"] == "text":
+            return self._frame(event["text"])
+        payload = {k: v for k, v in event.items() if k != "type"}
+        return self._frame(json.dumps(payload, ensure_ascii=False, default=str), event["type"])
+
+    def end(self) -> bytes:
+        return self._frame("done", "end")
+
+    def error(self, exc: Exception) -> bytes:
+        return self._frame(f"{type(exc).__name__}: {exc}", "error")
+
+
+class NDJSONWriter:
+    """1 行 1 イベントの JSON。"""
+
+    media_type = "application/x-ndjson"
+    heartbeat = True
+
+    def encode(self, event: StreamEvent) -> bytes:
+        return (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+    def end(self) -> bytes:
+        return self.encode({"type": "end"})
+
+    def error(self, exc: Exception) -> bytes:
+        return self.encode({"type": "error", "message": f"{type(exc).__name__}: {exc}"})
+
+
+WRITERS = {"text": TextWriter, "sse": SSEWriter, "ndjson": NDJSONWriter}
+
+
+async def write_stream(
+    events: AsyncIterator[StreamEvent],
+    writer: Any,
+    window: float = 0.05,
+    max_bytes: int = 4096,
+    heartbeat: float = 15.0,
+    on_close: Optional[Callable[[], None]] = None,
+) -> AsyncIterator[bytes]:
+    try:
+        async for event in coalesce(events, window, max_bytes, heartbeat if writer.heartbeat else None):
+            data = writer.encode(event)
+            if data:
+                yield data
+        tail = writer.end()
+        if tail:
+            yield tail
+    except Exception as e:  # Broad catch to ensure stream closes cleanly
+        logger.exception("stream error")
+        yield writer.error(e)
+    finally:
+        if on_close is not None:
+            on_close()
+
+
+def streaming_response(
+    events: AsyncIterator[StreamEvent],
+    fmt: str,
+    window: float = 0.05,
+    max_bytes: int = 4096,
+    heartbeat: float = 15.0,
+    on_close: Optional[Callable[[], None]] = None,
+    **kwargs: Any,
+) -> StreamingResponse:
+    """events を fmt（"text" / "sse" / "ndjson"）で書き出す StreamingResponse を作る。"""
+    writer = WRITERS[fmt]()
+    return StreamingResponse(
+        write_stream(events, writer, window, max_bytes, heartbeat, on_close),
+        media_type=writer.media_type,
+        **kwargs,
+    )
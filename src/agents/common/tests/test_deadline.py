@@ -0,0 +1,68 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# common は相対 import を使うので、src から agents.common として読む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from agents.common.deadline import DeadlineExceeded, Hedger, deadline_scope, with_deadline  # noqa: E402
+
+
+def current_thread_name():
+    return threading.current_thread().name
+
+
+def test_call_runs_inline_without_a_deadline():
+    assert Hedger("test").call(current_thread_name, timeout=1.0) == threading.current_thread().name
+
+
+def test_call_runs_inline_when_the_client_timeout_ends_first():
+    with deadline_scope(5.0):
+        assert Hedger("test").call(current_thread_name, timeout=1.0) == threading.current_thread().name
+
+
+def test_call_stops_at_a_deadline_shorter_than_the_client_timeout():
+    hedger = Hedger("test")
+    started = time.monotonic()
+    with deadline_scope(0.05), pytest.raises(DeadlineExceeded):
+        hedger.call(lambda: time.sleep(0.5), timeout=10.0)
+    assert time.monotonic() - started < 0.4
+    assert hedger.stats()["deadline_exceeded"] == 1
+
+
+def test_with_deadline_raises_when_the_next_item_is_late():
+    async def slow():
+        yield 1
+        await asyncio.sleep(1)
+        yield 2
+
+    async def scenario():
+        items = []
+        with deadline_scope(0.05):
+            with pytest.raises(DeadlineExceeded):
+                async for item in with_deadline(slow()):
+                    items.append(item)
+        return items
+
+    assert asyncio.run(scenario()) == [1]
+
+
+def test_with_deadline_keeps_context_changes_made_inside_the_iterator():
+    var = contextvars.ContextVar("var", default="unset")
+
+    async def events():
+        var.set("set")
+        yield var.get()
+        await asyncio.sleep(0)
+        yield var.get()
+
+    async def scenario():
+        with deadline_scope(1.0):
+            return [item async for item in with_deadline(events())]
+
+    assert asyncio.run(scenario()) == ["set", "set"]
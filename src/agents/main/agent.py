@@ -1,22 +1,127 @@
 import asyncio
+import importlib
 import logging
 import os
-from typing import AsyncGenerator, Optional
+import time
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from strands import Agent
-from strands_tools.a2a_client import A2AClientToolProvider
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
+
+from ..common.deadline import DeadlineMiddleware, Hedger, deadline_scope, httpx_deadline_hook, with_deadline
+from ..common.metrics import (
+    CONTENT_TYPE,
+    REGISTRY,
+    MetricsMiddleware,
+    agent_metrics_hooks,
+    current_trace_id,
+    httpx_metrics_hooks,
+    instrument_stream,
+)
+from ..common.sessions import SessionStore, llm_summarizer
+from ..common.startup import Lazy, StartupTimer, warm_up
+from ..common.streaming import StreamEvent, agent_events, streaming_response, text_events
+from .answer_cache import SemanticAnswerCache, normalize_prompt
+from .fanout import FanOut, make_fanout_tool
+from .pool import AgentPool, Lease, PoolSaturated
+from .router import (
+    RouteDecision,
+    ToddlerRouter,
+    fast_prompt,
+    get_client,
+    get_vector_store,
+    invoke_embedding,
+    load_lexical_index,
+    template_answer,
+    validate_dimensions,
+)
 
 load_dotenv()
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", 4))
+AGENT_POOL_MAX_QUEUE = int(os.getenv("AGENT_POOL_MAX_QUEUE", 32))
+AGENT_POOL_QUEUE_TIMEOUT = float(os.getenv("AGENT_POOL_QUEUE_TIMEOUT", 10))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 20))
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", 4000))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 1800))
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "false").lower() == "true"
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", 60))
+# エージェントごとの上書き: "web_search=20,toddler_rag=10"
+FANOUT_TIMEOUTS = {
+    name.strip(): float(value)
+    for name, _, value in (item.partition("=") for item in os.getenv("FANOUT_TIMEOUTS", "").split(",") if "=" in item)
+}
+# サブエージェント: "web_search=http://localhost:9000,toddler_rag=http://localhost:9001"
+A2A_AGENTS = {
+    name.strip(): url.strip()
+    for name, _, url in (
+        item.partition("=")
+        for item in os.getenv("A2A_AGENTS", "web_search=http://localhost:9000,toddler_rag=http://localhost:9001").split(",")
+        if "=" in item
+    )
+}
+AGENT_CARD_CACHE_PATH = os.getenv(
+    "AGENT_CARD_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_cards.json")
+)
+A2A_DISCOVERY_INTERVAL = float(os.getenv("A2A_DISCOVERY_INTERVAL", 60))
+# 起動時（リクエスト受付前）にクライアント・インデックス・エージェントを作っておく
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", 50))
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", 4096))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 5000))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", AGENT_POOL_SIZE))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", AGENT_POOL_SIZE))
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", 3600))
+ROUTER_MODE = os.getenv("ROUTER_MODE", "single_call")  # "single_call", "template" or "off"
+# Only used by the vector fallback (no lexical index); with a lexical index, only exact entry matches take the fast path
+ROUTER_MAX_DISTANCE = float(os.getenv("ROUTER_MAX_DISTANCE", 0.3))
+ROUTER_MAX_PROMPT_CHARS = int(os.getenv("ROUTER_MAX_PROMPT_CHARS", 30))
+# Fast-path agents have no tools and are cheap, but still pass admission control
+ROUTER_POOL_SIZE = int(os.getenv("ROUTER_POOL_SIZE", 2))
+VECTOR_BUCKET = os.getenv("VECTOR_BUCKET_NAME", "tollder-vector-bucket")
+VECTOR_INDEX = os.getenv("VECTOR_INDEX_NAME", "tollder-index")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "s3")  # "s3" or "local"
+TODDLER_RAG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "toddler-rag")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(TODDLER_RAG_DIR, "local_index"))
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION") or None
+LOCAL_RESCORE_FACTOR = int(os.getenv("LOCAL_RESCORE_FACTOR", 4))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(TODDLER_RAG_DIR, "lexical_index.json"))
+# リクエストのデッドライン（クライアントは X-Request-Timeout-Ms で短くできる）
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", 120))
+REQUEST_MAX_TIMEOUT = float(os.getenv("REQUEST_MAX_TIMEOUT", 600))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", 0.95))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", 10))
+VECTOR_QUERY_TIMEOUT = float(os.getenv("VECTOR_QUERY_TIMEOUT", 10))
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+# Must match the toddler index (scripts/embedding.py uses the same settings)
+EMBED_DIMENSIONS = validate_dimensions(int(os.getenv("EMBED_DIMENSIONS", 1024)))
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true").lower() == "true"
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 app = FastAPI(title="Strands Agent Streaming API", version="0.1.0")
+# /batch has its own whole-batch deadline
+app.add_middleware(
+    DeadlineMiddleware,
+    default_timeout=REQUEST_TIMEOUT,
+    max_timeout=REQUEST_MAX_TIMEOUT,
+    exempt_paths=("/batch",),
+)
+# Outermost: assigns the trace ID and times every request. GET /metrics is a route below so it sits behind the bearer token
+app.add_middleware(MetricsMiddleware, metrics_path=None)
 
 security = HTTPBearer(auto_error=False)
 
@@ -51,6 +156,12 @@ def require_bearer_token(
 
 class PromptRequest(BaseModel):
     prompt: str
+    session_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    prompts: List[str]
+    concurrency: Optional[int] = None
+    deadline_seconds: Optional[float] = None
 
 # Load system prompt from file
 def load_system_prompt():
@@ -62,62 +173,457 @@ def load_system_prompt():
     with open(prompt_path, "r", encoding="utf-8") as f:
         return f.read()
 
-# Reuse a single Agent instance per process (tools are stateless)
-agent_urls = [
-    "http://localhost:9000",  # web_search Agent
-    "http://localhost:9001",  # toddler-rag Agent
-]
+# Importing this module has no side effects: no clients, no discovery, no strands import.
+# Heavy objects are built on first use, or by the warm-up hook before the server accepts requests.
+startup = StartupTimer("main")
 
-a2a_tool_provider = A2AClientToolProvider(known_agent_urls=agent_urls)
+def new_agent(**kwargs: Any) -> Any:
+    from strands import Agent
 
-agent_instance = Agent(tools=a2a_tool_provider.tools, callback_handler=None, system_prompt=load_system_prompt())
+    return Agent(**kwargs)
 
-@app.get("/health")
-async def health():
-    return {"status": "ok"}
+def create_registry() -> Any:
+    from .discovery import AgentRegistry
 
-@app.post("/stream")
-async def stream_response(request: PromptRequest, _: None = Depends(require_bearer_token)):
-    """Plain text streaming endpoint (newline delimited)."""
+    # Agent cards come from the on-disk cache and are refreshed in the background (startup never blocks on discovery)
+    return AgentRegistry(A2A_AGENTS, AGENT_CARD_CACHE_PATH, refresh_interval=A2A_DISCOVERY_INTERVAL)
+
+agent_registry = Lazy(create_registry, "agent registry")
+fanout = FanOut(
+    A2A_AGENTS,
+    timeout=FANOUT_TIMEOUT,
+    timeouts=FANOUT_TIMEOUTS,
+    is_available=lambda name: agent_registry.get().is_available(name),
+)
+
+def create_orchestrator_tools() -> List[Any]:
+    from .discovery import CachedA2AClientToolProvider
+
+    # Outgoing A2A calls carry the deadline and trace ID; their latency is recorded per sub-agent
+    a2a_hooks = httpx_metrics_hooks({url: name for name, url in A2A_AGENTS.items()})
+    a2a_tool_provider = CachedA2AClientToolProvider(
+        agent_registry.get(),
+        httpx_client_args={
+            "event_hooks": {"request": [httpx_deadline_hook, *a2a_hooks["request"]], "response": a2a_hooks["response"]}
+        },
+    )
+    return [*a2a_tool_provider.tools, make_fanout_tool(fanout)]
+
+# A2A tools are stateless and shared; each request borrows its own Agent from the pool
+orchestrator_tools = Lazy(create_orchestrator_tools, "orchestrator tools")
+system_prompt = load_system_prompt()
+
+def create_agent() -> Any:
+    return new_agent(
+        tools=orchestrator_tools.get(), callback_handler=None, system_prompt=system_prompt, hooks=[agent_metrics_hooks]
+    )
+
+agent_pool = AgentPool(
+    create_agent,
+    size=AGENT_POOL_SIZE,
+    max_waiters=AGENT_POOL_MAX_QUEUE,
+    queue_timeout=AGENT_POOL_QUEUE_TIMEOUT,
+)
+
+def create_fast_agent() -> Any:
+    return new_agent(callback_handler=None, system_prompt=system_prompt, hooks=[agent_metrics_hooks])
+
+# Separate from agent_pool so single-call answers never queue behind long orchestrator runs
+fast_pool = AgentPool(
+    create_fast_agent,
+    size=ROUTER_POOL_SIZE,
+    max_waiters=AGENT_POOL_MAX_QUEUE,
+    queue_timeout=AGENT_POOL_QUEUE_TIMEOUT,
+)
+
+session_store = SessionStore(
+    max_messages=SESSION_MAX_MESSAGES,
+    token_budget=SESSION_TOKEN_BUDGET,
+    max_sessions=SESSION_MAX_SESSIONS,
+    idle_ttl=SESSION_IDLE_TTL,
+    summarizer=llm_summarizer(lambda: new_agent(callback_handler=None)) if SESSION_SUMMARIZE else None,
+)
+
+embed_hedger = Hedger("bedrock.embed", hedge=HEDGE_ENABLED, quantile=HEDGE_QUANTILE)
+vector_query_hedger = Hedger("vector.query", hedge=HEDGE_ENABLED, quantile=HEDGE_QUANTILE)
+# Client timeouts match the hedger deadlines so abandoned calls stop instead of holding a thread
+bedrock_runtime = Lazy(
+    lambda: get_client("bedrock-runtime", AWS_REGION, timeout=EMBED_TIMEOUT), "bedrock-runtime client"
+)
+
+def embed_prompt(text: str) -> List[float]:
+    client = bedrock_runtime.get()
+    # Same Titan request and dimension check as toddler-rag, so cached vectors always share one dimension
+    return embed_hedger.call(
+        lambda: invoke_embedding(client, EMBED_MODEL_ID, text, EMBED_DIMENSIONS, EMBED_NORMALIZE), EMBED_TIMEOUT
+    )
+
+# Hot prompts (same toddler word or a trivial variant) are answered from previous final answers
+answer_cache = (
+    SemanticAnswerCache(
+        embed_prompt,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        ttl=ANSWER_CACHE_TTL,
+    )
+    if ANSWER_CACHE_ENABLED
+    else None
+)
+
+def create_toddler_router() -> ToddlerRouter:
+    return ToddlerRouter(
+        get_vector_store(
+            VECTOR_BACKEND,
+            client=get_client("s3vectors", AWS_REGION, timeout=VECTOR_QUERY_TIMEOUT) if VECTOR_BACKEND == "s3" else None,
+            bucket=VECTOR_BUCKET,
+            index=VECTOR_INDEX,
+            local_dir=LOCAL_INDEX_DIR,
+            quantization=LOCAL_INDEX_QUANTIZATION,
+            rescore_factor=LOCAL_RESCORE_FACTOR,
+        ),
+        embed_prompt,
+        max_distance=ROUTER_MAX_DISTANCE,
+        max_prompt_chars=ROUTER_MAX_PROMPT_CHARS,
+        lexical_index=load_lexical_index(LEXICAL_INDEX_PATH),
+        query_hedger=vector_query_hedger,
+        query_timeout=VECTOR_QUERY_TIMEOUT,
+    )
+
+# Short baby-talk prompts with a confident toddler index hit skip the orchestrator and sub-agents
+toddler_router: Optional[Lazy[Optional[ToddlerRouter]]] = (
+    Lazy(create_toddler_router, "toddler router") if ROUTER_MODE != "off" else None
+)
+
+def current_router(build: bool = True) -> Optional[ToddlerRouter]:
+    """The router, or None when routing is off, not built yet (build=False) or could not be built.
+
+    A failed build (e.g. VECTOR_BACKEND=local without an exported index) is logged once and remembered,
+    so prompts take the full path instead of retrying the factory and failing on every request.
+    """
+    if toddler_router is None or (not build and not toddler_router.ready):
+        return None
+    try:
+        return toddler_router.get()
+    except Exception:
+        logger.exception("toddler router unavailable; every prompt takes the full path until restart")
+        toddler_router.set(None)
+        return None
+
+def cache_bypassed(x_cache_bypass: Optional[str], cache_control: Optional[str]) -> bool:
+    if x_cache_bypass and x_cache_bypass.lower() not in ("0", "false", "no"):
+        return True
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+async def timed(events: AsyncIterator[StreamEvent], path: str, started: float) -> AsyncGenerator[StreamEvent, None]:
+    """Log (and record on the router) end-to-end latency per path once the stream finishes."""
+    async for event in instrument_stream(events, path, started):
+        yield event
+    elapsed = time.perf_counter() - started
+    logger.info(f"path={path} latency_ms={elapsed * 1000:.0f} trace_id={current_trace_id()}")
+    router = current_router(build=False)
+    if router is not None:
+        router.record(path, elapsed)
+
+async def open_stream(
+    request: PromptRequest, session_id: Optional[str], bypass: bool
+) -> Tuple[AsyncIterator[StreamEvent], Optional[Lease], str]:
+    """Return (stream events, pool lease or None, X-Cache status) for one prompt.
+
+    Session requests are never cached or routed: their answers depend on the conversation history.
+    """
+    started = time.perf_counter()
+    cache = answer_cache if not session_id else None
+    if cache is not None and bypass:
+        cache.record_bypass()
+        cache = None
+    cache_status = "MISS" if cache is not None else "BYPASS"
+    # Cheapest first: exact cache hit, then the router (lexical lookup needs no embedding)
+    if cache is not None:
+        exact = cache.lookup_exact(request.prompt)
+        if exact is not None:
+            logger.info("answer cache hit (exact)")
+            return timed(text_events(exact.chunks), "cache", started), None, "HIT"
+
+    # The prompt is embedded at most once, and only if the vector route or the semantic lookup needs it
+    vectors: List[List[float]] = []
+
+    def embed_once(text: str) -> List[float]:
+        if not vectors:
+            vectors.append(embed_prompt(text))
+        return vectors[0]
+
+    def remember(chunks: List[str]) -> None:
+        # Only answers that finished without an error are cached
+        if cache is not None:
+            cache.store(request.prompt, chunks, vectors[0] if vectors else None)
+
+    decision = None
+    if toddler_router is not None and not session_id:
+        router = current_router()
+        if router is None:
+            decision = RouteDecision("full", "router_unavailable")
+        else:
+            try:
+                decision = await asyncio.to_thread(router.decide, request.prompt, embed_once)
+            except Exception:
+                logger.exception("router decision failed; using the full path")
+                decision = RouteDecision("full", "error")
+        logger.info(
+            f"route={decision.route} reason={decision.reason} "
+            f"distance={(decision.hit or {}).get('distance')} decide_ms={decision.elapsed * 1000:.0f}"
+        )
+
+    if cache is not None:
+        if decision is not None and decision.route == "fast":
+            # Answered without a semantic lookup; stored for exact hits only unless the router embedded the prompt
+            cache.record_miss()
+        else:
+            try:
+                lookup = await cache.lookup(request.prompt, embed_once)
+            except Exception:
+                logger.exception("answer cache lookup failed; running the agent")
+                cache = None
+            else:
+                if lookup.chunks is not None:
+                    logger.info(f"answer cache hit ({lookup.kind})")
+                    return timed(text_events(lookup.chunks), "cache", started), None, "HIT"
+
+    if decision is not None and decision.route == "fast":
+        if ROUTER_MODE == "template":
+            answer = template_answer(request.prompt, decision.hit)
+            remember([answer])
+            return timed(text_events([answer]), "fast_template", started), None, cache_status
+
+        fast_lease = await fast_pool.acquire()
+
+        async def run_fast() -> AsyncGenerator[StreamEvent, None]:
+            chunks = []
+            async with session_store.bind(fast_lease.agent, None, system_prompt) as agent:
+                async for event in agent_events(agent.stream_async(fast_prompt(request.prompt, decision.hit))):
+                    if event["type"] == "text":
+                        chunks.append(event["text"])
+                    yield event
+            remember(chunks)
+
+        return timed(with_deadline(run_fast()), "fast", started), fast_lease, cache_status
+
+    lease = await agent_pool.acquire()
+
+    async def run() -> AsyncGenerator[StreamEvent, None]:
+        chunks = []
+        async with session_store.bind(lease.agent, session_id, system_prompt) as agent:
+            async for event in agent_events(agent.stream_async(request.prompt)):
+                if event["type"] == "text":
+                    chunks.append(event["text"])
+                yield event
+        remember(chunks)
 
-    async def generate() -> AsyncGenerator[bytes, None]:
+    return timed(with_deadline(run()), "full", started), lease, cache_status
+
+async def respond(
+    fmt: str,
+    request: PromptRequest,
+    x_session_id: Optional[str],
+    x_cache_bypass: Optional[str],
+    cache_control: Optional[str],
+) -> StreamingResponse:
+    session_id = request.session_id or x_session_id
+    events, lease, cache_status = await open_stream(
+        request, session_id, cache_bypassed(x_cache_bypass, cache_control)
+    )
+    return streaming_response(
+        events,
+        fmt,
+        window=STREAM_COALESCE_MS / 1000,
+        max_bytes=STREAM_COALESCE_BYTES,
+        heartbeat=STREAM_HEARTBEAT_SECONDS,
+        on_close=lease.release if lease is not None else None,
+        headers={"X-Cache": cache_status},
+        # The generator may never start if the client disconnects early
+        background=BackgroundTask(lease.release) if lease is not None else None,
+    )
+
+async def run_batch_item(prompt: str, bypass: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        while True:
+            try:
+                events, lease, cache_status = await open_stream(PromptRequest(prompt=prompt), None, bypass)
+                break
+            except PoolSaturated as e:
+                # Batch items wait for capacity instead of failing; the batch deadline bounds the wait
+                await asyncio.sleep(e.retry_after)
         try:
-            async for event in agent_instance.stream_async(request.prompt):
-                # Strands event objects typically contain 'data' for incremental text
-                chunk = event.get("data") if isinstance(event, dict) else None
-                if chunk:
-                    yield (chunk + "\n").encode("utf-8")
-        except Exception as e:  # Broad catch to ensure stream closes cleanly
-            logger.exception("stream error")
-            yield f"Error: {type(e).__name__}: {e}\n".encode("utf-8")
+            async with aclosing(events):
+                texts = [event["text"] async for event in events if event["type"] == "text"]
+        finally:
+            if lease is not None:
+                lease.release()
+        return {"status": "ok", "text": "".join(texts), "cache": cache_status,
+                "elapsed": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        logger.exception("batch item failed")
+        return {"status": "error", "error": f"{type(e).__name__}: {e}",
+                "elapsed": round(time.perf_counter() - start, 3)}
+
+async def batch_events(
+    prompts: List[str], concurrency: int, deadline: float, bypass: bool
+) -> AsyncGenerator[StreamEvent, None]:
+    """Run unique prompts concurrently and yield one result per input index as each finishes."""
+    start = time.perf_counter()
+    groups: Dict[str, List[int]] = {}
+    for index, prompt in enumerate(prompts):
+        groups.setdefault(normalize_prompt(prompt), []).append(index)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(indices: List[int]) -> Dict[str, Any]:
+        async with semaphore:
+            # Each item gets the usual request deadline, capped by what is left of the batch
+            with deadline_scope(REQUEST_TIMEOUT), deadline_scope(max(0.0, deadline - (time.perf_counter() - start))):
+                return await run_batch_item(prompts[indices[0]], bypass)
+
+    pending = {asyncio.create_task(run(indices)): indices for indices in groups.values()}
+    counts = {"ok": 0, "error": 0, "timeout": 0}
+    try:
+        while pending:
+            remaining = deadline - (time.perf_counter() - start)
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                for index in pending.pop(task):
+                    counts[result["status"]] += 1
+                    yield {"type": "result", "index": index, "prompt": prompts[index], **result}
+        # Deadline expired: report whatever is still pending as a timeout
+        for task, indices in pending.items():
+            task.cancel()
+            for index in indices:
+                counts["timeout"] += 1
+                yield {"type": "result", "index": index, "prompt": prompts[index], "status": "timeout"}
+        elapsed = time.perf_counter() - start
+        logger.info(f"batch done: {len(prompts)} prompts ({len(groups)} unique) {counts} in {elapsed:.1f}s")
+        yield {"type": "summary", "total": len(prompts), "unique": len(groups), **counts, "elapsed": round(elapsed, 3)}
+    finally:
+        for task in pending:
+            task.cancel()
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request, exc: PoolSaturated):
+    logger.warning(f"Rejecting request: {exc} (pool={agent_pool.stats()} fast_pool={fast_pool.stats()})")
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
+def warm_up_steps() -> Dict[str, Any]:
+    steps = {
+        "import strands": lambda: importlib.import_module("strands"),
+        "agent registry": agent_registry.get,
+        "orchestrator tools": orchestrator_tools.get,
+        "agent pool": lambda: agent_pool.prefill(1),
+    }
+    if answer_cache is not None or toddler_router is not None:
+        steps["bedrock-runtime client"] = bedrock_runtime.get
+    if toddler_router is not None:
+        steps["toddler router"] = current_router
+        if ROUTER_MODE != "template":
+            steps["fast agent pool"] = lambda: fast_pool.prefill(1)
+    return steps
 
-    return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
+@app.on_event("startup")
+async def startup_event():
+    # Uvicorn accepts connections only after this returns, so the first request finds everything built
+    if WARMUP_ON_STARTUP:
+        warm_up(startup, warm_up_steps())
+    agent_registry.get().start()
+
+@app.get("/health")
+async def health():
+    agents = agent_registry.get().health()
+    degraded = any(a["status"] == "degraded" for a in agents.values())
+    router = current_router(build=False)
+    return {
+        "status": "degraded" if degraded else "ok",
+        "agents": agents,
+        "pool": agent_pool.stats(),
+        "fast_pool": fast_pool.stats() if toddler_router is not None else None,
+        "sessions": session_store.stats(),
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "router": router.stats() if router is not None else None,
+        "outbound": {h.name: h.stats() for h in (embed_hedger, vector_query_hedger)},
+        "startup": startup.as_dict(),
+    }
+
+@app.get("/metrics")
+async def metrics(_: None = Depends(require_bearer_token)):
+    """Prometheus text format metrics (same bearer token as the API)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.post("/stream")
+async def stream_response(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    x_cache_bypass: Optional[str] = Header(default=None),
+    cache_control: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
+    """Plain text streaming endpoint (the answer text as-is)."""
+    return await respond("text", request, x_session_id, x_cache_bypass, cache_control)
 
 @app.post("/stream_sse")
-async def stream_sse(request: PromptRequest, _: None = Depends(require_bearer_token)):
+async def stream_sse(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    x_cache_bypass: Optional[str] = Header(default=None),
+    cache_control: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
     """Server-Sent Events (SSE) style streaming endpoint."""
+    return await respond("sse", request, x_session_id, x_cache_bypass, cache_control)
 
-    async def event_source() -> AsyncGenerator[bytes, None]:
-        try:
-            async for event in agent_instance.stream_async(request.prompt):
-                chunk = event.get("data") if isinstance(event, dict) else None
-                if chunk:
-                    # SSE format: data: <payload> \n\n
-                    yield f"data: {chunk}\n\n".encode("utf-8")
-            # Signal end of stream
-            yield b"event: end\ndata: done\n\n"
-        except Exception as e:
-            logger.exception("sse stream error")
-            yield f"event: error\ndata: {type(e).__name__}: {e}\n\n".encode("utf-8")
-
-    return StreamingResponse(event_source(), media_type="text/event-stream")
+@app.post("/stream_ndjson")
+async def stream_ndjson(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    x_cache_bypass: Optional[str] = Header(default=None),
+    cache_control: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
+    """NDJSON streaming endpoint (text and tool events, one JSON object per line)."""
+    return await respond("ndjson", request, x_session_id, x_cache_bypass, cache_control)
+
+@app.post("/batch")
+async def batch(
+    request: BatchRequest,
+    x_cache_bypass: Optional[str] = Header(default=None),
+    cache_control: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
+    """Run many prompts with bounded concurrency; results stream as NDJSON in completion order."""
+    if not request.prompts:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="prompts is empty")
+    if len(request.prompts) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BATCH_MAX_ITEMS} prompts per batch",
+        )
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    deadline = min(request.deadline_seconds or BATCH_DEADLINE, BATCH_DEADLINE)
+    return streaming_response(
+        batch_events(request.prompts, concurrency, deadline, cache_bypassed(x_cache_bypass, cache_control)),
+        "ndjson",
+        heartbeat=STREAM_HEARTBEAT_SECONDS,
+    )
 
 @app.get("/")
 async def root():
-    return {"message": "Use POST /stream or /stream_sse with {'prompt':'...'}"}
+    return {"message": "Use POST /stream, /stream_sse or /stream_ndjson with {'prompt':'...'}, or /batch with {'prompts':[...]}"}
 
 # Optional: graceful shutdown hook (if future cleanup needed)
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Placeholder for any async cleanup if required later
-    await asyncio.sleep(0)
+    if agent_registry.ready:
+        await agent_registry.get().stop()
+    await fanout.aclose()
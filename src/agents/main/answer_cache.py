@@ -0,0 +1,140 @@
+"""/stream 系エンドポイント向けのセマンティック応答キャッシュ。
+
+プロンプトを埋め込み、コサイン類似度が閾値以上の過去の最終応答があればそれを返す。
+応答はモデルの出力チャンク列のまま保存し、各エンドポイントの通常のフレーミングで再生する。
+完全一致（正規化後）は埋め込みを呼ばずに引く（lookup_exact）。埋め込みは呼び出し元と共有できるよう、lookup に関数で渡せる。
+"""
+import asyncio
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", prompt).split())
+
+
+def unit_vector(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+@dataclass
+class _Entry:
+    prompt: str
+    vector: Optional[np.ndarray]  # None なら完全一致でだけ引ける
+    chunks: List[str]
+    expires_at: float
+
+
+@dataclass
+class Lookup:
+    chunks: Optional[List[str]]
+    vector: Optional[np.ndarray]
+    kind: str  # "exact" / "semantic" / "miss"
+
+
+class SemanticAnswerCache:
+    def __init__(self, embed: Callable[[str], List[float]], threshold: float = 0.95,
+                 max_entries: int = 1000, ttl: float = 3600.0):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+        self._lock = threading.Lock()
+
+    def _purge_expired(self) -> None:
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _search(self, vector: np.ndarray) -> Optional[_Entry]:
+        if self._matrix is None:
+            self._keys = [k for k, e in self._entries.items() if e.vector is not None]
+            self._matrix = np.stack([self._entries[k].vector for k in self._keys]) if self._keys else None
+        if self._matrix is None:
+            return None
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self._entries[self._keys[best]]
+
+    def lookup_exact(self, prompt: str) -> Optional[Lookup]:
+        """正規化後のプロンプトが一致する応答（埋め込みは呼ばない）。なければ None（ミスには数えない）。"""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self._purge_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return Lookup(entry.chunks, entry.vector, "exact")
+
+    async def lookup(self, prompt: str, embed: Optional[Callable[[str], Sequence[float]]] = None) -> Lookup:
+        """完全一致、なければ埋め込みの類似度で引く。embed を渡すと self.embed の代わりに使う。"""
+        exact = self.lookup_exact(prompt)
+        if exact is not None:
+            return exact
+        key = normalize_prompt(prompt)
+        vector = unit_vector(await asyncio.to_thread(embed or self.embed, key))
+        with self._lock:
+            entry = self._search(vector)
+            if entry is not None:
+                self._entries.move_to_end(normalize_prompt(entry.prompt))
+                self.semantic_hits += 1
+                return Lookup(entry.chunks, vector, "semantic")
+            self.misses += 1
+        return Lookup(None, vector, "miss")
+
+    def store(self, prompt: str, chunks: List[str], vector: Optional[Sequence[float]]) -> None:
+        """vector がなければ（埋め込まずに答えたプロンプト）完全一致でだけ引けるように保存する。"""
+        if not chunks:
+            return
+        key = normalize_prompt(prompt)
+        entry = _Entry(prompt, None if vector is None else unit_vector(vector), list(chunks), time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def record_miss(self) -> None:
+        """lookup（類似度検索）をせずに答えたときのミス。"""
+        with self._lock:
+            self.misses += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,206 @@
+"""A2A エージェントカードのディスクキャッシュとバックグラウンド更新。
+
+起動時はディスク上のカードからすぐに始め、到達できないエージェントは degraded として扱う
+（起動や最初のリクエストをサブエージェントの発見処理で待たせない）。
+カードは ETag（If-None-Match）とカードの version で変更を判定し、定期的に更新する。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+from a2a.types import AgentCard
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH, PREV_AGENT_CARD_WELL_KNOWN_PATH
+from strands_tools.a2a_client import A2AClientToolProvider
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+@dataclass
+class AgentEntry:
+    name: str
+    url: str
+    card: Optional[Dict[str, Any]] = None
+    etag: Optional[str] = None
+    card_hash: Optional[str] = None
+    fetched_at: Optional[float] = None  # 最後にカードが有効と確認できた時刻 (epoch)
+    status: str = "unknown"  # "ok" / "degraded" / "unknown"
+    last_error: Optional[str] = None
+    discovery_latency: Optional[float] = None
+
+    def to_cache(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "card": self.card,
+            "etag": self.etag,
+            "card_hash": self.card_hash,
+            "fetched_at": self.fetched_at,
+        }
+
+
+class AgentRegistry:
+    def __init__(self, agents: Dict[str, str], cache_path: str, refresh_interval: float = 60.0, timeout: float = 3.0):
+        self.entries = {name: AgentEntry(name, url.rstrip("/")) for name, url in agents.items()}
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._task: Optional[asyncio.Task] = None
+        self.load_cache()
+
+    def load_cache(self) -> None:
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f"Agent card cache unreadable, ignoring: {self.cache_path}")
+            return
+        if data.get("version") != CACHE_VERSION:
+            return
+        for name, cached in data.get("agents", {}).items():
+            entry = self.entries.get(name)
+            if entry is None or cached.get("url") != entry.url or not cached.get("card"):
+                continue
+            entry.card = cached["card"]
+            entry.etag = cached.get("etag")
+            entry.card_hash = cached.get("card_hash")
+            entry.fetched_at = cached.get("fetched_at")
+
+    def save_cache(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": CACHE_VERSION, "agents": {n: e.to_cache() for n, e in self.entries.items() if e.card}},
+                f,
+                ensure_ascii=False,
+                indent=1,
+            )
+        os.replace(tmp_path, self.cache_path)
+
+    async def _fetch(self, client: httpx.AsyncClient, entry: AgentEntry) -> bool:
+        """カードを取得して entry を更新する。内容が変わったら True。"""
+        headers = {"If-None-Match": entry.etag} if entry.etag and entry.card else {}
+        resp = await client.get(entry.url + AGENT_CARD_WELL_KNOWN_PATH, headers=headers)
+        if resp.status_code == 404:
+            resp = await client.get(entry.url + PREV_AGENT_CARD_WELL_KNOWN_PATH, headers=headers)
+        if resp.status_code == 304:
+            return False
+        resp.raise_for_status()
+        card = resp.json()
+        AgentCard.model_validate(card)
+        card_hash = hashlib.sha256(json.dumps(card, sort_keys=True).encode("utf-8")).hexdigest()
+        changed = card_hash != entry.card_hash
+        if changed and entry.card and entry.card.get("version") == card.get("version"):
+            logger.info(f"Agent card for {entry.name} changed without a version bump")
+        entry.card = card
+        entry.card_hash = card_hash
+        entry.etag = resp.headers.get("etag")
+        return changed
+
+    async def refresh(self) -> None:
+        changed = False
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+
+            async def refresh_one(entry: AgentEntry) -> None:
+                nonlocal changed
+                start = time.perf_counter()
+                try:
+                    changed |= await self._fetch(client, entry)
+                    entry.status = "ok"
+                    entry.last_error = None
+                    entry.fetched_at = time.time()
+                except Exception as e:
+                    if entry.status != "degraded":
+                        logger.warning(f"Agent {entry.name} ({entry.url}) unreachable, marking degraded: {e}")
+                    entry.status = "degraded"
+                    entry.last_error = f"{type(e).__name__}: {e}"
+                finally:
+                    entry.discovery_latency = time.perf_counter() - start
+
+            await asyncio.gather(*(refresh_one(e) for e in self.entries.values()))
+        if changed:
+            self.save_cache()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Agent card refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """バックグラウンドで更新ループを開始する（起動処理はブロックしない）。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def is_available(self, name: str) -> bool:
+        entry = self.entries.get(name)
+        return entry is not None and entry.status != "degraded"
+
+    def available(self) -> List[str]:
+        return [name for name in self.entries if self.is_available(name)]
+
+    def card_for_url(self, url: str) -> Optional[AgentCard]:
+        for entry in self.entries.values():
+            if entry.url == url.rstrip("/") and entry.card:
+                return AgentCard.model_validate(entry.card)
+        return None
+
+    def health(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            name: {
+                "url": e.url,
+                "status": e.status,
+                "version": (e.card or {}).get("version"),
+                "discovery_latency_ms": round(e.discovery_latency * 1000, 1) if e.discovery_latency is not None else None,
+                "staleness_seconds": round(now - e.fetched_at, 1) if e.fetched_at else None,
+                "last_error": e.last_error,
+            }
+            for name, e in self.entries.items()
+        }
+
+
+class CachedA2AClientToolProvider(A2AClientToolProvider):
+    """AgentRegistry のカードを使い、ツール呼び出し時のカード取得を省く A2AClientToolProvider。
+
+    公開 API にカード取得の差し替え口がないため内部メソッドを上書きしている。strands-agents-tools 0.8.9 で確認済み
+    （requirements.txt で固定）。版を上げるときは上書き先の名前と役割が変わっていないか確認すること。
+    """
+
+    def __init__(self, registry: AgentRegistry, **kwargs):
+        super().__init__(known_agent_urls=[e.url for e in registry.entries.values()], **kwargs)
+        self._registry = registry
+
+    async def _ensure_discovered_known_agents(self) -> None:
+        # 既知エージェントの発見はレジストリがバックグラウンドで行うので、キャッシュ済みカードを写すだけ
+        for url in self._known_agent_urls:
+            card = self._registry.card_for_url(url)
+            if card is not None:
+                self._discovered_agents[url] = card
+        self._initial_discovery_done = True
+
+    async def _discover_agent_card(self, url: str) -> AgentCard:
+        card = self._registry.card_for_url(url)
+        if card is not None:
+            self._discovered_agents[url] = card
+            return card
+        return await super()._discover_agent_card(url)
@@ -0,0 +1,156 @@
+"""A2A サブエージェントへの並列ファンアウト。
+
+LLM が 1 エージェントずつツールを呼ぶと、待ち時間が直列に積み上がるうえモデルのターンも増える。
+同じ質問を複数のエージェントへ同時に送り、エージェントごとのタイムアウトを適用して
+結果を出典付きで 1 つのツール応答にまとめる。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from ..common.deadline import DEADLINE_HEADER, DeadlineExceeded, timeout_for
+from ..common.metrics import OUTBOUND_DURATION, trace_headers
+
+logger = logging.getLogger(__name__)
+
+
+def extract_text(result: Dict[str, Any]) -> str:
+    """message/send の result（Message または Task）からテキストを取り出す。"""
+    texts: List[str] = []
+
+    def collect(parts: Optional[List[Dict[str, Any]]]) -> None:
+        for part in parts or []:
+            if part.get("kind") == "text" and part.get("text"):
+                texts.append(part["text"])
+
+    if result.get("kind") == "message":
+        collect(result.get("parts"))
+    else:
+        for artifact in result.get("artifacts") or []:
+            collect(artifact.get("parts"))
+        if not texts:
+            collect(((result.get("status") or {}).get("message") or {}).get("parts"))
+    return "\n".join(texts).strip()
+
+
+class FanOut:
+    def __init__(self, agents: Dict[str, str], timeout: float = 60.0, timeouts: Optional[Dict[str, float]] = None,
+                 is_available: Optional[Callable[[str], bool]] = None):
+        self.agents = agents
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.is_available = is_available or (lambda name: True)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def send(self, name: str, prompt: str) -> Dict[str, Any]:
+        url = self.agents[name]
+        start = time.perf_counter()
+        try:
+            # 呼び出し元のリクエストの残り時間を超えて待たない
+            timeout = timeout_for(self.timeouts.get(name, self.timeout))
+        except DeadlineExceeded:
+            return {"agent": name, "status": "timeout", "text": "", "elapsed": 0.0}
+        payload = {
+            "jsonrpc": "2.0",
+            "id": str(uuid.uuid4()),
+            "method": "message/send",
+            "params": {
+                "message": {
+                    "kind": "message",
+                    "messageId": uuid.uuid4().hex,
+                    "role": "user",
+                    "parts": [{"kind": "text", "text": prompt}],
+                }
+            },
+        }
+        try:
+            resp = await asyncio.wait_for(
+                self._get_client().post(
+                    url,
+                    json=payload,
+                    timeout=timeout,
+                    headers={DEADLINE_HEADER: str(int(timeout * 1000)), **trace_headers()},
+                ),
+                timeout,
+            )
+            resp.raise_for_status()
+            body = resp.json()
+            if "error" in body:
+                raise RuntimeError(body["error"].get("message", body["error"]))
+            return {"agent": name, "status": "ok", "text": extract_text(body.get("result") or {}),
+                    "elapsed": time.perf_counter() - start}
+        except asyncio.TimeoutError:
+            return {"agent": name, "status": "timeout", "text": "", "elapsed": time.perf_counter() - start}
+        except Exception as e:
+            logger.warning(f"A2A call to {name} ({url}) failed: {type(e).__name__}: {e}")
+            return {"agent": name, "status": "error", "text": f"{type(e).__name__}: {e}",
+                    "elapsed": time.perf_counter() - start}
+
+    async def ask_all(self, prompt: str, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        targets = [n for n in (names or list(self.agents)) if n in self.agents]
+        # degraded なエージェントには送らず、その旨だけ返す
+        skipped = [{"agent": n, "status": "degraded", "text": "", "elapsed": 0.0} for n in targets if not self.is_available(n)]
+        live = [n for n in targets if self.is_available(n)]
+        results = list(await asyncio.gather(*(self.send(n, prompt) for n in live)))
+        for r in results:
+            OUTBOUND_DURATION.observe(r["elapsed"], target=f"a2a.{r['agent']}", status=r["status"])
+        return results + skipped
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+
+
+def merge_results(results: List[Dict[str, Any]]) -> str:
+    if not results:
+        return "問い合わせ可能なエージェントがありません。"
+    sections = []
+    for r in results:
+        if r["status"] == "ok":
+            header = f"[{r['agent']}] ({r['elapsed']:.2f}s)"
+            body = r["text"] or "(空の応答)"
+        elif r["status"] == "degraded":
+            header = f"[{r['agent']}] (degraded)"
+            body = "エージェントに到達できないため問い合わせていません。"
+        elif r["status"] == "timeout":
+            header = f"[{r['agent']}] (timeout after {r['elapsed']:.1f}s)"
+            body = "応答がタイムアウトしました。"
+        else:
+            header = f"[{r['agent']}] (error)"
+            body = r["text"]
+        sections.append(f"{header}\n{body}")
+    return "\n\n".join(sections)
+
+
+def make_fanout_tool(fanout: FanOut):
+    # strands is heavy to import; defer it until the orchestrator tools are built
+    from strands import tool
+
+    names = ", ".join(fanout.agents)
+
+    @tool
+    async def ask_agents_parallel(prompt: str, agents: Optional[List[str]] = None) -> str:
+        """Send the same prompt to several A2A sub-agents at once and return their answers merged.
+
+        Use this instead of calling sub-agents one by one when a question needs more than one of them.
+        Each answer is tagged with the agent name; agents that time out or fail are reported as such.
+
+        Args:
+            prompt: The message to send to every selected agent.
+            agents: Agent names to ask. Omit to ask all registered agents.
+        """
+        results = await fanout.ask_all(prompt, agents)
+        logger.info("fan-out: " + ", ".join(f"{r['agent']}={r['status']}/{r['elapsed']:.2f}s" for r in results))
+        return merge_results(results)
+
+    ask_agents_parallel.tool_spec["description"] += f"\n\nRegistered agents: {names}"
+    return ask_agents_parallel
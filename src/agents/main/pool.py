@@ -0,0 +1,154 @@
+"""Agent インスタンスのプールと受付制御。
+
+Strands の Agent は会話状態を持つため、同時リクエストで 1 インスタンスを共有すると
+応答が混ざる。リクエストごとにプールから 1 つ借り、終わったら返す。
+満杯時は期限付きで待つか、待ち行列が上限なら即座に PoolSaturated を投げる。
+プールの状態はイベントループのスレッドだけで触る。release() は別スレッド（Starlette の BackgroundTask は
+同期関数をスレッドプールで実行する）から呼ばれてもよく、そのときは借りたループへ戻してから返却する。
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Lease:
+    """借りた Agent。release() は何度呼んでもよい（ストリーム終了時と後処理の両方から呼ぶため）。"""
+
+    def __init__(self, pool: "AgentPool", agent: Any, wait_time: float, loop: asyncio.AbstractEventLoop):
+        self.pool = pool
+        self.agent = agent
+        self.wait_time = wait_time
+        self.loop = loop
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.pool._checkin(self.agent)
+            return
+        try:
+            # 待機者の Future はループのスレッドでしか完了させられない
+            self.loop.call_soon_threadsafe(self.pool._checkin, self.agent)
+        except RuntimeError:
+            # ループが閉じている（シャットダウン中）なら待機者もいない
+            self.pool._checkin(self.agent)
+
+
+class AgentPool:
+    def __init__(self, factory: Callable[[], Any], size: int = 4, max_waiters: int = 32, queue_timeout: float = 10.0):
+        self.factory = factory
+        self.size = size
+        self.max_waiters = max_waiters
+        self.queue_timeout = queue_timeout
+        self._idle: List[Any] = []
+        self._created = 0
+        self._in_use = 0
+        self._waiters: "List[asyncio.Future]" = []
+        self.acquired = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+
+    def _retry_after(self) -> float:
+        # 平均待ち時間を目安にする（最低 1 秒）
+        avg = self.wait_sum / self.wait_count if self.wait_count else 0.0
+        return max(1.0, round(avg * (len(self._waiters) + 1), 1))
+
+    def _record_wait(self, wait: float) -> None:
+        self.acquired += 1
+        self.wait_count += 1
+        self.wait_sum += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    async def acquire(self) -> Lease:
+        start = time.perf_counter()
+        if self._idle:
+            agent = self._idle.pop()
+        elif self._created < self.size:
+            self._created += 1
+            try:
+                agent = self.factory()
+            except Exception:
+                self._created -= 1
+                raise
+        else:
+            if len(self._waiters) >= self.max_waiters or self.queue_timeout <= 0:
+                self.rejected += 1
+                raise PoolSaturated("Agent pool saturated", self._retry_after())
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                agent = await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reclaim(waiter)
+                self.timed_out += 1
+                raise PoolSaturated("Timed out waiting for an agent", self._retry_after())
+            except asyncio.CancelledError:
+                self._reclaim(waiter)
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_use += 1
+        wait = time.perf_counter() - start
+        self._record_wait(wait)
+        return Lease(self, agent, wait, asyncio.get_running_loop())
+
+    def _reclaim(self, waiter: "asyncio.Future") -> None:
+        """タイムアウト・キャンセルの直前に渡されていた Agent をプールに戻す（次の待機者へ回す）。"""
+        if waiter.done() and not waiter.cancelled():
+            self._in_use += 1
+            self._checkin(waiter.result())
+
+    def prefill(self, count: int) -> int:
+        """起動時のウォームアップ用。空きがあれば count 個まで先に作っておき、作った数を返す。"""
+        made = 0
+        while made < count and self._created < self.size:
+            self._idle.append(self.factory())
+            self._created += 1
+            made += 1
+        return made
+
+    def _checkin(self, agent: Any) -> None:
+        self._in_use -= 1
+        while self._waiters:
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                # 待機者へ直接渡す（_in_use は待機者側で再加算される）
+                waiter.set_result(agent)
+                return
+        self._idle.append(agent)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "queue_depth": len(self._waiters),
+            "acquired_total": self.acquired,
+            "rejected_total": self.rejected,
+            "timed_out_total": self.timed_out,
+            "wait_seconds_avg": self.wait_sum / self.wait_count if self.wait_count else 0.0,
+            "wait_seconds_max": self.wait_max,
+        }
@@ -0,0 +1,147 @@
+"""幼児語プロンプトの高速経路（オーケストレーター LLM を通さない）。
+
+短いプロンプトを toddler-rag のインデックスで直接引き、プロンプトが語彙表のエントリの語と完全に一致したときだけ
+そのエントリを前提にした 1 回の LLM 呼び出し（またはテンプレート）で答える。
+- 字句インデックスがあれば、その完全一致（match == "entry"）だけを使う
+- なければベクトル検索で最も近いチャンクを引き、距離が閾値以内で、かつチャンク内にプロンプトと一致するエントリがあるとき
+それ以外（部分一致・似ているだけのチャンク）は従来どおりマルチエージェントの経路に流す。
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ..common.deadline import Hedger
+
+# toddler-rag はパッケージ名に使えないディレクトリ名なので、rag モジュールはパスを通して読む
+TODDLER_RAG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "toddler-rag")
+if TODDLER_RAG_DIR not in sys.path:
+    sys.path.append(TODDLER_RAG_DIR)
+
+from rag.aws import get_client  # noqa: E402,F401  (re-exported for agent.py)
+from rag.embeddings import invoke_embedding, validate_dimensions  # noqa: E402,F401  (re-exported for agent.py)
+from rag.lexical import LexicalIndex, match_entry  # noqa: E402
+from rag.vector_store import VectorStore, get_vector_store  # noqa: E402,F401  (re-exported for agent.py)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RouteDecision:
+    route: str  # "fast" / "full"
+    reason: str
+    hit: Optional[Dict[str, Any]] = None
+    elapsed: float = 0.0
+
+
+def hit_text(hit: Dict[str, Any]) -> str:
+    meta = hit.get("metadata") or {}
+    return (meta.get("source_text") or meta.get("text") or "").strip()
+
+
+def hit_meaning(hit: Dict[str, Any]) -> str:
+    """一致したエントリ（"buubu ブーブ" など）。チャンク全体ではない。"""
+    return (hit.get("entry") or "").strip()
+
+
+class ToddlerRouter:
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        embed: Callable[[str], List[float]],
+        max_distance: float = 0.3,
+        max_prompt_chars: int = 30,
+        lexical_index: Optional[LexicalIndex] = None,
+        query_hedger: Optional[Hedger] = None,
+        query_timeout: Optional[float] = None,
+    ):
+        self.vector_store = vector_store
+        self.embed = embed
+        self.max_distance = max_distance
+        self.max_prompt_chars = max_prompt_chars
+        self.lexical_index = lexical_index
+        self.query_hedger = query_hedger or Hedger("vector.query")
+        self.query_timeout = query_timeout
+        self._lock = threading.Lock()
+        self._decisions: Dict[str, int] = {}
+        self._latency: Dict[str, List[float]] = {}  # path -> [count, total, max]
+
+    def decide(self, prompt: str, embed: Optional[Callable[[str], Sequence[float]]] = None) -> RouteDecision:
+        """同期処理（インデックス検索・埋め込み）なので asyncio.to_thread から呼ぶ。
+
+        埋め込みはベクトル検索に進むときだけ呼ぶ。embed を渡すと self.embed の代わりに使う（呼び出し元と共有するため）。
+        """
+        start = time.perf_counter()
+        decision = self._decide(prompt.strip(), embed or self.embed)
+        decision.elapsed = time.perf_counter() - start
+        with self._lock:
+            key = f"{decision.route}:{decision.reason}"
+            self._decisions[key] = self._decisions.get(key, 0) + 1
+        return decision
+
+    def _decide(self, prompt: str, embed: Callable[[str], Sequence[float]]) -> RouteDecision:
+        if not prompt or len(prompt) > self.max_prompt_chars:
+            return RouteDecision("full", "long_prompt")
+        try:
+            if self.lexical_index is not None:
+                # n-gram の一致度は高くても別の語のことがあるので、エントリの語との完全一致だけを使う
+                hits = self.lexical_index.search(prompt, 1)
+                if hits and hits[0]["match"] == "entry" and hit_meaning(hits[0]):
+                    return RouteDecision("fast", "lexical", hits[0])
+                return RouteDecision("full", "no_entry", hits[0] if hits else None)
+            query = list(map(float, embed(prompt)))
+            hits = self.query_hedger.call(lambda: self.vector_store.query(query, top_k=1), self.query_timeout)
+        except Exception as e:
+            logger.warning(f"router lookup failed, using full path: {type(e).__name__}: {e}")
+            return RouteDecision("full", "error")
+        if not hits:
+            return RouteDecision("full", "no_hit")
+        if hits[0].get("distance", 1.0) > self.max_distance:
+            return RouteDecision("full", "low_confidence", hits[0])
+        # 近いチャンクでも、プロンプトそのもののエントリがなければ答えの根拠にしない
+        entry = match_entry(prompt, hit_text(hits[0]))
+        if not entry:
+            return RouteDecision("full", "no_entry", hits[0])
+        return RouteDecision("fast", "vector", {**hits[0], "entry": entry})
+
+    def record(self, path: str, elapsed: float) -> None:
+        with self._lock:
+            count, total, worst = self._latency.get(path, [0, 0.0, 0.0])
+            self._latency[path] = [count + 1, total + elapsed, max(worst, elapsed)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "decisions": dict(self._decisions),
+                "latency": {
+                    path: {"count": count, "avg_ms": round(total / count * 1000, 1), "max_ms": round(worst * 1000, 1)}
+                    for path, (count, total, worst) in self._latency.items()
+                },
+            }
+
+
+def fast_prompt(prompt: str, hit: Dict[str, Any]) -> str:
+    """1 回の LLM 呼び出しで答えるため、辞書の検索結果を前提としてプロンプトに添える。"""
+    return (
+        f"{prompt}\n\n"
+        "# 幼児語辞書の検索結果（この意味を前提に答え、他のエージェントは呼ばないこと）\n"
+        f"{hit_meaning(hit)}"
+    )
+
+
+def template_answer(prompt: str, hit: Dict[str, Any]) -> str:
+    return f"<{prompt.strip()}：{hit_meaning(hit)}>"
+
+
+def load_lexical_index(path: str) -> Optional[LexicalIndex]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return LexicalIndex.load(path)
+    except ValueError as e:
+        # 古い形式のインデックス。toddler-rag の scripts/embedding.py で作り直すまではベクトル検索で判定する
+        logger.warning(f"{e}; ignoring {path}")
+        return None
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+# main は相対 import を使うので、src から agents.main として読む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from agents.common.startup import Lazy  # noqa: E402
+from agents.main import agent as main_agent  # noqa: E402
+from agents.main.pool import AgentPool  # noqa: E402
+
+
+class FakeAgent:
+    def __init__(self):
+        self.prompts = []
+
+    async def stream_async(self, prompt):
+        self.prompts.append(prompt)
+        yield {"data": "full answer"}
+
+
+def test_open_stream_falls_through_to_pool_when_router_cannot_be_built(monkeypatch):
+    builds = []
+
+    def broken_router():
+        builds.append(1)
+        raise FileNotFoundError("local_index/vectors.npy")
+
+    fake = FakeAgent()
+    monkeypatch.setattr(main_agent, "toddler_router", Lazy(broken_router, "toddler router"))
+    monkeypatch.setattr(main_agent, "answer_cache", None)
+    monkeypatch.setattr(main_agent, "agent_pool", AgentPool(lambda: fake, size=1))
+
+    async def scenario():
+        texts = []
+        for _ in range(2):
+            events, lease, _ = await main_agent.open_stream(main_agent.PromptRequest(prompt="ブーブ"), None, False)
+            assert lease is not None
+            try:
+                texts.append("".join([e["text"] async for e in events if e["type"] == "text"]))
+            finally:
+                lease.release()
+        return texts
+
+    assert asyncio.run(scenario()) == ["full answer", "full answer"]
+    assert fake.prompts == ["ブーブ", "ブーブ"]
+    # 作れなかったことは覚えておき、リクエストごとに作り直さない
+    assert builds == [1]
+    assert main_agent.current_router(build=False) is None
+
+
+def test_lexical_fast_route_answers_without_embedding(monkeypatch):
+    from agents.main.answer_cache import SemanticAnswerCache
+    from agents.main.router import ToddlerRouter
+    from rag.lexical import LexicalIndex
+
+    embedded = []
+
+    def embed(text):
+        embedded.append(text)
+        return [1.0, 0.0]
+
+    index = LexicalIndex.build([{"key": "page-2", "text": "buubu  ブーブ @c", "metadata": {}}])
+    router = ToddlerRouter(None, embed, lexical_index=index)
+    monkeypatch.setattr(main_agent, "toddler_router", Lazy(lambda: router, "toddler router"))
+    monkeypatch.setattr(main_agent, "answer_cache", SemanticAnswerCache(embed))
+    monkeypatch.setattr(main_agent, "ROUTER_MODE", "template")
+
+    async def ask():
+        events, lease, cache_status = await main_agent.open_stream(
+            main_agent.PromptRequest(prompt="ぶーぶ"), None, False
+        )
+        assert lease is None
+        return cache_status, "".join([e["text"] async for e in events if e["type"] == "text"])
+
+    assert asyncio.run(ask()) == ("MISS", "<ぶーぶ：buubu ブーブ>")
+    # 2 回目は完全一致でキャッシュから返る
+    assert asyncio.run(ask()) == ("HIT", "<ぶーぶ：buubu ブーブ>")
+    assert embedded == []
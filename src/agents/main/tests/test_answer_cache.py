@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_cache import SemanticAnswerCache  # noqa: E402
+
+VECTORS = {
+    "ぶーぶ": [1.0, 0.0, 0.0],
+    "ぶーぶ!": [0.99, 0.1, 0.0],
+    "わんわん": [0.0, 1.0, 0.0],
+    "にゃんにゃん": [0.0, 0.0, 1.0],
+}
+
+
+def make_cache(**kwargs):
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return VECTORS[text]
+
+    return SemanticAnswerCache(embed, threshold=0.95, **kwargs), calls
+
+
+def test_exact_hit_does_not_embed():
+    cache, calls = make_cache()
+    cache.store("ぶーぶ", ["車のこと"], VECTORS["ぶーぶ"])
+    lookup = cache.lookup_exact(" ぶーぶ ")
+    assert lookup.chunks == ["車のこと"]
+    assert lookup.kind == "exact"
+    assert asyncio.run(cache.lookup("ぶーぶ")).kind == "exact"
+    assert calls == []
+    assert cache.stats()["exact_hits"] == 2
+
+
+def test_exact_miss_is_not_counted():
+    cache, _ = make_cache()
+    assert cache.lookup_exact("ぶーぶ") is None
+    assert cache.stats()["misses"] == 0
+
+
+def test_semantic_hit_and_miss():
+    cache, calls = make_cache()
+    cache.store("ぶーぶ", ["車のこと"], VECTORS["ぶーぶ"])
+    hit = asyncio.run(cache.lookup("ぶーぶ!"))
+    assert (hit.kind, hit.chunks) == ("semantic", ["車のこと"])
+    miss = asyncio.run(cache.lookup("わんわん"))
+    assert (miss.kind, miss.chunks) == ("miss", None)
+    assert calls == ["ぶーぶ!", "わんわん"]
+    stats = cache.stats()
+    assert (stats["semantic_hits"], stats["misses"]) == (1, 1)
+
+
+def test_lookup_uses_the_given_embed():
+    cache, calls = make_cache()
+    cache.store("ぶーぶ", ["車のこと"], VECTORS["ぶーぶ"])
+    lookup = asyncio.run(cache.lookup("ぶーぶ!", lambda text: VECTORS["ぶーぶ"]))
+    assert lookup.kind == "semantic"
+    assert calls == []
+
+
+def test_entry_without_vector_is_found_only_by_exact_match():
+    cache, _ = make_cache()
+    cache.store("ぶーぶ", ["車のこと"], None)
+    assert cache.lookup_exact("ぶーぶ").chunks == ["車のこと"]
+    assert asyncio.run(cache.lookup("ぶーぶ!")).kind == "miss"
+
+
+def test_expired_entries_are_dropped():
+    cache, _ = make_cache(ttl=0.01)
+    cache.store("ぶーぶ", ["車のこと"], VECTORS["ぶーぶ"])
+    time.sleep(0.02)
+    assert cache.lookup_exact("ぶーぶ") is None
+    assert asyncio.run(cache.lookup("ぶーぶ!")).kind == "miss"
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache, _ = make_cache(max_entries=2)
+    cache.store("ぶーぶ", ["車"], VECTORS["ぶーぶ"])
+    cache.store("わんわん", ["犬"], VECTORS["わんわん"])
+    cache.lookup_exact("ぶーぶ")
+    cache.store("にゃんにゃん", ["猫"], VECTORS["にゃんにゃん"])
+    assert cache.lookup_exact("わんわん") is None
+    assert cache.lookup_exact("ぶーぶ") is not None
+    assert cache.lookup_exact("にゃんにゃん") is not None
+
+
+def test_bypass_and_miss_counting():
+    cache, _ = make_cache()
+    cache.record_bypass()
+    cache.record_bypass()
+    cache.record_miss()
+    stats = cache.stats()
+    assert (stats["bypassed"], stats["misses"], stats["hit_rate"]) == (2, 1, 0.0)
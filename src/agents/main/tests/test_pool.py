@@ -0,0 +1,101 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pool import AgentPool, PoolSaturated  # noqa: E402
+
+
+def make_pool(size: int = 1, queue_timeout: float = 5.0) -> AgentPool:
+    made = []
+
+    def factory():
+        made.append(object())
+        return made[-1]
+
+    return AgentPool(factory, size=size, max_waiters=4, queue_timeout=queue_timeout)
+
+
+def test_release_from_another_thread_wakes_pending_waiter():
+    async def scenario():
+        pool = make_pool()
+        lease = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.stats()["queue_depth"] == 1
+
+        # Starlette の BackgroundTask と同じく、ループ外のスレッドから返却する
+        errors = []
+
+        def release():
+            try:
+                lease.release()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=release)
+        thread.start()
+        thread.join()
+        assert errors == []
+        second = await asyncio.wait_for(waiter, timeout=1)
+
+        assert second.agent is lease.agent
+        assert pool.stats()["in_use"] == 1
+        second.release()
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 1
+
+    # debug モードのループは、別スレッドから Future を完了させると RuntimeError にする
+    asyncio.run(scenario(), debug=True)
+
+
+def test_release_is_idempotent():
+    async def scenario():
+        pool = make_pool()
+        lease = await pool.acquire()
+        lease.release()
+        lease.release()
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_agent_handed_to_cancelled_waiter_returns_to_pool():
+    async def scenario():
+        pool = make_pool()
+        lease = await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+
+        # 待機者に渡された直後、待機者のタスクが再開する前にキャンセルされる
+        lease.release()
+        waiter.cancel()
+        try:
+            leaked = await waiter
+        except asyncio.CancelledError:
+            leaked = None
+        if leaked is not None:
+            # asyncio.wait_for が結果を優先して返す Python のバージョンでは、呼び出し側が返す
+            leaked.release()
+
+        assert pool.stats()["in_use"] == 0
+        third = await asyncio.wait_for(pool.acquire(), timeout=1)
+        assert third.agent is lease.agent
+
+    asyncio.run(scenario())
+
+
+def test_timeout_raises_pool_saturated():
+    async def scenario():
+        pool = make_pool(queue_timeout=0.05)
+        await pool.acquire()
+        with pytest.raises(PoolSaturated):
+            await pool.acquire()
+        assert pool.stats()["timed_out_total"] == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import os
+import sys
+
+# main は相対 import を使うので、src から agents.main として読む
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from agents.main.router import ToddlerRouter  # noqa: E402
+from rag.lexical import LexicalIndex  # noqa: E402
+from rag.vector_store import VectorStore  # noqa: E402
+
+CHUNK = "atsuiatsui  アツイアツイ @c buubu  ブーブ @c chacha  チャチャ @c"
+
+
+class FakeStore(VectorStore):
+    def __init__(self, hits=None, error=None):
+        self.hits = hits or []
+        self.error = error
+        self.queries = 0
+
+    def query(self, embedding, top_k=3, filter=None):
+        self.queries += 1
+        if self.error is not None:
+            raise self.error
+        return self.hits[:top_k]
+
+
+def vector_hit(distance, text=CHUNK):
+    return {"key": "page-2", "distance": distance, "metadata": {"source_text": text}}
+
+
+def make_router(store=None, lexical=False):
+    index = LexicalIndex.build([{"key": "page-2", "text": CHUNK, "metadata": {}}]) if lexical else None
+    return ToddlerRouter(store or FakeStore(), lambda text: [0.1, 0.2], max_distance=0.3, max_prompt_chars=10,
+                         lexical_index=index)
+
+
+def test_long_prompt_takes_full_path():
+    decision = make_router().decide("ブーブってなに？ブーブってなに？")
+    assert (decision.route, decision.reason) == ("full", "long_prompt")
+
+
+def test_lexical_entry_hit_takes_fast_path_without_vector_search():
+    store = FakeStore([vector_hit(0.0)])
+    decision = make_router(store, lexical=True).decide("ぶーぶ")
+    assert (decision.route, decision.reason) == ("fast", "lexical")
+    assert decision.hit["entry"] == "buubu ブーブ"
+    assert store.queries == 0
+
+
+def test_lexical_miss_takes_full_path_without_vector_search():
+    store = FakeStore([vector_hit(0.0)])
+    decision = make_router(store, lexical=True).decide("ぶーぶちゃん")
+    assert (decision.route, decision.reason) == ("full", "no_entry")
+    assert store.queries == 0
+
+
+def test_vector_hit_with_entry_takes_fast_path():
+    decision = make_router(FakeStore([vector_hit(0.1)])).decide("ブーブ")
+    assert (decision.route, decision.reason) == ("fast", "vector")
+    assert decision.hit["entry"] == "buubu ブーブ"
+
+
+def test_distant_vector_hit_is_low_confidence():
+    decision = make_router(FakeStore([vector_hit(0.5)])).decide("ブーブ")
+    assert (decision.route, decision.reason) == ("full", "low_confidence")
+
+
+def test_close_vector_hit_without_matching_entry_takes_full_path():
+    decision = make_router(FakeStore([vector_hit(0.1)])).decide("ブーブちゃん")
+    assert (decision.route, decision.reason) == ("full", "no_entry")
+
+
+def test_lookup_error_takes_full_path():
+    decision = make_router(FakeStore(error=RuntimeError("boom"))).decide("ブーブ")
+    assert (decision.route, decision.reason) == ("full", "error")
@@ -1,25 +1,41 @@
 import asyncio
 import logging
 import os
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, status
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from strands import Agent
+from strands.models import BedrockModel
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 
+from ..common.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, agent_metrics_hooks, instrument_stream
+from ..common.sessions import SessionStore, llm_summarizer
+from ..common.streaming import StreamEvent, agent_events, streaming_response
+
 load_dotenv()
 MODEL_ID = os.getenv("BEDROCK_MODEL_ID","")
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 20))
+SESSION_TOKEN_BUDGET = int(os.getenv("SESSION_TOKEN_BUDGET", 4000))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 1800))
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "false").lower() == "true"
+STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", 50))
+STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", 4096))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", 15))
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 app = FastAPI(title="Strands Agent Streaming API", version="0.1.0")
+# Trace IDs and per-request timing. GET /metrics is a route below so it sits behind the bearer token
+app.add_middleware(MetricsMiddleware, metrics_path=None)
 
 class PromptRequest(BaseModel):
     prompt: str
+    session_id: Optional[str] = None
 
     
 # Load system prompt from file
@@ -32,7 +48,20 @@ def load_system_prompt():
     with open(prompt_path, "r", encoding="utf-8") as f:
         return f.read()
 
-agent_instance = Agent(tools=[], callback_handler=None, model=MODEL_ID, system_prompt=load_system_prompt())
+# Model client is shared; each request gets a lightweight Agent holding only its session's history
+model = BedrockModel(model_id=MODEL_ID) if MODEL_ID else BedrockModel()
+system_prompt = load_system_prompt()
+
+def create_agent() -> Agent:
+    return Agent(tools=[], callback_handler=None, model=model, system_prompt=system_prompt, hooks=[agent_metrics_hooks])
+
+session_store = SessionStore(
+    max_messages=SESSION_MAX_MESSAGES,
+    token_budget=SESSION_TOKEN_BUDGET,
+    max_sessions=SESSION_MAX_SESSIONS,
+    idle_ttl=SESSION_IDLE_TTL,
+    summarizer=llm_summarizer(lambda: Agent(callback_handler=None, model=model)) if SESSION_SUMMARIZE else None,
+)
 
 # 認証設定追加
 security = HTTPBearer(auto_error=False)
@@ -63,47 +92,59 @@ def require_bearer_token(
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "sessions": session_store.stats()}
+
+@app.get("/metrics")
+async def metrics(_: None = Depends(require_bearer_token)):
+    """Prometheus text format metrics (same bearer token as the API)."""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+def respond(fmt: str, request: PromptRequest, x_session_id: Optional[str]) -> StreamingResponse:
+    session_id = request.session_id or x_session_id
+
+    async def events() -> AsyncGenerator[StreamEvent, None]:
+        async with session_store.bind(create_agent(), session_id, system_prompt) as agent:
+            async for event in agent_events(agent.stream_async(request.prompt)):
+                yield event
+
+    return streaming_response(
+        instrument_stream(events(), "full"),
+        fmt,
+        window=STREAM_COALESCE_MS / 1000,
+        max_bytes=STREAM_COALESCE_BYTES,
+        heartbeat=STREAM_HEARTBEAT_SECONDS,
+    )
 
 @app.post("/stream")
-async def stream_response(request: PromptRequest, _: None = Depends(require_bearer_token)):
-    """Plain text streaming endpoint (newline delimited)."""
-
-    async def generate() -> AsyncGenerator[bytes, None]:
-        try:
-            async for event in agent_instance.stream_async(request.prompt):
-                # Strands event objects typically contain 'data' for incremental text
-                chunk = event.get("data") if isinstance(event, dict) else None
-                if chunk:
-                    yield (chunk + "\n").encode("utf-8")
-        except Exception as e:  # Broad catch to ensure stream closes cleanly
-            logger.exception("stream error")
-            yield f"Error: {type(e).__name__}: {e}\n".encode("utf-8")
-
-    return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
+async def stream_response(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
+    """Plain text streaming endpoint (the answer text as-is)."""
+    return respond("text", request, x_session_id)
 
 @app.post("/stream_sse")
-async def stream_sse(request: PromptRequest, _: None = Depends(require_bearer_token)):
+async def stream_sse(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
     """Server-Sent Events (SSE) style streaming endpoint."""
+    return respond("sse", request, x_session_id)
 
-    async def event_source() -> AsyncGenerator[bytes, None]:
-        try:
-            async for event in agent_instance.stream_async(request.prompt):
-                chunk = event.get("data") if isinstance(event, dict) else None
-                if chunk:
-                    # SSE format: data: <payload> \n\n
-                    yield f"data: {chunk}\n\n".encode("utf-8")
-            # Signal end of stream
-            yield b"event: end\ndata: done\n\n"
-        except Exception as e:
-            logger.exception("sse stream error")
-            yield f"event: error\ndata: {type(e).__name__}: {e}\n\n".encode("utf-8")
-
-    return StreamingResponse(event_source(), media_type="text/event-stream")
+@app.post("/stream_ndjson")
+async def stream_ndjson(
+    request: PromptRequest,
+    x_session_id: Optional[str] = Header(default=None),
+    _: None = Depends(require_bearer_token),
+):
+    """NDJSON streaming endpoint (text and tool events, one JSON object per line)."""
+    return respond("ndjson", request, x_session_id)
 
 @app.get("/")
 async def root():
-    return {"message": "Use POST /stream or /stream_sse with {'prompt':'...'}"}
+    return {"message": "Use POST /stream, /stream_sse or /stream_ndjson with {'prompt':'...'}"}
 
 # Optional: graceful shutdown hook (if future cleanup needed)
 @app.on_event("shutdown")
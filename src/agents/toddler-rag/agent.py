@@ -1,25 +1,94 @@
-import json
 import logging
 import os
+import sys
 
-import boto3
 from pydantic import BaseModel
-from strands import Agent, tool
-from strands.multiagent.a2a import A2AServer
 from dotenv import load_dotenv
+from rag.aws import get_client, run_in_pool
+from rag.embed_cache import EmbeddingCache
+from rag.embeddings import embedding_tag, invoke_embedding, validate_dimensions
+from rag.lexical import LexicalIndex, fuse_rrf
+from rag.vector_store import get_vector_store
+
+# src/agents/common を読むため
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.deadline import DeadlineMiddleware, Hedger  # noqa: E402
+from common.metrics import MetricsMiddleware, agent_metrics_hooks  # noqa: E402
+from common.startup import Lazy, StartupTimer, warm_up  # noqa: E402
 
 load_dotenv()
 MODEL_ID = os.getenv("BEDROCK_MODEL_ID","")
 REGION = os.getenv("AWS_REGION", "us-west-2")
 EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+# 登録時 (scripts/embedding.py) と同じ次元・正規化で埋め込む
+EMBED_DIMENSIONS = validate_dimensions(int(os.getenv("EMBED_DIMENSIONS", 1024)))
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true").lower() == "true"
 VECTOR_BUCKET = os.getenv("VECTOR_BUCKET_NAME", "tollder-vector-bucket")
 VECTOR_INDEX = os.getenv("VECTOR_INDEX_NAME", "tollder-index")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", 1024))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or None
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "s3")  # "s3" or "local"
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_index"))
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION") or None  # 未指定ならインデックス書き出し時の設定
+LOCAL_RESCORE_FACTOR = int(os.getenv("LOCAL_RESCORE_FACTOR", 4))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexical_index.json"))
+LEXICAL_MODE = os.getenv("LEXICAL_MODE", "fast_path")  # "fast_path", "hybrid" or "off"
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", 0.8))
+# 呼び出し元が X-Request-Timeout-Ms を付けなかったときのデッドライン
+A2A_REQUEST_TIMEOUT = float(os.getenv("A2A_REQUEST_TIMEOUT", 60))
+HOST = os.getenv("TODDLER_RAG_HOST", "127.0.0.1")
+PORT = int(os.getenv("TODDLER_RAG_PORT", 9001))
+# 起動時（リクエスト受付前）にクライアント・インデックス・キャッシュを作っておく
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", 0.95))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", 10))
+VECTOR_QUERY_TIMEOUT = float(os.getenv("VECTOR_QUERY_TIMEOUT", 10))
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-bedrock = boto3.client("bedrock-runtime", region_name=REGION)
-s3vectors = boto3.client("s3vectors", region_name=REGION)
+startup = StartupTimer("toddler_rag")
+
+# 接続プール・リトライ設定を揃えた共有クライアント。import 時には作らず、warm-up か初回の検索で作る
+# 期限を過ぎて見捨てた呼び出しも botocore 側で打ち切られるよう、クライアントのタイムアウトを期限に合わせる
+bedrock = Lazy(lambda: get_client("bedrock-runtime", REGION, timeout=EMBED_TIMEOUT), "bedrock-runtime client")
+s3vectors = Lazy(lambda: get_client("s3vectors", REGION, timeout=VECTOR_QUERY_TIMEOUT), "s3vectors client")
+embed_cache = Lazy(lambda: EmbeddingCache(maxsize=EMBED_CACHE_SIZE, path=EMBED_CACHE_PATH), "embedding cache")
+vector_store = Lazy(
+    lambda: get_vector_store(
+        VECTOR_BACKEND,
+        client=s3vectors.get() if VECTOR_BACKEND == "s3" else None,
+        bucket=VECTOR_BUCKET,
+        index=VECTOR_INDEX,
+        local_dir=LOCAL_INDEX_DIR,
+        quantization=LOCAL_INDEX_QUANTIZATION,
+        rescore_factor=LOCAL_RESCORE_FACTOR,
+    ),
+    "vector store",
+)
+EMBED_TAG = embedding_tag(EMBED_MODEL_ID, EMBED_DIMENSIONS, EMBED_NORMALIZE)
+
+
+def load_lexical_index():
+    if LEXICAL_MODE == "off":
+        return None
+    if not os.path.exists(LEXICAL_INDEX_PATH):
+        logger.warning(f"Lexical index not found, using vector search only: {LEXICAL_INDEX_PATH}")
+        return None
+    try:
+        return LexicalIndex.load(LEXICAL_INDEX_PATH)
+    except ValueError as e:
+        # 古い形式のインデックス。scripts/embedding.py を実行し直すまでベクトル検索だけを使う
+        logger.warning(f"{e}; rebuild it with scripts/embedding.py. Using vector search only: {LEXICAL_INDEX_PATH}")
+        return None
+
+
+lexical_index = Lazy(load_lexical_index, "lexical index")
+
+# 埋め込み・ベクトル検索は冪等なので、遅いときはヘッジできる
+embed_hedger = Hedger("bedrock.embed", hedge=HEDGE_ENABLED, quantile=HEDGE_QUANTILE)
+vector_query_hedger = Hedger("vector.query", hedge=HEDGE_ENABLED, quantile=HEDGE_QUANTILE)
 
 
 class PromptRequest(BaseModel):
@@ -36,59 +105,112 @@ def load_system_prompt():
         return f.read()
 
 
-@tool
-def search_toddler_index(prompt: str, top_k: int = 3) -> str:
-    """
-    Convert natural language prompt to an embedding (Titan) and query S3 Vector index
-    for similar content. Returns a newline-delimited summary of results.
-    """
-    try:
-        embed_resp = bedrock.invoke_model(
-            modelId=EMBED_MODEL_ID,
-            body=json.dumps({"inputText": prompt}),
-        )
-        model_payload = json.loads(embed_resp["body"].read())
-        embedding = model_payload["embedding"]
-
-        query_resp = s3vectors.query_vectors(
-            vectorBucketName=VECTOR_BUCKET,
-            indexName=VECTOR_INDEX,
-            queryVector={"float32": embedding},
-            topK=top_k,
-            returnDistance=True,
-            returnMetadata=True,
-        )
-        vectors = query_resp.get("vectors", [])
-        if not vectors:
-            return "No similar content found."
+def embed_text(text: str) -> list[float]:
+    return embed_hedger.call(
+        lambda: invoke_embedding(bedrock.get(), EMBED_MODEL_ID, text, EMBED_DIMENSIONS, EMBED_NORMALIZE),
+        EMBED_TIMEOUT,
+    )
 
-        lines = []
-        for v in vectors:
-            vid = v.get("id")
+
+def format_hits(hits: list[dict]) -> str:
+    lines = []
+    for v in hits:
+        vid = v.get("key")
+        meta = v.get("metadata", {})
+        if "distance" in v:
             dist = v.get("distance")
-            meta = v.get("metadata", {})
             try:
                 dist_fmt = f"{dist:.4f}"
             except Exception:
                 dist_fmt = str(dist)
             lines.append(f"id={vid} distance={dist_fmt} metadata={meta}")
-        return "\n".join(lines)
+        else:
+            lines.append(f"id={vid} lexical_score={v.get('score', 0.0):.4f} entry={v.get('entry')} metadata={meta}")
+    return "\n".join(lines)
+
+
+def find_similar(prompt: str, top_k: int = 3) -> list[dict]:
+    """Lexical fast path first, then embedding + vector search (optionally fused with lexical ranks)."""
+    lexical = lexical_index.get()
+    lexical_hits = lexical.search(prompt, top_k) if lexical is not None else []
+    if LEXICAL_MODE == "fast_path" and lexical_hits and lexical_hits[0]["score"] >= LEXICAL_MIN_SCORE:
+        return lexical_hits
+
+    # 同じ幼児語の繰り返しが多いため、埋め込みは (正規化テキスト, モデル・次元) でキャッシュ
+    embedding = embed_cache.get().get_or_compute(prompt, EMBED_TAG, embed_text)
+    store = vector_store.get()
+    vectors = vector_query_hedger.call(lambda: store.query(embedding, top_k=top_k), VECTOR_QUERY_TIMEOUT)
+    if LEXICAL_MODE == "hybrid" and lexical_hits:
+        return fuse_rrf([vectors, lexical_hits], top_k=top_k)
+    return vectors
+
+
+async def search_toddler_index(prompt: str, top_k: int = 3) -> str:
+    """
+    Convert natural language prompt to an embedding (Titan) and query the vector index
+    for similar content. Returns a newline-delimited summary of results.
+    """
+    try:
+        # Bedrock / S3 Vectors の同期呼び出しは AWS 用スレッドプールで実行し、イベントループを止めない
+        hits = await run_in_pool(find_similar, prompt, top_k)
+        if not hits:
+            return "No similar content found."
+        return format_hits(hits)
 
     except Exception as e:
         logger.exception("Vector search failed")
         return f"Vector search error: {type(e).__name__}: {e}"
 
-agent_instance = Agent(
-                    description="幼児言葉を理解し推測する言葉を出力するエージェント",
-                    model=MODEL_ID,
-                    tools=[search_toddler_index],
-                    callback_handler=None,
-                    system_prompt=load_system_prompt(),
-                    )
-
-server = A2AServer(
-    agent=agent_instance, 
-    port=9001,
-)
 
-server.serve()
+def create_app():
+    """A2A サーバのアプリを作る（import しただけではサーバもクライアントも作らない）。
+
+    uvicorn --factory agent:create_app でも起動できる。
+    """
+    with startup.phase("import strands"):
+        from strands import Agent, tool
+        from strands.multiagent.a2a import A2AServer
+
+    with startup.phase("create agent"):
+        agent_instance = Agent(
+            description="幼児言葉を理解し推測する言葉を出力するエージェント",
+            model=MODEL_ID,
+            tools=[tool(search_toddler_index)],
+            callback_handler=None,
+            system_prompt=load_system_prompt(),
+            hooks=[agent_metrics_hooks],
+        )
+
+        server = A2AServer(
+            agent=agent_instance,
+            host=HOST,
+            port=PORT,
+        )
+
+        # リクエストごとのデッドラインを設定・強制するため、A2A アプリにミドルウェアを挟んで起動する
+        app = server.to_starlette_app()
+        app.add_middleware(DeadlineMiddleware, default_timeout=A2A_REQUEST_TIMEOUT, enforce=True)
+        # 呼び出し元の X-Trace-Id を引き継ぎ、GET /metrics でレイテンシを公開する
+        app.add_middleware(MetricsMiddleware)
+    if WARMUP_ON_STARTUP:
+        # uvicorn は startup が終わるまで接続を受け付けない
+        app.add_event_handler("startup", lambda: warm_up(startup, warm_up_steps()))
+    return app
+
+
+def warm_up_steps() -> dict:
+    steps = {"bedrock client": bedrock.get, "embedding cache": embed_cache.get, "lexical index": lexical_index.get}
+    if VECTOR_BACKEND == "s3":
+        steps["s3vectors client"] = s3vectors.get
+    steps["vector store"] = vector_store.get
+    return steps
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(create_app(), host=HOST, port=PORT)
+
+
+if __name__ == "__main__":
+    main()
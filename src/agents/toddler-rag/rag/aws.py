@@ -0,0 +1,100 @@
+"""Bedrock / S3 Vectors クライアントの共通ファクトリ。
+
+- 接続プールの大きさ・adaptive リトライ・TCP keep-alive・タイムアウトを揃えた botocore Config を使う
+- 登録・削除のパイプライン（IngestPipeline / VectorDeleter）は自前でスロットリングを数えて AIMD で調整しリトライするので、
+  botocore のリトライを切ったクライアント（retries=False）を使う。二重にリトライすると 1 チャンクで数十回試行し、
+  スロットリングが botocore に吸収されてレート制御に見えなくなる
+- 期限付きで呼ぶ検索経路（埋め込み・ベクトル検索）は timeout を渡し、期限を過ぎた呼び出しが botocore 側で打ち切られるようにする
+- クライアントは (サービス, リージョン, リトライ有無, タイムアウト) ごとに 1 つだけ作って共有する（boto3 のクライアントはスレッドセーフ）
+- run_in_pool で、同期 API をイベントループを止めずに専用スレッドプールで実行する
+- boto3 / botocore の import は最初のクライアント作成まで遅らせる（エージェントの import を軽くするため）
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, TypeVar
+
+if TYPE_CHECKING:
+    from botocore.config import Config
+
+T = TypeVar("T")
+
+REGION = os.getenv("AWS_REGION", "us-west-2")
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", 50))
+MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", 5))
+CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", 60))
+
+_clients: Dict[Tuple[str, str, bool, Optional[float]], Any] = {}
+_overrides: Dict[Tuple[str, str], Any] = {}
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def client_config(
+    max_pool_connections: int = MAX_POOL_CONNECTIONS, retries: bool = True, timeout: Optional[float] = None
+) -> "Config":
+    """timeout を渡すと、接続・読み取りのタイムアウトをその秒数以下にする。"""
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=max_pool_connections,
+        retries=(
+            {"mode": "adaptive", "total_max_attempts": MAX_ATTEMPTS}
+            if retries
+            else {"mode": "standard", "total_max_attempts": 1}
+        ),
+        tcp_keepalive=True,
+        connect_timeout=CONNECT_TIMEOUT if timeout is None else min(CONNECT_TIMEOUT, timeout),
+        read_timeout=READ_TIMEOUT if timeout is None else timeout,
+    )
+
+
+def get_client(
+    service: str, region: Optional[str] = None, retries: bool = True, timeout: Optional[float] = None
+) -> Any:
+    """共有クライアントを返す（初回だけ作成）。
+
+    retries=False は自前でリトライする呼び出し元用。timeout は Hedger で期限を切る呼び出し元用で、
+    期限切れで見捨てた呼び出しが既定の READ_TIMEOUT までスレッドを占有し続けないようにする。
+    """
+    region = region or REGION
+    key = (service, region, retries, timeout)
+    with _lock:
+        override = _overrides.get((service, region))
+        if override is not None:
+            return override
+        # boto3 のデフォルトセッションでのクライアント作成はスレッドセーフでないのでロック内で行う
+        client = _clients.get(key)
+        if client is None:
+            import boto3
+
+            client = boto3.client(service, region_name=region, config=client_config(retries=retries, timeout=timeout))
+            _clients[key] = client
+        return client
+
+
+def set_client(service: str, client: Any, region: Optional[str] = None) -> None:
+    """get_client が返すクライアントを（リトライ設定によらず）差し替える（rag.fakes を使うベンチマーク・検証用）。"""
+    with _lock:
+        _overrides[(service, region or REGION)] = client
+
+
+def _pool() -> ThreadPoolExecutor:
+    # 同時実行数を接続プールに合わせ、接続待ちでスレッドが詰まらないようにする
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_POOL_CONNECTIONS, thread_name_prefix="aws")
+        return _executor
+
+
+async def run_in_pool(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """同期関数を AWS 用スレッドプールで実行する（contextvars も引き継ぐ）。"""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_pool(), call)
+
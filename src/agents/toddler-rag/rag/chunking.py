@@ -0,0 +1,93 @@
+"""テキストのチャンク分割。
+
+- "sentence": 句点（。！？など）・改行・英文のピリオドで文に分け、目標サイズまで文を詰める。
+  次のチャンクの先頭には直前の文を overlap 文字まで重ねる。目標サイズを超える 1 文は読点や空白で切る
+- "fixed": 従来どおり size 文字ごとに切る（比較用）
+"""
+import re
+from typing import List
+
+# 文末記号（続く閉じ括弧も同じ文に含める）。英文のピリオドは後ろが空白のときだけ
+_SENTENCE_END = re.compile(r"(?:[。！？!?…]+[」』）)\]]*|\.(?=\s)|\n+)")
+# 長すぎる文を切るときに優先する位置
+_SOFT_BREAK = re.compile(r"[、，,;；:：]\s*|\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        sentence = text[start:end].strip()
+        if sentence:
+            sentences.append(sentence)
+        start = end
+    rest = text[start:].strip()
+    if rest:
+        sentences.append(rest)
+    return sentences
+
+
+def _split_long(sentence: str, size: int) -> List[str]:
+    """size を超える文を、読点・空白の位置（なければ size 文字）で切る。"""
+    pieces = []
+    while len(sentence) > size:
+        cut = 0
+        for match in _SOFT_BREAK.finditer(sentence, 0, size):
+            # 短すぎる断片を作らないよう、後半にある区切りだけを使う
+            if match.end() >= size // 2:
+                cut = match.end()
+        cut = cut or size
+        pieces.append(sentence[:cut].strip())
+        sentence = sentence[cut:].strip()
+    if sentence:
+        pieces.append(sentence)
+    return pieces
+
+
+def _join(parts: List[str]) -> str:
+    text = ""
+    for part in parts:
+        # 英数字どうしがくっつかないようにだけ空白を入れる（日本語は詰める）
+        if text and text[-1].isascii() and text[-1].isalnum() and part[0].isascii() and part[0].isalnum():
+            text += " "
+        text += part
+    return text
+
+
+def chunk_text(text: str, size: int = 500, overlap: int = 100, mode: str = "sentence") -> List[str]:
+    text = text.strip()
+    if not text:
+        return []
+    if mode == "fixed":
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    if mode != "sentence":
+        raise ValueError(f"Unknown chunk mode: {mode}")
+    overlap = max(0, min(overlap, size // 2))
+
+    units: List[str] = []
+    for sentence in split_sentences(text):
+        units.extend(_split_long(sentence, size))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    length = 0
+    fresh = 0  # current のうち、前のチャンクと重なっていない文の数
+    for unit in units:
+        if current and length + len(unit) > size:
+            chunks.append(_join(current))
+            # 末尾から overlap 文字に収まるだけの文を次のチャンクに持ち越す
+            carried: List[str] = []
+            carried_len = 0
+            for prev in reversed(current):
+                if carried_len + len(prev) > overlap or carried_len + len(prev) + len(unit) > size:
+                    break
+                carried.insert(0, prev)
+                carried_len += len(prev)
+            current, length, fresh = carried, carried_len, 0
+        current.append(unit)
+        length += len(unit)
+        fresh += 1
+    if current and fresh:
+        chunks.append(_join(current))
+    return chunks
@@ -0,0 +1,177 @@
+"""登録前のほぼ重複チャンクの除去（文字シングル + MinHash + LSH）。
+
+PDF にはヘッダ・語彙表・版違いのほぼ同じページが繰り返し出てくるので、
+- かな正規化したテキストの文字 k-gram（シングル）から MinHash 署名を作り
+- 署名をバンドに分けた LSH で候補を引き、推定 Jaccard 類似度が閾値以上なら同じクラスタにまとめる
+クラスタの代表（最初に追加したチャンク）だけを埋め込み、ほかの出典は代表のメタデータに残す。
+チャンクは届いた順に 1 つずつ add() する（全件をためない）。署名は seed から決まるハッシュで作るので、
+毎回同じ順（rag.extraction の ordered=True）で追加すれば、実行ごと・プロセスごとに同じチャンクが代表になる。
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from rag.lexical import normalize_kana
+
+# 2^32 より大きい素数（32 ビットのハッシュ値に対する universal hashing 用）
+_PRIME = np.uint64(4294967311)
+
+
+def shingles(text: str, k: int = 5) -> List[str]:
+    """かな正規化したテキストの文字 k-gram（重複なし）。k より短いテキストは全体を 1 つにする。"""
+    normalized = normalize_kana(text)
+    if len(normalized) <= k:
+        return [normalized] if normalized else []
+    return list({normalized[i:i + k] for i in range(len(normalized) - k + 1)})
+
+
+def _hash32(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def _candidate_probability(similarity: float, bands: int, rows: int) -> float:
+    return 1 - (1 - similarity ** rows) ** bands
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) を選ぶ。閾値未満が候補になる確率と、閾値以上が候補から漏れる確率の面積の和を最小にする。
+
+    候補は推定 Jaccard で確かめ直すので、漏れ（重複を埋め込んでしまう）を重めに数える。
+    """
+    steps = 200
+    best, best_cost = (num_perm, 1), float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        false_positive = sum(
+            _candidate_probability(threshold * i / steps, bands, rows) for i in range(steps)
+        ) * threshold / steps
+        false_negative = sum(
+            1 - _candidate_probability(threshold + (1 - threshold) * i / steps, bands, rows) for i in range(steps)
+        ) * (1 - threshold) / steps
+        cost = 0.25 * false_positive + 0.75 * false_negative
+        if cost < best_cost:
+            best, best_cost = (bands, rows), cost
+    return best
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        # a * x + b が uint64 に収まるよう a, b は 2^31 未満
+        self._a = rng.randint(1, 2**31 - 1, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, 2**31 - 1, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        hashes = np.fromiter((_hash32(g) for g in grams), dtype=np.uint64, count=len(grams))
+        return ((hashes[:, None] * self._a + self._b) % _PRIME).min(axis=0)
+
+
+def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+    """署名をバンドに分け、いずれかのバンドが一致したものを候補として返す。"""
+
+    def __init__(self, num_perm: int = 128, threshold: float = 0.8):
+        self.bands, self.rows = lsh_params(num_perm, threshold)
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def insert(self, key: str, signature: np.ndarray) -> None:
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            bucket.setdefault(band, []).append(key)
+
+    def query(self, signature: np.ndarray) -> List[str]:
+        seen: Dict[str, None] = {}
+        for bucket, band in zip(self._buckets, self._band_keys(signature)):
+            for key in bucket.get(band, ()):
+                seen.setdefault(key)
+        return list(seen)
+
+
+@dataclass
+class DedupStats:
+    chunks: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    candidates_checked: int = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    @property
+    def unique(self) -> int:
+        return self.chunks - self.duplicates
+
+    @property
+    def ratio(self) -> float:
+        """除去した割合（0〜1）。"""
+        return self.duplicates / self.chunks if self.chunks else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.chunks} チャンク -> {self.unique} 代表 "
+            f"(完全重複 {self.exact_duplicates}, ほぼ重複 {self.near_duplicates}, 除去率 {self.ratio:.1%}, "
+            f"節約した埋め込み呼び出し {self.duplicates} 回)"
+        )
+
+
+@dataclass
+class Cluster:
+    representative: str
+    members: List[str] = field(default_factory=list)  # 代表以外のキー（追加順）
+
+
+class Deduplicator:
+    """add() した順に、既存の代表とほぼ重複なら代表のキーを、そうでなければ None を返す。"""
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size, seed)
+        self.index = LSHIndex(num_perm, threshold)
+        self.clusters: Dict[str, Cluster] = {}
+        self.stats = DedupStats()
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._exact: Dict[str, str] = {}  # 正規化テキストのハッシュ -> 代表キー
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        self.stats.chunks += 1
+        digest = hashlib.sha256(normalize_kana(text).encode("utf-8")).hexdigest()
+        representative = self._exact.get(digest)
+        if representative is not None:
+            self.stats.exact_duplicates += 1
+            self.clusters[representative].members.append(key)
+            return representative
+
+        signature = self.hasher.signature(text)
+        best, best_score = None, self.threshold
+        for candidate in self.index.query(signature):
+            self.stats.candidates_checked += 1
+            score = estimate_jaccard(signature, self._signatures[candidate])
+            if score >= best_score:
+                best, best_score = candidate, score
+        if best is not None:
+            self.stats.near_duplicates += 1
+            self.clusters[best].members.append(key)
+            return best
+
+        # 代表だけを LSH に入れる（クラスタは代表を中心に広がり、連鎖しない）
+        self._exact[digest] = key
+        self._signatures[key] = signature
+        self.index.insert(key, signature)
+        self.clusters[key] = Cluster(key)
+        return None
+
@@ -0,0 +1,164 @@
+"""ベクトルの一括削除（バッチ化・並列化・選択削除）。
+
+- delete_vectors は API 上限（500 キー）ずつまとめて発行する
+- 一覧取得（list_vectors、segmentCount で分割して並列化可）と削除ワーカーを重ねて動かす
+- source_file・キー接頭辞・キー集合（マニフェストとの差分など）で対象を絞れる
+- スロットリング・一時的なエラーのリトライは botocore（rag.aws の adaptive リトライ）に任せる
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from rag.ingest import MAX_PUT_BATCH
+
+# list_vectors の maxResults 上限
+MAX_LIST_RESULTS = 1000
+
+
+@dataclass
+class DeleteStats:
+    listed: int = 0
+    matched: int = 0
+    deleted: int = 0
+    batches: int = 0
+    pages: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def keys_per_sec(self) -> float:
+        return self.deleted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"一覧 {self.listed} 件 ({self.pages} ページ), 対象 {self.matched} 件, "
+            f"削除 {self.deleted} 件 ({self.batches} バッチ), "
+            f"{self.elapsed:.1f}s ({self.keys_per_sec:.0f} keys/s)"
+        )
+
+
+def make_selector(
+    source_files: Optional[Iterable[str]] = None,
+    prefixes: Optional[Iterable[str]] = None,
+    keep_keys: Optional[Set[str]] = None,
+) -> Callable[[Dict[str, Any]], bool]:
+    """list_vectors の要素を削除対象にするか判定する関数を作る（条件はすべて AND、指定なしなら全件）。
+
+    keep_keys を渡すと、その集合に含まれないキーだけが対象になる（マニフェストにない孤立ベクトルの掃除）。
+    """
+    files = set(source_files or [])
+    prefix_tuple = tuple(prefixes or [])
+
+    def selected(vector: Dict[str, Any]) -> bool:
+        key = vector["key"]
+        if prefix_tuple and not key.startswith(prefix_tuple):
+            return False
+        if files and (vector.get("metadata") or {}).get("source_file") not in files:
+            return False
+        if keep_keys is not None and key in keep_keys:
+            return False
+        return True
+
+    return selected
+
+
+class VectorDeleter:
+    def __init__(
+        self,
+        s3vectors: Any,
+        *,
+        bucket: str,
+        index: str,
+        workers: int = 8,
+        batch_size: int = MAX_PUT_BATCH,
+        segments: int = 1,
+        dry_run: bool = False,
+        on_batch_deleted: Optional[Callable[[List[str], DeleteStats], None]] = None,
+    ):
+        if not 1 <= batch_size <= MAX_PUT_BATCH:
+            raise ValueError(f"batch_size は 1〜{MAX_PUT_BATCH} の範囲で指定してください: {batch_size}")
+        self.s3vectors = s3vectors
+        self.bucket = bucket
+        self.index = index
+        self.workers = workers
+        self.batch_size = batch_size
+        self.segments = max(1, segments)
+        self.dry_run = dry_run
+        self.on_batch_deleted = on_batch_deleted
+        self.stats = DeleteStats()
+        self.matched_keys: List[str] = []
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def _iter_vectors(self, segment: int, need_metadata: bool) -> Iterable[Dict[str, Any]]:
+        params: Dict[str, Any] = {
+            "vectorBucketName": self.bucket,
+            "indexName": self.index,
+            "maxResults": MAX_LIST_RESULTS,
+            "returnMetadata": need_metadata,
+        }
+        if self.segments > 1:
+            params.update(segmentCount=self.segments, segmentIndex=segment)
+        paginator = self.s3vectors.get_paginator("list_vectors")
+        for page in paginator.paginate(**params):
+            self._count(pages=1)
+            yield from page.get("vectors", [])
+
+    def _delete_batch(self, keys: List[str]) -> None:
+        self.s3vectors.delete_vectors(vectorBucketName=self.bucket, indexName=self.index, keys=keys)
+        self._count(deleted=len(keys), batches=1)
+        if self.on_batch_deleted is not None:
+            self.on_batch_deleted(keys, self.stats)
+
+    def run(self, selector: Callable[[Dict[str, Any]], bool], need_metadata: bool = False) -> DeleteStats:
+        """一覧取得しながら対象キーをバッチにまとめ、削除ワーカーへ流す。"""
+        self.stats = DeleteStats()
+        # 一覧取得が削除より速すぎてメモリに溜まらないよう、処理中のバッチ数を抑える
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+        futures: List[Future] = []
+        deleter = ThreadPoolExecutor(max_workers=self.workers)
+
+        def submit(batch: List[str]) -> None:
+            self._count(matched=len(batch))
+            if self.dry_run:
+                with self._lock:
+                    self.matched_keys.extend(batch)
+                return
+            in_flight.acquire()
+            future = deleter.submit(self._delete_batch, batch)
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+        def list_segment(segment: int) -> None:
+            batch: List[str] = []
+            for vector in self._iter_vectors(segment, need_metadata):
+                self._count(listed=1)
+                if not selector(vector):
+                    continue
+                batch.append(vector["key"])
+                if len(batch) >= self.batch_size:
+                    submit(batch)
+                    batch = []
+            if batch:
+                submit(batch)
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.segments) as lister:
+                for future in [lister.submit(list_segment, i) for i in range(self.segments)]:
+                    future.result()
+            for future in futures:
+                future.result()
+        finally:
+            deleter.shutdown(wait=True)
+            self.stats.finished_at = time.perf_counter()
+        return self.stats
@@ -0,0 +1,68 @@
+"""Titan Text Embeddings v2 の呼び出し設定（次元数・正規化）と次元の整合性チェック。
+
+Titan v2 は 1024 / 512 / 256 次元と正規化の有無を選べる。
+登録（embedding.py）と検索（エージェント・query.py）で同じ設定を使わないと距離が意味をなさないため、
+インデックス側の次元と食い違う場合は早めにエラーにする。
+"""
+import json
+from typing import Any, List, Optional
+
+TITAN_V2_DIMENSIONS = (256, 512, 1024)
+DEFAULT_DIMENSIONS = 1024
+
+
+class DimensionMismatchError(ValueError):
+    """埋め込みの次元がインデックスの次元と一致しない。"""
+
+
+def validate_dimensions(dimensions: int) -> int:
+    if dimensions not in TITAN_V2_DIMENSIONS:
+        raise ValueError(f"EMBED_DIMENSIONS は {TITAN_V2_DIMENSIONS} のいずれかを指定してください: {dimensions}")
+    return dimensions
+
+
+def request_body(text: str, dimensions: Optional[int] = None, normalize: bool = True) -> str:
+    payload: dict = {"inputText": text}
+    if dimensions is not None:
+        payload["dimensions"] = dimensions
+        payload["normalize"] = normalize
+    return json.dumps(payload)
+
+
+def invoke_embedding(client: Any, model_id: str, text: str, dimensions: Optional[int] = None,
+                     normalize: bool = True) -> List[float]:
+    response = client.invoke_model(modelId=model_id, body=request_body(text, dimensions, normalize))
+    embedding = json.loads(response["body"].read())["embedding"]
+    if dimensions is not None:
+        check_dimension(len(embedding), dimensions, f"model {model_id}")
+    return embedding
+
+
+def embedding_tag(model_id: str, dimensions: int, normalize: bool = True) -> str:
+    """モデル ID と出力設定をまとめた識別子。マニフェストや埋め込みキャッシュのキーに使う。
+
+    既定（1024 次元・正規化あり）はモデル ID のままにして、既存のマニフェスト・キャッシュを活かす。
+    """
+    if dimensions == DEFAULT_DIMENSIONS and normalize:
+        return model_id
+    return f"{model_id}#{dimensions}{'' if normalize else '-raw'}"
+
+
+def check_dimension(actual: int, expected: int, where: str) -> None:
+    if actual != expected:
+        raise DimensionMismatchError(f"Embedding dimension mismatch ({where}): got {actual}, expected {expected}")
+
+
+def index_dimension(s3vectors: Any, bucket: str, index: str) -> Optional[int]:
+    """S3 Vectors インデックスの次元（get_index が使えなければ None）。"""
+    get_index = getattr(s3vectors, "get_index", None)
+    if get_index is None:
+        return None
+    return get_index(vectorBucketName=bucket, indexName=index)["index"]["dimension"]
+
+
+def check_index_dimension(s3vectors: Any, bucket: str, index: str, dimensions: int) -> None:
+    """登録前に、インデックスの次元が EMBED_DIMENSIONS と一致するか確かめる。"""
+    actual = index_dimension(s3vectors, bucket, index)
+    if actual is not None:
+        check_dimension(dimensions, actual, f"index {bucket}/{index}")
@@ -0,0 +1,119 @@
+"""PDF のテキスト抽出とチャンク分割をプロセスプールで並列に行う。
+
+ファイル・ページ範囲ごとのタスクに分けて投げ、終わったものから順にチャンクを返す
+（埋め込み処理は抽出の完了を待たずに始められる）。ordered=True なら、先に投げたタスクの結果だけを待って
+投入順（ファイル順・ページ順）に返す。ファイルごとの所要時間も記録する。
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from rag.chunking import chunk_text
+
+
+@dataclass
+class FileTiming:
+    filename: str
+    pages: int = 0
+    chunks: int = 0
+    tasks: int = 0
+    cpu_seconds: float = 0.0  # 各タスクの抽出・分割時間の合計
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+    @property
+    def wall_seconds(self) -> float:
+        # 抽出が終わっていない（途中で打ち切られた）ファイルは 0
+        return max(0.0, self.finished_at - self.started_at)
+
+
+def count_pages(pdf_path: str) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, size: int, overlap: int,
+                       mode: str) -> Tuple[List[Dict[str, Any]], float]:
+    """pdf_path の [start, end) ページ（0 始まり）を抽出・分割する。ワーカープロセスで実行される。"""
+    began = time.perf_counter()
+    reader = PdfReader(pdf_path)
+    chunks = []
+    for page_index in range(start, end):
+        text = reader.pages[page_index].extract_text()
+        if not text:
+            continue
+        for chunk_index, chunk in enumerate(chunk_text(text, size, overlap, mode), start=1):
+            chunks.append({"text": chunk, "page": page_index + 1, "chunk": chunk_index})
+    return chunks, time.perf_counter() - began
+
+
+def iter_pdf_chunks(
+    pdf_files: List[str],
+    size: int = 500,
+    overlap: int = 100,
+    mode: str = "sentence",
+    workers: Optional[int] = None,
+    pages_per_task: int = 8,
+    timings: Optional[Dict[str, FileTiming]] = None,
+    ordered: bool = False,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(ファイル名, チャンク) を、抽出が終わったタスクから順に返す。
+
+    ordered=True なら pdf_files の順・ページ順に返す（後のタスクが先に終わった分は、前のタスクが終わるまで持っておく）。
+    実行ごとに同じ順になるので、順序に依存する処理（重複除去の代表選び）を抽出と並行して行える。
+    """
+    timings = timings if timings is not None else {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        # ページ数の取得も並列に行い、大きいファイルをページ範囲に分割する
+        page_counts = dict(zip(pdf_files, pool.map(count_pages, pdf_files)))
+        futures: Dict[Any, Tuple[str, int]] = {}
+        for pdf_path in pdf_files:
+            filename = os.path.basename(pdf_path)
+            timing = timings.setdefault(filename, FileTiming(filename))
+            timing.pages = page_counts[pdf_path]
+            timing.started_at = time.perf_counter()
+            for start in range(0, timing.pages, pages_per_task):
+                end = min(start + pages_per_task, timing.pages)
+                future = pool.submit(extract_page_range, pdf_path, start, end, size, overlap, mode)
+                futures[future] = (filename, len(futures))
+                timing.tasks += 1
+            if timing.tasks == 0:
+                # 0 ページの PDF はタスクがなく、完了時刻が入らないのでここで終わりにする
+                timing.finished_at = timing.started_at
+        remaining = {filename: timing.tasks for filename, timing in timings.items()}
+        pending = set(futures)
+        finished: Dict[int, Tuple[str, List[Dict[str, Any]]]] = {}  # ordered 用: 投入順 -> 結果
+        next_task = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename, task_index = futures[future]
+                chunks, elapsed = future.result()
+                timing = timings[filename]
+                timing.cpu_seconds += elapsed
+                timing.chunks += len(chunks)
+                remaining[filename] -= 1
+                if remaining[filename] == 0:
+                    timing.finished_at = time.perf_counter()
+                if not ordered:
+                    for chunk in chunks:
+                        yield filename, chunk
+                    continue
+                finished[task_index] = (filename, chunks)
+                while next_task in finished:
+                    ready_file, ready_chunks = finished.pop(next_task)
+                    next_task += 1
+                    for chunk in ready_chunks:
+                        yield ready_file, chunk
+
+
+def timing_report(timings: Dict[str, FileTiming]) -> str:
+    lines = [f"{'file':<32} {'pages':>6} {'chunks':>7} {'tasks':>6} {'cpu_s':>8} {'wall_s':>8}"]
+    for t in sorted(timings.values(), key=lambda t: t.cpu_seconds, reverse=True):
+        lines.append(
+            f"{t.filename[:32]:<32} {t.pages:>6} {t.chunks:>7} {t.tasks:>6} {t.cpu_seconds:>8.2f} {t.wall_seconds:>8.2f}"
+        )
+    return "\n".join(lines)
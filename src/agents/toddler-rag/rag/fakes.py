@@ -0,0 +1,225 @@
+"""Bedrock / S3 Vectors のローカル代替（オフライン検証・ベンチマーク用）。
+
+boto3 クライアントと同じメソッド名・引数・レスポンス形状だけを実装している。
+"""
+import hashlib
+import io
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from rag.vector_store import match_filter
+
+MAX_VECTORS_PER_CALL = 500
+
+
+class FakeClientError(Exception):
+    """botocore.exceptions.ClientError と同じ `response` 形状を持つ例外。"""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(f"{code}: {message}" if message else code)
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+def fake_embedding(text: str, dimension: int = 1024) -> List[float]:
+    """テキストから決定的な単位ベクトルを生成する。"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dimension)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class FakeBedrock:
+    """`bedrock-runtime` の invoke_model（Titan Embeddings 形式）の代替。"""
+
+    def __init__(self, dimension: int = 1024, latency: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        self.dimension = dimension
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self.throttled = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId: str, body: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            throttle = self._rng.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            raise FakeClientError("ThrottlingException", "Rate exceeded")
+        payload = json.loads(body)
+        dimension = payload.get("dimensions", self.dimension)
+        embedding = fake_embedding(payload["inputText"], dimension)
+        if not payload.get("normalize", True):
+            # 正規化なしの出力はノルムが 1 にならない
+            embedding = [v * (1.0 + len(payload["inputText"]) % 7) for v in embedding]
+        return {"body": io.BytesIO(json.dumps({"embedding": embedding}).encode("utf-8"))}
+
+
+class _ListVectorsPaginator:
+    def __init__(self, client: "FakeS3Vectors"):
+        self._client = client
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            params = dict(kwargs)
+            if token:
+                params["nextToken"] = token
+            page = self._client.list_vectors(**params)
+            yield page
+            token = page.get("nextToken")
+            if not token:
+                break
+
+
+class FakeS3Vectors:
+    """`s3vectors` のインメモリ代替。put/get/delete/list/query/get_index に対応。
+
+    実サービスと同様、インデックスの次元（dimension）と異なるベクトルは ValidationException になる。
+    """
+
+    def __init__(self, latency: float = 0.0, throttle_rate: float = 0.0, seed: int = 0, dimension: int = 1024):
+        self.dimension = dimension
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.calls: Dict[str, int] = {}
+        self._indexes: Dict[tuple, Dict[str, Dict[str, Any]]] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _enter(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+            throttle = self._rng.random() < self.throttle_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if throttle:
+            raise FakeClientError("TooManyRequestsException", "Rate exceeded")
+
+    def _index(self, bucket: str, index: str) -> Dict[str, Dict[str, Any]]:
+        return self._indexes.setdefault((bucket, index), {})
+
+    def _check_dimension(self, vector: List[float]) -> None:
+        if len(vector) != self.dimension:
+            raise FakeClientError("ValidationException", f"vector dimension {len(vector)} != index dimension {self.dimension}")
+
+    def get_index(self, vectorBucketName: str, indexName: str, **kwargs):
+        self._enter("get_index")
+        return {
+            "index": {
+                "vectorBucketName": vectorBucketName,
+                "indexName": indexName,
+                "dataType": "float32",
+                "dimension": self.dimension,
+                "distanceMetric": "cosine",
+            }
+        }
+
+    def put_vectors(self, vectorBucketName: str, indexName: str, vectors: List[Dict[str, Any]], **kwargs):
+        self._enter("put_vectors")
+        if len(vectors) > MAX_VECTORS_PER_CALL:
+            raise FakeClientError("ValidationException", f"at most {MAX_VECTORS_PER_CALL} vectors per call")
+        for v in vectors:
+            self._check_dimension(v["data"]["float32"])
+        with self._lock:
+            store = self._index(vectorBucketName, indexName)
+            for v in vectors:
+                store[v["key"]] = {"data": v["data"], "metadata": v.get("metadata", {})}
+        return {}
+
+    def get_vectors(self, vectorBucketName: str, indexName: str, keys: List[str],
+                    returnData: bool = False, returnMetadata: bool = False, **kwargs):
+        self._enter("get_vectors")
+        with self._lock:
+            store = self._index(vectorBucketName, indexName)
+            out = []
+            for key in keys:
+                if key not in store:
+                    continue
+                item: Dict[str, Any] = {"key": key}
+                if returnData:
+                    item["data"] = store[key]["data"]
+                if returnMetadata:
+                    item["metadata"] = store[key]["metadata"]
+                out.append(item)
+        return {"vectors": out}
+
+    def delete_vectors(self, vectorBucketName: str, indexName: str, keys: List[str], **kwargs):
+        self._enter("delete_vectors")
+        if len(keys) > MAX_VECTORS_PER_CALL:
+            raise FakeClientError("ValidationException", f"at most {MAX_VECTORS_PER_CALL} keys per call")
+        with self._lock:
+            store = self._index(vectorBucketName, indexName)
+            for key in keys:
+                store.pop(key, None)
+        return {}
+
+    def list_vectors(self, vectorBucketName: str, indexName: str, maxResults: int = MAX_VECTORS_PER_CALL,
+                     nextToken: Optional[str] = None, returnData: bool = False, returnMetadata: bool = False,
+                     segmentCount: int = 1, segmentIndex: int = 0, **kwargs):
+        self._enter("list_vectors")
+        with self._lock:
+            store = self._index(vectorBucketName, indexName)
+            keys = sorted(
+                k for k in store
+                if segmentCount <= 1 or zlib.crc32(k.encode("utf-8")) % segmentCount == segmentIndex
+            )
+            # 実サービスと同様、トークンは位置ではなく最後に返したキー基準（一覧中の削除でずれない）
+            if nextToken:
+                keys = [k for k in keys if k > nextToken]
+            page_keys = keys[:maxResults]
+            vectors = []
+            for key in page_keys:
+                item: Dict[str, Any] = {"key": key}
+                if returnData:
+                    item["data"] = store[key]["data"]
+                if returnMetadata:
+                    item["metadata"] = store[key]["metadata"]
+                vectors.append(item)
+        resp: Dict[str, Any] = {"vectors": vectors}
+        if len(keys) > maxResults:
+            resp["nextToken"] = page_keys[-1]
+        return resp
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_vectors":
+            raise NotImplementedError(operation_name)
+        return _ListVectorsPaginator(self)
+
+    def query_vectors(self, vectorBucketName: str, indexName: str, queryVector: Dict[str, List[float]],
+                      topK: int = 3, filter: Optional[Dict[str, Any]] = None,
+                      returnDistance: bool = False, returnMetadata: bool = False, **kwargs):
+        self._enter("query_vectors")
+        query = queryVector["float32"]
+        self._check_dimension(query)
+        qnorm = math.sqrt(sum(v * v for v in query)) or 1.0
+        with self._lock:
+            items = list(self._index(vectorBucketName, indexName).items())
+        scored = []
+        for key, item in items:
+            if not match_filter(item["metadata"], filter):
+                continue
+            data = item["data"]["float32"]
+            dnorm = math.sqrt(sum(v * v for v in data)) or 1.0
+            cosine = sum(a * b for a, b in zip(query, data)) / (qnorm * dnorm)
+            scored.append((1.0 - cosine, key, item))
+        scored.sort(key=lambda t: t[0])
+        out = []
+        for dist, key, item in scored[:topK]:
+            v: Dict[str, Any] = {"key": key}
+            if returnDistance:
+                v["distance"] = dist
+            if returnMetadata:
+                v["metadata"] = item["metadata"]
+            out.append(v)
+        return {"vectors": out}
@@ -0,0 +1,281 @@
+"""埋め込み生成とベクトル登録のパイプライン。
+
+- 埋め込み: 上限付きワーカープール + 適応的レート制限 + スロットリング時のリトライ
+- 登録: 固定サイズのバッチに詰め、埋め込み処理と並行して put_vectors を発行
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from rag.embeddings import invoke_embedding
+
+# S3 Vectors の put_vectors は 1 回あたり最大 500 ベクトル
+MAX_PUT_BATCH = 500
+# get_vectors は 1 回あたり最大 100 キー
+MAX_GET_BATCH = 100
+
+THROTTLE_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+    "RequestLimitExceeded",
+}
+TRANSIENT_CODES = {
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+
+
+def error_code(exc: BaseException) -> Optional[str]:
+    """botocore の ClientError（または同形の例外）からエラーコードを取り出す。"""
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def is_connection_error(exc: BaseException) -> bool:
+    """接続・読み取りタイムアウトなど、応答が返らなかったエラー（パイプラインのクライアントは botocore がリトライしない）。"""
+    try:
+        from botocore.exceptions import ConnectionError, HTTPClientError
+    except ImportError:
+        return False
+    return isinstance(exc, (ConnectionError, HTTPClientError))
+
+
+class AdaptiveRateLimiter:
+    """AIMD 方式のレート制限。成功で加算的に増やし、スロットリングで半減させる。"""
+
+    def __init__(self, initial_rate: float = 10.0, min_rate: float = 0.5, max_rate: float = 100.0,
+                 increase: float = 0.5, decrease_factor: float = 0.5):
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1.0))
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # 直近の予約枠も新しいレートに合わせて後ろ倒しする
+            self._next_slot = max(self._next_slot, time.monotonic() + 1.0 / self.rate)
+
+
+@dataclass
+class IngestStats:
+    chunks: int = 0
+    embedded: int = 0
+    uploaded: int = 0
+    batches: int = 0
+    retries: int = 0
+    throttles: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.embedded / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.embedded}/{self.chunks} チャンク埋め込み, {self.uploaded} ベクトル登録 "
+            f"({self.batches} バッチ), {self.elapsed:.1f}s, {self.chunks_per_sec:.1f} chunks/s, "
+            f"リトライ {self.retries} 回 (スロットリング {self.throttles} 回)"
+        )
+
+
+class IngestPipeline:
+    """チャンク（key/text/metadata）を埋め込み、バッチ単位で S3 Vectors に登録する。
+
+    `bedrock` / `s3vectors` は boto3 クライアント、または rag.fakes の代替を渡す。
+    `on_batch_committed(vectors, stats)` は put_vectors 成功ごとにアップロードスレッドから呼ばれる。
+    """
+
+    def __init__(
+        self,
+        bedrock: Any,
+        s3vectors: Any,
+        *,
+        bucket: str,
+        index: str,
+        model_id: str,
+        dimensions: Optional[int] = None,
+        normalize: bool = True,
+        workers: int = 8,
+        batch_size: int = 100,
+        upload_workers: int = 2,
+        max_retries: int = 6,
+        base_backoff: float = 0.5,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        on_batch_committed: Optional[Callable[[List[Dict[str, Any]], IngestStats], None]] = None,
+    ):
+        if not 1 <= batch_size <= MAX_PUT_BATCH:
+            raise ValueError(f"batch_size は 1〜{MAX_PUT_BATCH} の範囲で指定してください: {batch_size}")
+        self.bedrock = bedrock
+        self.s3vectors = s3vectors
+        self.bucket = bucket
+        self.index = index
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.normalize = normalize
+        self.workers = workers
+        self.batch_size = batch_size
+        self.upload_workers = upload_workers
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.on_batch_committed = on_batch_committed
+        self.stats = IngestStats()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, **deltas: int) -> None:
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def _with_retries(self, fn: Callable[[], Any], limited: bool) -> Any:
+        attempt = 0
+        while True:
+            if limited:
+                self.rate_limiter.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                code = error_code(e)
+                throttled = code in THROTTLE_CODES
+                if not (throttled or code in TRANSIENT_CODES or is_connection_error(e)) or attempt >= self.max_retries:
+                    raise
+                if throttled:
+                    self._count(throttles=1)
+                    if limited:
+                        self.rate_limiter.on_throttle()
+                self._count(retries=1)
+                # exponential backoff + full jitter
+                time.sleep(random.uniform(0, self.base_backoff * (2 ** attempt)))
+                attempt += 1
+                continue
+            if limited:
+                self.rate_limiter.on_success()
+            return result
+
+    def embed(self, text: str) -> List[float]:
+        # dimensions を指定した場合、返ってきた次元が違えば DimensionMismatchError（リトライしない）
+        return self._with_retries(
+            lambda: invoke_embedding(self.bedrock, self.model_id, text, self.dimensions, self.normalize),
+            limited=True,
+        )
+
+    def _embed_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        embedding = self.embed(record["text"])
+        self._count(embedded=1)
+        return {
+            "key": record["key"],
+            "data": {"float32": embedding},
+            "metadata": record.get("metadata", {}),
+        }
+
+    def _upload(self, vectors: List[Dict[str, Any]]) -> None:
+        self._with_retries(
+            lambda: self.s3vectors.put_vectors(
+                vectorBucketName=self.bucket,
+                indexName=self.index,
+                vectors=vectors,
+            ),
+            limited=False,
+        )
+        self._count(uploaded=len(vectors), batches=1)
+        if self.on_batch_committed:
+            self.on_batch_committed(vectors, self.stats)
+
+    def run(self, records: Iterable[Dict[str, Any]]) -> IngestStats:
+        """records を逐次取り出して埋め込み・登録し、完了後に統計を返す。"""
+        self.stats = IngestStats()
+        pending: set = set()
+        uploads: List[Future] = []
+        batch: List[Dict[str, Any]] = []
+        max_in_flight = self.workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed") as embed_pool, \
+                ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix="upload") as upload_pool:
+
+            def collect(done: Iterable[Future]) -> None:
+                for fut in done:
+                    pending.discard(fut)
+                    batch.append(fut.result())
+                    if len(batch) >= self.batch_size:
+                        uploads.append(upload_pool.submit(self._upload, batch[:]))
+                        batch.clear()
+
+            for record in records:
+                self._count(chunks=1)
+                pending.add(embed_pool.submit(self._embed_record, record))
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if batch:
+                uploads.append(upload_pool.submit(self._upload, batch[:]))
+                batch.clear()
+            for fut in uploads:
+                fut.result()
+
+        self.stats.finished_at = time.perf_counter()
+        return self.stats
+
+
+def delete_keys(s3vectors: Any, bucket: str, index: str, keys: List[str], batch_size: int = MAX_PUT_BATCH) -> int:
+    """keys を batch_size 件ずつ delete_vectors で削除し、削除件数を返す。"""
+    for i in range(0, len(keys), batch_size):
+        s3vectors.delete_vectors(vectorBucketName=bucket, indexName=index, keys=keys[i:i + batch_size])
+    return len(keys)
+
+
+def update_metadata(s3vectors: Any, bucket: str, index: str, metadata: Dict[str, Dict[str, Any]],
+                    batch_size: int = MAX_GET_BATCH) -> List[str]:
+    """登録済みベクトルのメタデータだけを差し替える（埋め込みはし直さない）。
+
+    get_vectors でデータを取り、新しいメタデータで put_vectors し直す。見つからないキーは飛ばし、更新したキーを返す。
+    """
+    keys = sorted(metadata)
+    updated: List[str] = []
+    for i in range(0, len(keys), batch_size):
+        found = s3vectors.get_vectors(
+            vectorBucketName=bucket, indexName=index, keys=keys[i:i + batch_size], returnData=True
+        ).get("vectors", [])
+        if not found:
+            continue
+        s3vectors.put_vectors(
+            vectorBucketName=bucket,
+            indexName=index,
+            vectors=[{"key": v["key"], "data": v["data"], "metadata": metadata[v["key"]]} for v in found],
+        )
+        updated.extend(v["key"] for v in found)
+    return updated
@@ -0,0 +1,213 @@
+"""幼児語向けの文字 n-gram 転置インデックス（埋め込み不要の高速経路）。
+
+チャンクは語彙表なので、エントリ（"buubu  ブーブ @c" のような行）ごとにローマ字・かな・漢字の語に分け、
+かな正規化（カタカナ→ひらがな、長音の除去、同一文字の 3 連続以上を 2 文字に畳む）した語を登録する。
+クエリは
+- 正規化後にいずれかの語と完全に一致すれば、そのエントリでスコア 1.0
+- そうでなければ語との n-gram の一致度（IDF 重み付きの Dice 係数。語の側の長さでも割る）
+で採点し、チャンクのスコアはその中で最も一致した語のスコアにする。
+チャンクの一部に含まれるだけ（「あ」が「あぶちゃん」に含まれる等）では高いスコアにならない。
+"""
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LEXICAL_INDEX_VERSION = 2
+
+# 長音・波ダッシュは幼児語の表記ゆれが大きいので落とす（促音は語の区別に効くので残す）
+_DROP_CHARS = set("ーｰ〜～~・ 　")
+# 語彙表のエントリ末尾の分類記号（"@c" など）
+_ANNOTATION = re.compile(r"@\w*")
+# "anabokoアナボコ" のようにローマ字と日本語表記がくっついた行も分けられるよう、文字種の境目でも区切る
+_TOKEN = re.compile(r"[a-z]+|[^\sa-z]+")
+
+
+def normalize_kana(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    out: List[str] = []
+    for ch in text:
+        code = ord(ch)
+        # カタカナ (ァ〜ヶ) → ひらがな
+        if 0x30A1 <= code <= 0x30F6:
+            ch = chr(code - 0x60)
+        if ch in _DROP_CHARS or ch.isspace():
+            continue
+        # 「ぶーぶー」→「ぶぶ」、「ぶぶぶ」→「ぶぶ」のように同一文字の連続は 2 文字までにする
+        if len(out) >= 2 and out[-1] == ch and out[-2] == ch:
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    """正規化済みテキストの n-gram。n より短いテキストは 1-gram にする。"""
+    if len(text) < n:
+        n = 1
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def _is_romaji(token: str) -> bool:
+    return token.isascii() and token.isalpha()
+
+
+def parse_entries(text: str) -> List[Tuple[str, List[str]]]:
+    """チャンクを (エントリ, 正規化した語の list) に分ける。
+
+    チャンク分割で改行が落ちることがあるので、行の区切りに加えて、日本語表記の後にローマ字の見出しが
+    来た位置でも新しいエントリにする。記号だけの語（"-- 名詞 --" の "--"）は捨てる。
+    """
+    entries = []
+    for line in unicodedata.normalize("NFKC", text).lower().splitlines():
+        groups: List[List[str]] = []
+        for token in _TOKEN.findall(_ANNOTATION.sub(" ", line)):
+            if not groups or (_is_romaji(token) and not _is_romaji(groups[-1][-1])):
+                groups.append([])
+            groups[-1].append(token)
+        for tokens in groups:
+            terms = []
+            for token in tokens:
+                term = normalize_kana(token)
+                if any(ch.isalnum() for ch in term) and term not in terms:
+                    terms.append(term)
+            if terms:
+                entries.append((" ".join(tokens), terms))
+    return entries
+
+
+def match_entry(query: str, text: str) -> Optional[str]:
+    """text の中で、正規化した query と完全に一致する語を持つエントリ（複数なら " / " でつなぐ）。"""
+    normalized = normalize_kana(query)
+    lines = [line for line, terms in parse_entries(text) if normalized in terms]
+    return " / ".join(dict.fromkeys(lines)) or None
+
+
+class LexicalIndex:
+    def __init__(self, n: int = 2):
+        self.n = n
+        self.keys: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._texts: List[str] = []
+        # 語ごとの (正規化した語, doc_id, エントリ, n-gram の出現数)
+        self._terms: List[Tuple[str, int, str, Counter]] = []
+        self._exact: Dict[str, List[int]] = defaultdict(list)  # 正規化した語 -> term_id
+        self._postings: Dict[str, List[int]] = defaultdict(list)  # n-gram -> term_id
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        doc_id = len(self.keys)
+        self.keys.append(key)
+        self.metadata.append(metadata or {})
+        self._texts.append(text)
+        for line, terms in parse_entries(text):
+            for term in terms:
+                term_id = len(self._terms)
+                grams = Counter(char_ngrams(term, self.n))
+                self._terms.append((term, doc_id, line, grams))
+                self._exact[term].append(term_id)
+                for gram in grams:
+                    self._postings[gram].append(term_id)
+
+    def _idf(self, gram: str) -> float:
+        df = len(self._postings.get(gram, ()))
+        return math.log((len(self._terms) + 1) / (df + 1)) + 1.0
+
+    def _weight(self, grams: Counter) -> float:
+        return sum(self._idf(g) * count for g, count in grams.items())
+
+    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+        """スコア (0〜1) の高い順に {"key", "score", "metadata", "match", "entry"} を返す。
+
+        match は "entry"（語と完全一致、スコア 1.0）か "ngram"（n-gram の一致度、1.0 未満）。
+        entry は最も一致した語を含むエントリ。
+        """
+        normalized = normalize_kana(query)
+        if not normalized or not self.keys:
+            return []
+        best: Dict[int, Tuple[float, str, str]] = {}  # doc_id -> (score, match, entry)
+        exact_lines: Dict[int, List[str]] = defaultdict(list)
+        for term_id in self._exact.get(normalized, ()):
+            _, doc_id, line, _ = self._terms[term_id]
+            if line not in exact_lines[doc_id]:
+                exact_lines[doc_id].append(line)
+        for doc_id, lines in exact_lines.items():
+            best[doc_id] = (1.0, "entry", " / ".join(lines))
+
+        query_grams = Counter(char_ngrams(normalized, self.n))
+        query_weight = self._weight(query_grams)
+        overlaps: Dict[int, float] = defaultdict(float)
+        for gram, count in query_grams.items():
+            idf = self._idf(gram)
+            for term_id in self._postings.get(gram, ()):
+                overlaps[term_id] += idf * min(count, self._terms[term_id][3][gram])
+        for term_id, overlap in overlaps.items():
+            term, doc_id, line, grams = self._terms[term_id]
+            if term == normalized:
+                continue
+            # Dice 係数: クエリ側・語の側の両方の長さで割るので、長い語の一部に含まれるだけでは高くならない
+            score = min(2 * overlap / (query_weight + self._weight(grams)), 0.99)
+            if doc_id not in best or score > best[doc_id][0]:
+                best[doc_id] = (score, "ngram", line)
+
+        results = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))
+        return [
+            {"key": self.keys[doc_id], "score": score, "metadata": self.metadata[doc_id], "match": match, "entry": entry}
+            for doc_id, (score, match, entry) in results[:top_k]
+        ]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": LEXICAL_INDEX_VERSION,
+                    "n": self.n,
+                    "docs": [
+                        {"key": k, "text": t, "metadata": m}
+                        for k, t, m in zip(self.keys, self._texts, self.metadata)
+                    ],
+                },
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != LEXICAL_INDEX_VERSION:
+            # v1 は正規化後のテキストしか持たずエントリに分けられないので、scripts/embedding.py で作り直す
+            raise ValueError(f"Unsupported lexical index version: {data.get('version')}")
+        index = cls(n=data["n"])
+        for doc in data["docs"]:
+            index.add(doc["key"], doc["text"], doc["metadata"])
+        return index
+
+    @classmethod
+    def build(cls, docs: Iterable[Dict[str, Any]], n: int = 2) -> "LexicalIndex":
+        """docs: {"key", "text", "metadata"} の iterable（embedding.py のレコードと同じ形）。"""
+        index = cls(n=n)
+        for doc in docs:
+            index.add(doc["key"], doc["text"], doc.get("metadata"))
+        return index
+
+
+def fuse_rrf(rankings: Sequence[Sequence[Dict[str, Any]]], k: int = 60, top_k: int = 3) -> List[Dict[str, Any]]:
+    """Reciprocal Rank Fusion。各ランキングは "key" を持つ dict の順位付き list。
+
+    返り値の各要素は最初に現れた結果の内容に "rrf_score" を加えたもの。
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            entry = fused.setdefault(item["key"], {**item, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda e: -e["rrf_score"])[:top_k]
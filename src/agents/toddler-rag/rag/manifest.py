@@ -0,0 +1,123 @@
+"""インデックス済みチャンクのマニフェスト（差分・再開可能なインデックス作成用）。
+
+チャンクごとに本文のハッシュと埋め込みモデル ID を記録し、
+- 新規／変更されたチャンクだけを埋め込む
+- PDF から消えたチャンクのベクトルを削除する
+- 途中で中断しても、コミット済みバッチ以降から再開する
+ために使う。書き込みは一時ファイル + os.replace でアトミックに行う。
+autosave=False（全件再登録用）なら変更のたびには保存せず、成功後に save() で一度だけ書く。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    def __init__(self, path: str, bucket: str, index: str, model_id: str, autosave: bool = True):
+        self.path = path
+        self.bucket = bucket
+        self.index = index
+        self.model_id = model_id
+        self.autosave = autosave
+        self.chunks: Dict[str, Dict[str, str]] = {}
+        self._staged: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, bucket: str, index: str, model_id: str) -> "Manifest":
+        manifest = cls(path, bucket, index, model_id)
+        if not os.path.exists(path):
+            return manifest
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning(f"Manifest version mismatch, ignoring: {path}")
+            return manifest
+        if (data.get("bucket"), data.get("index")) != (bucket, index):
+            logger.warning(f"Manifest belongs to {data.get('bucket')}/{data.get('index')}, ignoring: {path}")
+            return manifest
+        manifest.chunks = data.get("chunks", {})
+        return manifest
+
+    def is_current(self, key: str, digest: str) -> bool:
+        entry = self.chunks.get(key)
+        return bool(entry) and entry.get("hash") == digest and entry.get("model_id") == self.model_id
+
+    def stage(self, key: str, digest: str, source_file: Optional[str] = None) -> None:
+        """埋め込み対象のチャンクを登録待ちとして記録する（コミットまでは保存しない）。"""
+        with self._lock:
+            self._staged[key] = {"hash": digest, "model_id": self.model_id, "source_file": source_file or ""}
+
+    def commit(self, keys: Iterable[str]) -> None:
+        """put_vectors が成功したキーを確定し、マニフェストを保存する（autosave=False なら確定だけ）。"""
+        with self._lock:
+            for key in keys:
+                entry = self._staged.pop(key, None)
+                if entry is not None:
+                    self.chunks[key] = entry
+            self._autosave()
+
+    def duplicates(self, key: str) -> str:
+        """代表チャンクのメタデータに書いた重複元のハッシュ（書いていなければ空文字）。"""
+        return self.chunks.get(key, {}).get("duplicates", "")
+
+    def set_duplicates(self, digests: Dict[str, str]) -> None:
+        """重複元のメタデータを書き直したキーのハッシュを記録する（再登録で commit されると消える）。"""
+        with self._lock:
+            for key, digest in digests.items():
+                entry = self.chunks.get(key)
+                if entry is None:
+                    continue
+                if digest:
+                    entry["duplicates"] = digest
+                else:
+                    entry.pop("duplicates", None)
+            self._autosave()
+
+    def remove(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self.chunks.pop(key, None)
+            self._autosave()
+
+    def stale_keys(self, seen: Set[str]) -> List[str]:
+        """今回の走査で見つからなかった（PDF から消えた）チャンクのキー。"""
+        return sorted(set(self.chunks) - seen)
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _autosave(self) -> None:
+        if self.autosave:
+            self._save()
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_VERSION,
+                    "bucket": self.bucket,
+                    "index": self.index,
+                    "chunks": self.chunks,
+                },
+                f,
+                ensure_ascii=False,
+                indent=1,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
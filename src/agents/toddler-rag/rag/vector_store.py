@@ -0,0 +1,286 @@
+"""ベクトルストアの抽象化。
+
+- S3VectorStore: S3 Vectors (query_vectors) を使う従来の実装
+- LocalVectorStore: float32 埋め込みを memmap した .npy と JSON のメタデータで持つローカル実装。
+  int8 / binary に量子化したコピーを持たせると、全件走査はそちらで行い、上位候補だけ float32 で再スコアする
+
+どちらも query() は S3 Vectors と同じ形 ({"key", "distance", "metadata"} の list) を返す。
+distance はコサイン距離 (1 - cos)。
+"""
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from rag.embeddings import DimensionMismatchError, check_dimension
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+QUANTIZATIONS = ("none", "int8", "binary")
+INT8_CODES_FILE = "vectors.int8.npy"
+INT8_SCALES_FILE = "vectors.int8_scale.npy"
+BINARY_CODES_FILE = "vectors.binary.npy"
+# 量子化スコアを計算するときの 1 ブロックの行数（float32 への一時展開を抑える）
+SCAN_BLOCK_ROWS = 16384
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def match_filter(metadata: Dict[str, Any], flt: Optional[Dict[str, Any]]) -> bool:
+    """S3 Vectors のメタデータフィルタ（等価・$eq/$ne/$in/$nin/$and/$or）を評価する。"""
+    if not flt:
+        return True
+    for field, cond in flt.items():
+        if field == "$and":
+            if not all(match_filter(metadata, c) for c in cond):
+                return False
+            continue
+        if field == "$or":
+            if not any(match_filter(metadata, c) for c in cond):
+                return False
+            continue
+        value = metadata.get(field)
+        if isinstance(cond, dict):
+            for op, expected in cond.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def quantize_int8(matrix: np.ndarray) -> "tuple[np.ndarray, np.ndarray]":
+    """行ごとのスケールで対称 int8 量子化する（x ≈ codes * scale）。"""
+    scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(matrix.shape[0])
+    scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+    codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    """符号ビットだけを残し、8 次元ずつ 1 バイトに詰める。"""
+    return np.packbits(matrix > 0, axis=1)
+
+
+def int8_scores(codes: np.ndarray, scales: np.ndarray, q: np.ndarray) -> np.ndarray:
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS]
+        scores[start:start + len(block)] = (block.astype(np.float32) @ q) * scales[start:start + len(block)]
+    return scores
+
+
+def binary_scores(codes: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """ハミング距離が小さいほど大きくなるスコア（-hamming）。"""
+    q_bits = np.packbits(q > 0)
+    scores = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS]
+        scores[start:start + len(block)] = -_POPCOUNT[block ^ q_bits].sum(axis=1)
+    return scores
+
+
+class VectorStore(ABC):
+    """query() を実装していないバックエンドはインスタンス化の時点で TypeError になる。"""
+
+    @abstractmethod
+    def query(self, embedding: List[float], top_k: int = 3, filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """embedding に近い順に top_k 件を {"key", "distance", "metadata"} の list で返す。"""
+
+
+class S3VectorStore(VectorStore):
+    def __init__(self, client: Any, bucket: str, index: str):
+        self.client = client
+        self.bucket = bucket
+        self.index = index
+
+    def query(self, embedding, top_k=3, filter=None):
+        params: Dict[str, Any] = {
+            "vectorBucketName": self.bucket,
+            "indexName": self.index,
+            "queryVector": {"float32": embedding},
+            "topK": top_k,
+            "returnDistance": True,
+            "returnMetadata": True,
+        }
+        if filter:
+            params["filter"] = filter
+        return self.client.query_vectors(**params).get("vectors", [])
+
+
+class LocalVectorStore(VectorStore):
+    """ディレクトリ内の vectors.npy（行ごとに L2 正規化済み float32）と metadata.json を読む。
+
+    vectors.npy は mmap_mode="r" で開くため、プロセス間でページキャッシュを共有できる。
+    quantization が "int8" / "binary" のときは量子化コードだけをメモリに載せて全件を走査し、
+    上位 top_k * rescore_factor 件だけ vectors.npy の行を読んで正確なコサイン類似度で並べ直す。
+    quantization を省略すると、書き出し時の設定（metadata.json の "quantization"）に従う。
+    """
+
+    def __init__(self, directory: str, quantization: Optional[str] = None, rescore_factor: int = 4):
+        self.directory = directory
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(directory, METADATA_FILE), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        self.keys: List[str] = sidecar["keys"]
+        self.metadata: List[Dict[str, Any]] = sidecar["metadata"]
+        if len(self.keys) != self.vectors.shape[0]:
+            raise ValueError(f"Local index is inconsistent: {len(self.keys)} keys vs {self.vectors.shape[0]} vectors")
+        self.dimension: int = sidecar.get("dimension") or (self.vectors.shape[1] if self.vectors.ndim == 2 else 0)
+        self.quantization = quantization or sidecar.get("quantization", "none")
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {self.quantization}")
+        self.rescore_factor = max(1, rescore_factor)
+        self.codes: Optional[np.ndarray] = None
+        self.scales: Optional[np.ndarray] = None
+        if self.quantization != "none" and self.keys:
+            self._load_codes()
+
+    def _load_codes(self) -> None:
+        def load(name: str) -> Optional[np.ndarray]:
+            path = os.path.join(self.directory, name)
+            return np.load(path) if os.path.exists(path) else None
+
+        if self.quantization == "int8":
+            self.codes, self.scales = load(INT8_CODES_FILE), load(INT8_SCALES_FILE)
+            if self.codes is None or self.scales is None:
+                # 量子化ファイルなしで書き出されたインデックスでも使えるよう、その場で作る
+                self.codes, self.scales = quantize_int8(np.asarray(self.vectors))
+        else:
+            self.codes = load(BINARY_CODES_FILE)
+            if self.codes is None:
+                self.codes = quantize_binary(np.asarray(self.vectors))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def scan_bytes(self) -> int:
+        """1 クエリの全件走査で読むバイト数（量子化時は再スコア分を除く）。"""
+        if self.codes is None:
+            return int(self.vectors.nbytes)
+        return int(self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def _coarse_scores(self, q: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        if self.quantization == "int8":
+            scales = self.scales if rows is None else self.scales[rows]
+            return int8_scores(codes, scales, q)
+        return binary_scores(codes, q)
+
+    def _filter_rows(self, flt: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not flt:
+            return None
+        return np.fromiter((i for i, m in enumerate(self.metadata) if match_filter(m, flt)), dtype=np.int64)
+
+    def query(self, embedding, top_k=3, filter=None):
+        if not self.keys or top_k <= 0:
+            return []
+        q = np.asarray(embedding, dtype=np.float32)
+        check_dimension(q.shape[0], self.dimension, f"local index {self.directory}")
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        rows = self._filter_rows(filter)
+        if rows is not None and rows.shape[0] == 0:
+            return []
+        if self.codes is None:
+            matrix = self.vectors if rows is None else self.vectors[rows]
+            candidates = np.arange(matrix.shape[0]) if rows is None else rows
+            scores = matrix @ q
+        else:
+            coarse = self._coarse_scores(q, rows)
+            n = min(top_k * self.rescore_factor, coarse.shape[0])
+            picked = np.argpartition(-coarse, n - 1)[:n]
+            candidates = picked if rows is None else rows[picked]
+            # 候補の行だけ float32 で読み、正確なコサイン類似度で並べ直す
+            candidates = np.sort(candidates)
+            scores = self.vectors[candidates] @ q
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            row = int(candidates[i])
+            results.append({
+                "key": self.keys[row],
+                "distance": float(1.0 - scores[i]),
+                "metadata": self.metadata[row],
+            })
+        return results
+
+    @staticmethod
+    def write(directory: str, vectors: Iterable[Dict[str, Any]], quantization: str = "none") -> int:
+        """put_vectors と同じ形式 ({"key", "data": {"float32"}, "metadata"}) のベクトルを書き出す。
+
+        quantization が "int8" / "binary" のときは、再スコア用の float32 に加えて量子化コードも書き出す。
+        次元の異なるベクトルが混ざっていれば DimensionMismatchError。
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        keys: List[str] = []
+        metadata: List[Dict[str, Any]] = []
+        rows: List[np.ndarray] = []
+        for v in vectors:
+            row = np.asarray(v["data"]["float32"], dtype=np.float32)
+            if rows and row.shape[0] != rows[0].shape[0]:
+                raise DimensionMismatchError(
+                    f"Mixed embedding dimensions in one index: {v['key']} has {row.shape[0]}, expected {rows[0].shape[0]}"
+                )
+            keys.append(v["key"])
+            metadata.append(v.get("metadata", {}))
+            rows.append(row)
+        matrix = np.vstack(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        if rows:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        arrays: Dict[str, np.ndarray] = {VECTORS_FILE: matrix.astype(np.float32)}
+        if quantization == "int8":
+            arrays[INT8_CODES_FILE], arrays[INT8_SCALES_FILE] = quantize_int8(matrix)
+        elif quantization == "binary":
+            arrays[BINARY_CODES_FILE] = quantize_binary(matrix)
+        os.makedirs(directory, exist_ok=True)
+        # 読み込み中のプロセスが壊れたファイルを見ないよう、一時ファイルから置き換える
+        for name, array in arrays.items():
+            with open(os.path.join(directory, name + ".tmp"), "wb") as f:
+                np.save(f, array)
+        tmp_meta = os.path.join(directory, METADATA_FILE + ".tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(
+                {"keys": keys, "metadata": metadata, "dimension": int(matrix.shape[1]), "quantization": quantization},
+                f,
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        for name in arrays:
+            os.replace(os.path.join(directory, name + ".tmp"), os.path.join(directory, name))
+        os.replace(tmp_meta, os.path.join(directory, METADATA_FILE))
+        return len(keys)
+
+
+def export_s3_index(client: Any, bucket: str, index: str, directory: str, quantization: str = "none") -> int:
+    """S3 Vectors のインデックスを全件読み出し、ローカルインデックスとして書き出す。"""
+
+    def iter_vectors():
+        paginator = client.get_paginator("list_vectors")
+        for page in paginator.paginate(vectorBucketName=bucket, indexName=index, returnData=True, returnMetadata=True):
+            yield from page.get("vectors", [])
+
+    return LocalVectorStore.write(directory, iter_vectors(), quantization)
+
+
+def get_vector_store(backend: str, *, client: Any = None, bucket: str = "", index: str = "", local_dir: str = "",
+                     quantization: Optional[str] = None, rescore_factor: int = 4) -> VectorStore:
+    """VECTOR_BACKEND の値 ("s3" / "local") に応じたストアを返す。"""
+    if backend == "local":
+        return LocalVectorStore(local_dir, quantization=quantization, rescore_factor=rescore_factor)
+    if backend == "s3":
+        return S3VectorStore(client, bucket, index)
+    raise ValueError(f"Unknown vector backend: {backend}")
@@ -1,28 +1,81 @@
+import argparse
 import os
-import boto3
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.aws import get_client  # noqa: E402
+from rag.deletion import VectorDeleter, make_selector  # noqa: E402
+from rag.ingest import MAX_PUT_BATCH  # noqa: E402
+from rag.manifest import Manifest  # noqa: E402
 
 REGION = os.getenv("AWS_REGION", "us-west-2")
 EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
 VECTOR_BUCKET = os.getenv("VECTOR_BUCKET_NAME", "tollder-vector-bucket")
 VECTOR_INDEX = os.getenv("VECTOR_INDEX_NAME", "tollder-index")
-
-s3vectors = boto3.client("s3vectors", region_name=REGION)
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "./src/agents/toddler-rag/index_manifest.json")
+DELETE_WORKERS = int(os.getenv("DELETE_WORKERS", 8))
+LIST_SEGMENTS = int(os.getenv("LIST_SEGMENTS", 4))
 
 bucket_name = VECTOR_BUCKET
 index_name = VECTOR_INDEX
 
-paginator = s3vectors.get_paginator("list_vectors")
-pages = paginator.paginate(vectorBucketName=bucket_name, indexName=index_name)
 
-all_keys = []
-for page in pages:
-    for vector in page.get("vectors", []):
-        all_keys.append(vector["key"])
+def main(s3vectors=None, source_files=None, prefixes=None, manifest_diff=False, dry_run=False,
+         workers=DELETE_WORKERS, segments=LIST_SEGMENTS):
+    s3vectors = s3vectors or get_client("s3vectors", REGION)
+    manifest = Manifest.load(MANIFEST_PATH, bucket_name, index_name, EMBED_MODEL_ID)
+
+    keep_keys = None
+    if manifest_diff:
+        if not manifest.chunks:
+            print(f"マニフェストが空か見つかりません: {MANIFEST_PATH}")
+            return None
+        # マニフェストに載っていない（どの PDF チャンクにも対応しない）ベクトルだけを消す
+        keep_keys = set(manifest.chunks)
+
+    def on_batch_deleted(keys, stats):
+        print(f"  削除: {len(keys)} 件 (累計 {stats.deleted}, {stats.keys_per_sec:.0f} keys/s)")
+        # 消したチャンクは次回の embedding.py で再登録されるよう、マニフェストからも外す
+        if manifest.chunks:
+            manifest.remove(keys)
+
+    deleter = VectorDeleter(
+        s3vectors,
+        bucket=bucket_name,
+        index=index_name,
+        workers=workers,
+        batch_size=MAX_PUT_BATCH,
+        segments=segments,
+        dry_run=dry_run,
+        on_batch_deleted=on_batch_deleted,
+    )
+    selector = make_selector(source_files=source_files, prefixes=prefixes, keep_keys=keep_keys)
+    print(f"{bucket_name}/{index_name} から削除します。(workers={workers}, segments={segments}{', dry run' if dry_run else ''})")
+    stats = deleter.run(selector, need_metadata=bool(source_files))
+
+    if dry_run:
+        for key in deleter.matched_keys[:20]:
+            print(f"  対象: {key}")
+        if len(deleter.matched_keys) > 20:
+            print(f"  ... ほか {len(deleter.matched_keys) - 20} 件")
+    print(f"完了: {stats.summary()}")
+    return stats
+
 
-for key in all_keys:
-    print(f"Deleting vector: {key}")
-    s3vectors.delete_vectors(
-        vectorBucketName=bucket_name,
-        indexName=index_name,
-        keys=[key]  
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="S3 Vectors のインデックスからベクトルを削除する（指定なしなら全件）")
+    parser.add_argument("--source-file", action="append", dest="source_files", help="メタデータ source_file が一致するものだけ削除（複数指定可）")
+    parser.add_argument("--prefix", action="append", dest="prefixes", help="キーがこの接頭辞で始まるものだけ削除（複数指定可）")
+    parser.add_argument("--manifest-diff", action="store_true", help="マニフェスト (MANIFEST_PATH) にないキーだけ削除する")
+    parser.add_argument("--dry-run", action="store_true", help="削除せず対象件数とキーの例だけ表示する")
+    parser.add_argument("--workers", type=int, default=DELETE_WORKERS, help="並列に delete_vectors を発行する数")
+    parser.add_argument("--segments", type=int, default=LIST_SEGMENTS, help="list_vectors を分割して並列に一覧する数 (1〜16)")
+    args = parser.parse_args()
+    main(
+        source_files=args.source_files,
+        prefixes=args.prefixes,
+        manifest_diff=args.manifest_diff,
+        dry_run=args.dry_run,
+        workers=args.workers,
+        segments=max(1, min(16, args.segments)),
     )
@@ -1,16 +1,45 @@
-import os
-import boto3
+import argparse
 import json
-from PyPDF2 import PdfReader
+import os
+import sys
 import glob
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.aws import get_client  # noqa: E402
+from rag.dedup import Deduplicator  # noqa: E402
+from rag.embeddings import check_index_dimension, embedding_tag, validate_dimensions  # noqa: E402
+from rag.extraction import iter_pdf_chunks, timing_report  # noqa: E402
+from rag.ingest import AdaptiveRateLimiter, IngestPipeline, MAX_PUT_BATCH, delete_keys, update_metadata  # noqa: E402
+from rag.lexical import LexicalIndex  # noqa: E402
+from rag.manifest import Manifest, content_hash  # noqa: E402
+from rag.vector_store import export_s3_index  # noqa: E402
+
 REGION = os.getenv("AWS_REGION", "us-west-2")
 EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+# Titan v2 の出力次元（1024 / 512 / 256）と正規化。S3 Vectors インデックスの次元と一致させる
+EMBED_DIMENSIONS = validate_dimensions(int(os.getenv("EMBED_DIMENSIONS", 1024)))
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true").lower() == "true"
 VECTOR_BUCKET = os.getenv("VECTOR_BUCKET_NAME", "tollder-vector-bucket")
 VECTOR_INDEX = os.getenv("VECTOR_INDEX_NAME", "tollder-index")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
 MAX_METADATA_BYTES = int(os.getenv("MAX_METADATA_BYTES", 1800))
-MAX_CHARS_PER_SPLIT = int(os.getenv("MAX_CHARS_PER_SPLIT", 2000))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 100))
+CHUNK_MODE = os.getenv("CHUNK_MODE", "sentence")  # sentence / fixed
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1))
+EXTRACT_PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", 8))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 8))
+EMBED_MAX_RPS = float(os.getenv("EMBED_MAX_RPS", 20))
+PUT_BATCH_SIZE = min(int(os.getenv("PUT_BATCH_SIZE", 100)), MAX_PUT_BATCH)
+MANIFEST_PATH = os.getenv("MANIFEST_PATH", "./src/agents/toddler-rag/index_manifest.json")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./src/agents/toddler-rag/local_index")
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION") or "none"  # none / int8 / binary
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./src/agents/toddler-rag/lexical_index.json")
+# ほぼ重複チャンク（ヘッダ・語彙表・版違いのページ）は 1 つだけ埋め込み、ほかの出典は代表のメタデータに残す
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.8))  # 推定 Jaccard 類似度（文字 5-gram）
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", 128))
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", 5))
+DEDUP_MAX_SOURCES = int(os.getenv("DEDUP_MAX_SOURCES", 10))  # メタデータに残す重複元キーの上限
 
 region = REGION
 pdf_dir = "./src/agents/toddler-rag/pdf"
@@ -19,9 +48,6 @@ vector_index_name = VECTOR_INDEX
 chunk_size = CHUNK_SIZE
 max_metadata_bytes = MAX_METADATA_BYTES
 
-def split_text_by_length(text, max_chars=MAX_CHARS_PER_SPLIT):
-    return [text[i:i+max_chars] for i in range(0, len(text), max_chars)]
-
 def trim_to_max_bytes(s, max_bytes):
     """指定されたUTF-8バイト数以内に文字列を収める"""
     encoded = s.encode("utf-8")
@@ -36,79 +62,198 @@ def trim_to_max_bytes(s, max_bytes):
         except UnicodeDecodeError:
             trimmed = trimmed[:-1]
 
-def extract_chunks_from_pdf(pdf_path, chunk_size=chunk_size):
-    reader = PdfReader(pdf_path)
-    chunks = []
-    for page_number, page in enumerate(reader.pages, start=1):
-        text = page.extract_text()
-        if text:
-            split_chunks = split_text_by_length(text.strip(), chunk_size)
-            for chunk_index, chunk in enumerate(split_chunks):
-                chunks.append({
-                    "text": chunk,
-                    "page": page_number,
-                    "chunk": chunk_index + 1
-                })
-    return chunks
-
-bedrock = boto3.client("bedrock-runtime", region_name=region)
-s3vectors = boto3.client("s3vectors", region_name=region)
-
-# ===== 新規: 複数PDF処理ループ =====
-pdf_files = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
-if not pdf_files:
-    print(f"PDFファイルが見つかりません: {pdf_dir}")
-else:
-    total_pdfs = len(pdf_files)
-    total_vectors_all = 0
-    print(f"{total_pdfs} 個のPDFを処理します。")
-
-    for idx, pdf_path in enumerate(pdf_files, start=1):
-        filename = os.path.basename(pdf_path)
-        print(f"\n[{idx}/{total_pdfs}] 処理開始: {filename}")
-
-        # チャンク抽出
-        chunks = extract_chunks_from_pdf(pdf_path, chunk_size)
-        if not chunks:
-            print(f"  チャンクなし (スキップ): {filename}")
+def chunk_record(filename, chunk):
+    key = f"{filename}-page-{chunk['page']}-chunk-{chunk['chunk']}"
+    return {
+        "key": key,
+        "text": chunk["text"],
+        "metadata": {
+            "source_text": trim_to_max_bytes(chunk["text"], max_metadata_bytes),
+            "page_number": chunk["page"],
+            "chunk_number": chunk["chunk"],
+            "source_file": filename
+        }
+    }
+
+def with_duplicates(record, members):
+    """代表レコードのメタデータに重複元を入れる（source_text と合わせて max_metadata_bytes に収める）"""
+    if not members:
+        return record
+    sources = members[:DEDUP_MAX_SOURCES]
+    metadata = dict(record["metadata"], duplicate_count=len(members), duplicate_sources=sources)
+    budget = max_metadata_bytes - len(json.dumps(sources, ensure_ascii=False).encode("utf-8"))
+    metadata["source_text"] = trim_to_max_bytes(record["text"], max(budget, 0))
+    return dict(record, metadata=metadata)
+
+def duplicates_digest(members):
+    return content_hash("\n".join(members)) if members else ""
+
+def build_records(pdf_files, manifest=None, seen_keys=None, all_records=None, timings=None, dedup=None):
+    """PDF をプロセスプールで並列に抽出・分割し、パイプライン入力（key/text/metadata）を抽出できた順に返す
+
+    manifest が渡された場合は、登録済みで内容・モデルが変わっていないチャンクを除外する。
+    seen_keys には今回見つかった全チャンクのキーを追加する（削除判定用）。
+    all_records には除外分も含めた全レコードを追加する（字句インデックス用）。
+    timings にはファイルごとの抽出時間（FileTiming）が入る。
+    dedup（Deduplicator）が渡された場合は、ファイル順・ページ順に抽出しながら 1 件ずつ重複を判定し、代表だけを返す
+    （代表は抽出と並行して埋め込まれる。後から見つかった重複元は sync_duplicates で代表のメタデータに書く）。
+    重複側のキーは seen_keys にも入れないので、以前登録したベクトルは削除される。
+    """
+    skipped = 0
+    chunks = iter_pdf_chunks(
+        pdf_files,
+        size=chunk_size,
+        overlap=CHUNK_OVERLAP,
+        mode=CHUNK_MODE,
+        workers=EXTRACT_WORKERS,
+        pages_per_task=EXTRACT_PAGES_PER_TASK,
+        timings=timings,
+        # 重複除去は先に追加したチャンクを代表にするので、毎回同じ順で流す
+        ordered=dedup is not None,
+    )
+    for filename, chunk in chunks:
+        record = chunk_record(filename, chunk)
+        key = record["key"]
+        if dedup is not None and dedup.add(key, record["text"]) is not None:
             continue
-        pages_count = len({c['page'] for c in chunks})
-        print(f"  抽出: {pages_count} ページから {len(chunks)} チャンク")
-
-        vectors = []
-        total_chunks = len(chunks)
-        for c_idx, chunk in enumerate(chunks, start=1):
-            # 進捗表示
-            print(f"    エンベッディング {c_idx}/{total_chunks} (page {chunk['page']} chunk {chunk['chunk']})", end="\r")
-
-            response = bedrock.invoke_model(
-                modelId=EMBED_MODEL_ID,
-                body=json.dumps({"inputText": chunk["text"]})
-            )
-            response_body = json.loads(response["body"].read())
-            embedding = response_body["embedding"]
-            source_text_trimmed = trim_to_max_bytes(chunk["text"], max_metadata_bytes)
-
-            vector = {
-                "key": f"{filename}-page-{chunk['page']}-chunk-{chunk['chunk']}",
-                "data": {"float32": embedding},
-                "metadata": {
-                    "source_text": source_text_trimmed,
-                    "page_number": chunk["page"],
-                    "chunk_number": chunk["chunk"],
-                    "source_file": filename
-                }
-            }
-            vectors.append(vector)
-
-        print()  # 改行（上書き行の後）
-        # アップロード
-        s3vectors.put_vectors(
-            vectorBucketName=vector_bucket_name,
-            indexName=vector_index_name,
-            vectors=vectors
+        if seen_keys is not None:
+            seen_keys.add(key)
+        if all_records is not None:
+            all_records.append(record)
+        if manifest is not None:
+            digest = content_hash(record["text"])
+            if manifest.is_current(key, digest):
+                skipped += 1
+                continue
+            manifest.stage(key, digest, record["metadata"]["source_file"])
+        yield record
+    if skipped:
+        print(f"  変更なし (スキップ): {skipped} チャンク")
+
+def report_batch(vectors, stats):
+    print(f"  アップロード: {len(vectors)} ベクトル (累計 {stats.uploaded}, {stats.chunks_per_sec:.1f} chunks/s, リトライ {stats.retries})")
+
+def sync_duplicates(s3vectors, manifest, records, dedup):
+    """代表のメタデータ（duplicate_count / duplicate_sources）を今回の重複除去の結果に合わせる
+
+    変わった代表だけ、登録済みのベクトルを読み直してメタデータを書き換える（埋め込みはし直さない）。
+    """
+    metadata = {}
+    digests = {}
+    for record in records:
+        members = dedup.clusters[record["key"]].members
+        digest = duplicates_digest(members)
+        if manifest.duplicates(record["key"]) != digest:
+            metadata[record["key"]] = with_duplicates(record, members)["metadata"]
+            digests[record["key"]] = digest
+    if not metadata:
+        return 0
+    updated = update_metadata(s3vectors, vector_bucket_name, vector_index_name, metadata)
+    manifest.set_duplicates({key: digests[key] for key in updated})
+    return len(updated)
+
+def main(bedrock=None, s3vectors=None, full=False, export_local=False):
+    # IngestPipeline はスロットリングを数えてレートを調整しリトライするので、パイプラインのクライアントは
+    # botocore のリトライを切る（二重にリトライするとスロットリングが botocore に吸収されてレート制御に届かない）
+    pipeline_bedrock = bedrock or get_client("bedrock-runtime", region, retries=False)
+    pipeline_s3vectors = s3vectors or get_client("s3vectors", region, retries=False)
+    # インデックスの確認・古いベクトルの削除・書き出しは通常の（botocore がリトライする）クライアントで行う
+    s3vectors = s3vectors or get_client("s3vectors", region)
+
+    pdf_files = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+    if not pdf_files:
+        print(f"PDFファイルが見つかりません: {pdf_dir}")
+        return None
+    print(
+        f"{len(pdf_files)} 個のPDFを処理します。(extract_workers={EXTRACT_WORKERS}, workers={EMBED_WORKERS}, "
+        f"batch={PUT_BATCH_SIZE}, chunk={CHUNK_MODE}/{chunk_size}/{CHUNK_OVERLAP}, "
+        f"dedup={DEDUP_THRESHOLD if DEDUP_ENABLED else 'off'})"
+    )
+
+    # 次元が食い違うと put_vectors で失敗するか、検索で意味のない距離になるので、埋め込む前に確かめる
+    check_index_dimension(s3vectors, vector_bucket_name, vector_index_name, EMBED_DIMENSIONS)
+
+    # 次元・正規化を変えたらマニフェスト上は別モデル扱いにし、全チャンクを埋め込み直す
+    model_tag = embedding_tag(EMBED_MODEL_ID, EMBED_DIMENSIONS, EMBED_NORMALIZE)
+    manifest = Manifest.load(MANIFEST_PATH, vector_bucket_name, vector_index_name, model_tag)
+    if full:
+        # 全件再登録: 既存の記録は削除判定にだけ使い、空のマニフェストに記録し直す。成功するまで保存しないので、
+        # 途中で止まってもファイルには前回のキーが残り、次の実行で消えたチャンクを削除できる
+        previous_keys = set(manifest.chunks)
+        manifest = Manifest(MANIFEST_PATH, vector_bucket_name, vector_index_name, model_tag, autosave=False)
+    else:
+        previous_keys = set()
+        print(f"マニフェスト: {len(manifest.chunks)} チャンク登録済み ({MANIFEST_PATH})")
+
+    def on_batch_committed(vectors, stats):
+        manifest.commit(v["key"] for v in vectors)
+        report_batch(vectors, stats)
+
+    seen_keys = set()
+    all_records = []
+    timings = {}
+    dedup = (
+        Deduplicator(threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, shingle_size=DEDUP_SHINGLE_SIZE)
+        if DEDUP_ENABLED
+        else None
+    )
+
+    pipeline = IngestPipeline(
+        pipeline_bedrock,
+        pipeline_s3vectors,
+        bucket=vector_bucket_name,
+        index=vector_index_name,
+        model_id=EMBED_MODEL_ID,
+        dimensions=EMBED_DIMENSIONS,
+        normalize=EMBED_NORMALIZE,
+        workers=EMBED_WORKERS,
+        batch_size=PUT_BATCH_SIZE,
+        rate_limiter=AdaptiveRateLimiter(initial_rate=EMBED_MAX_RPS / 2, max_rate=EMBED_MAX_RPS),
+        on_batch_committed=on_batch_committed,
+    )
+    stats = pipeline.run(build_records(pdf_files, manifest, seen_keys, all_records, timings, dedup))
+
+    print("\nファイルごとの抽出時間 (cpu_s: 抽出・分割の合計, wall_s: 最初のタスク投入から最後の完了まで):")
+    print(timing_report(timings))
+    for timing in timings.values():
+        if not timing.chunks:
+            print(f"  チャンクなし: {timing.filename}")
+    if dedup is not None:
+        # 節約した呼び出し数は全件登録との比較（差分登録でスキップした分は含まない）
+        print(f"\n重複除去: {dedup.stats.summary()}")
+
+    stale = sorted((set(manifest.stale_keys(seen_keys)) | previous_keys) - seen_keys)
+    if stale:
+        delete_keys(s3vectors, vector_bucket_name, vector_index_name, stale)
+        manifest.remove(stale)
+        print(f"削除: PDF から消えた・重複になった {len(stale)} チャンクのベクトル")
+
+    if dedup is not None:
+        synced = sync_duplicates(s3vectors, manifest, all_records, dedup)
+        if synced:
+            print(f"重複元のメタデータを更新: {synced} 代表")
+        all_records = [with_duplicates(r, dedup.clusters[r["key"]].members) for r in all_records]
+    if full:
+        manifest.save()
+
+    # 字句インデックスは小さいので毎回全チャンクから作り直す
+    LexicalIndex.build(all_records).save(LEXICAL_INDEX_PATH)
+    print(f"字句インデックスを書き出しました: {len(all_records)} チャンク ({LEXICAL_INDEX_PATH})")
+
+    print(f"\n合計 {stats.uploaded} ベクトルを S3 Vectors に登録しました。")
+    print(f"  {stats.summary()}")
+
+    if export_local:
+        # 差分登録でも全件そろうよう、S3 Vectors 側のインデックスから書き出す
+        exported = export_s3_index(
+            s3vectors, vector_bucket_name, vector_index_name, LOCAL_INDEX_DIR, LOCAL_INDEX_QUANTIZATION
         )
-        print(f"  アップロード完了: {len(vectors)} ベクトル ({filename})")
-        total_vectors_all += len(vectors)
+        print(f"ローカルインデックスに {exported} ベクトルを書き出しました: {LOCAL_INDEX_DIR} ({LOCAL_INDEX_QUANTIZATION})")
+    return stats
 
-    print(f"\n合計 {total_vectors_all} ベクトルを S3 Vectors に登録しました。")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDF を埋め込み S3 Vectors に登録する")
+    parser.add_argument("--full", action="store_true", help="マニフェストを無視して全チャンクを再登録する")
+    parser.add_argument("--export-local", action="store_true", help="登録後にローカルインデックス (LOCAL_INDEX_DIR) へ書き出す")
+    args = parser.parse_args()
+    main(full=args.full, export_local=args.export_local)
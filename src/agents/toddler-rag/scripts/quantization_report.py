@@ -0,0 +1,140 @@
+"""埋め込み次元 × ローカルインデックスの量子化ごとに、再現率とサイズ・検索時間を比べるレポート。
+
+PDF のチャンクを各次元で埋め込み、none / int8 / binary のローカルインデックスを一時ディレクトリに作って検索する。
+クエリは --queries のファイル（1 行 1 クエリ）か、チャンクからランダムに選んだ 1 文。
+再現率は float32 の全件検索（最大次元、および同じ次元）の上位 k 件に対する recall@k。
+
+--fake では Bedrock の代わりに rag.fakes を使う（次元ごとの埋め込みが無関係になるため、
+最大次元に対する再現率は意味を持たず、量子化による劣化だけを確認できる）。
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.aws import get_client  # noqa: E402
+from rag.chunking import split_sentences  # noqa: E402
+from rag.embeddings import TITAN_V2_DIMENSIONS, invoke_embedding  # noqa: E402
+from rag.extraction import iter_pdf_chunks  # noqa: E402
+from rag.vector_store import QUANTIZATIONS, LocalVectorStore  # noqa: E402
+
+REGION = os.getenv("AWS_REGION", "us-west-2")
+EMBED_MODEL_ID = os.getenv("EMBED_MODEL_ID", "amazon.titan-embed-text-v2:0")
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 8))
+LOCAL_RESCORE_FACTOR = int(os.getenv("LOCAL_RESCORE_FACTOR", 4))
+
+pdf_dir = "./src/agents/toddler-rag/pdf"
+
+
+def load_corpus(pdf_files):
+    return [(f"{filename}-page-{c['page']}-chunk-{c['chunk']}", c["text"]) for filename, c in iter_pdf_chunks(pdf_files)]
+
+
+def sample_queries(corpus, n, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _, text in rng.sample(corpus, min(n, len(corpus))):
+        sentences = [s for s in split_sentences(text) if len(s) >= 5] or [text]
+        queries.append(rng.choice(sentences))
+    return queries
+
+
+def embed_all(bedrock, texts, dimensions):
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        return list(pool.map(lambda t: invoke_embedding(bedrock, EMBED_MODEL_ID, t, dimensions), texts))
+
+
+def top_keys(store, query_vectors, k):
+    started = time.perf_counter()
+    results = [[hit["key"] for hit in store.query(q, top_k=k)] for q in query_vectors]
+    return results, (time.perf_counter() - started) / max(1, len(query_vectors)) * 1000
+
+
+def recall(results, truth):
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    total = sum(len(t) for t in truth)
+    return hits / total if total else 0.0
+
+
+def main(bedrock=None, dimensions=TITAN_V2_DIMENSIONS, queries=None, n_queries=50, k=5,
+         rescore_factor=LOCAL_RESCORE_FACTOR, seed=0):
+    bedrock = bedrock or get_client("bedrock-runtime", REGION)
+    pdf_files = sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))
+    if not pdf_files:
+        print(f"PDFファイルが見つかりません: {pdf_dir}")
+        return None
+    corpus = load_corpus(pdf_files)
+    queries = queries or sample_queries(corpus, n_queries, seed)
+    dimensions = sorted(dimensions, reverse=True)
+    print(f"{len(corpus)} チャンク, {len(queries)} クエリ, k={k}, rescore_factor={rescore_factor}")
+
+    rows = []
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for dim in dimensions:
+            vectors = embed_all(bedrock, [text for _, text in corpus], dim)
+            query_vectors = embed_all(bedrock, queries, dim)
+            records = [{"key": key, "data": {"float32": v}} for (key, _), v in zip(corpus, vectors)]
+            same_dim_truth = None
+            for quantization in QUANTIZATIONS:
+                directory = os.path.join(tmp, f"{dim}-{quantization}")
+                LocalVectorStore.write(directory, records, quantization)
+                store = LocalVectorStore(directory, rescore_factor=rescore_factor)
+                results, ms = top_keys(store, query_vectors, k)
+                if quantization == "none":
+                    same_dim_truth = results
+                    reference = reference or results
+                rows.append({
+                    "dim": dim,
+                    "quantization": quantization,
+                    "bytes_per_vector": store.scan_bytes() / max(1, len(store)),
+                    "scan_mb": store.scan_bytes() / 1e6,
+                    "recall_ref": recall(results, reference),
+                    "recall_same": recall(results, same_dim_truth),
+                    "ms": ms,
+                })
+
+    full = rows[0]["bytes_per_vector"] or 1.0
+    print(f"\n{'dim':>5} {'quant':>7} {'B/vec':>8} {'size':>6} {'scan_MB':>8} "
+          f"{'R@k/' + str(dimensions[0]):>9} {'R@k/same':>9} {'ms/q':>7}")
+    for r in rows:
+        print(
+            f"{r['dim']:>5} {r['quantization']:>7} {r['bytes_per_vector']:>8.0f} {r['bytes_per_vector'] / full:>6.3f} "
+            f"{r['scan_mb']:>8.3f} {r['recall_ref']:>9.3f} {r['recall_same']:>9.3f} {r['ms']:>7.2f}"
+        )
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="埋め込み次元・量子化ごとの recall@k とインデックスサイズを比べる")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=list(TITAN_V2_DIMENSIONS), choices=TITAN_V2_DIMENSIONS)
+    parser.add_argument("--queries", help="クエリファイル（1 行 1 クエリ）。省略時はチャンクから抽出")
+    parser.add_argument("--n-queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=LOCAL_RESCORE_FACTOR)
+    parser.add_argument("--fake", action="store_true", help="Bedrock を呼ばず rag.fakes の埋め込みを使う")
+    args = parser.parse_args()
+
+    queries = None
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    bedrock = None
+    if args.fake:
+        from rag.fakes import FakeBedrock
+        bedrock = FakeBedrock()
+    main(
+        bedrock=bedrock,
+        dimensions=args.dimensions,
+        queries=queries,
+        n_queries=args.n_queries,
+        k=args.k,
+        rescore_factor=args.rescore_factor,
+    )
@@ -1,39 +1,42 @@
-import boto3 
-import json 
+import os
+import sys
+import json
 
-bedrock = boto3.client("bedrock-runtime", region_name="us-west-2")
-s3vectors = boto3.client("s3vectors", region_name="us-west-2") 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rag.aws import get_client  # noqa: E402
+from rag.embeddings import invoke_embedding, validate_dimensions  # noqa: E402
+from rag.vector_store import get_vector_store  # noqa: E402
 
-input_text = "adventures in space"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "s3")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "./src/agents/toddler-rag/local_index")
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION") or None
+EMBED_DIMENSIONS = validate_dimensions(int(os.getenv("EMBED_DIMENSIONS", 1024)))
+EMBED_NORMALIZE = os.getenv("EMBED_NORMALIZE", "true").lower() == "true"
+
+bedrock = get_client("bedrock-runtime", "us-west-2")
+s3vectors = get_client("s3vectors", "us-west-2")
 
-response = bedrock.invoke_model(
-    modelId="amazon.titan-embed-text-v2:0",
-    body=json.dumps({
-        "inputText": input_text,
-    })
-) 
-
-model_response = json.loads(response["body"].read())
-embedding = model_response["embedding"]
-
-response = s3vectors.query_vectors(
-    vectorBucketName="tollder-vector-bucket",
-    indexName="tollder-index",
-    queryVector={"float32": embedding}, 
-    topK=3, 
-    returnDistance=True,
-    returnMetadata=True
+vector_store = get_vector_store(
+    VECTOR_BACKEND,
+    client=s3vectors,
+    bucket="tollder-vector-bucket",
+    index="tollder-index",
+    local_dir=LOCAL_INDEX_DIR,
+    quantization=LOCAL_INDEX_QUANTIZATION,
 )
-print(json.dumps(response["vectors"], indent=2))
-
-response = s3vectors.query_vectors(
-    vectorBucketName="tollder-vector-bucket",
-    indexName="tollder-index",
-    queryVector={"float32": embedding}, 
-    topK=3, 
-    filter={"genre": "scifi"},
-    returnDistance=True,
-    returnMetadata=True
+
+input_text = "adventures in space"
+
+embedding = invoke_embedding(
+    bedrock,
+    "amazon.titan-embed-text-v2:0",
+    input_text,
+    dimensions=EMBED_DIMENSIONS,
+    normalize=EMBED_NORMALIZE,
 )
-print(json.dumps(response["vectors"], indent=2))
-    
\ No newline at end of file
+
+vectors = vector_store.query(embedding, top_k=3)
+print(json.dumps(vectors, indent=2, ensure_ascii=False))
+
+vectors = vector_store.query(embedding, top_k=3, filter={"genre": "scifi"})
+print(json.dumps(vectors, indent=2, ensure_ascii=False))
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.lexical import LexicalIndex, match_entry, normalize_kana, parse_entries  # noqa: E402
+
+MIN_SCORE = 0.8  # LEXICAL_MIN_SCORE の既定値
+
+# PDF から抽出したチャンクと同じく、エントリの間の改行が落ちたテキスト
+DOCS = [
+    {"key": "page-1", "text": "abuchan  アブちゃん @c abuku  アブク @c aa アー @c", "metadata": {}},
+    {"key": "page-2", "text": "atsuiatsui  アツイアツイ @c buubu  ブーブ @c chacha  チャチャ @c chacha  茶茶 @c", "metadata": {}},
+    {"key": "page-3", "text": "buubuchan  ブーブちゃん @c buuran  ブーラン @c", "metadata": {}},
+    {"key": "page-4", "text": "kukku  クック @c kuku  クク @c dakko  ダッコ @c dakko  抱っこ @c", "metadata": {}},
+]
+
+
+def build():
+    return LexicalIndex.build(DOCS)
+
+
+def test_normalize_keeps_sokuon():
+    assert normalize_kana("クック") == "くっく"
+    assert normalize_kana("ククー") == "くく"
+    assert normalize_kana("クック") != normalize_kana("クク")
+
+
+def test_parse_entries_splits_at_romaji_headwords():
+    entries = parse_entries(DOCS[1]["text"])
+    assert [line for line, _ in entries] == ["atsuiatsui アツイアツイ", "buubu ブーブ", "chacha チャチャ", "chacha 茶茶"]
+    assert entries[1][1] == ["buubu", "ぶぶ"]
+
+
+def test_exact_entry_match_scores_one():
+    hits = build().search("ぶーぶ", 3)
+    assert hits[0]["key"] == "page-2"
+    assert hits[0]["score"] == 1.0
+    assert hits[0]["match"] == "entry"
+    assert hits[0]["entry"] == "buubu ブーブ"
+
+
+def test_exact_match_joins_entries_with_the_same_word():
+    hit = build().search("chacha", 1)[0]
+    assert hit["entry"] == "chacha チャチャ / chacha 茶茶"
+
+
+def test_unrelated_entries_containing_the_query_stay_below_threshold():
+    index = build()
+    # "ぶぶ" は page-3 の「ブーブちゃん」に含まれるが、別の語
+    assert [h for h in index.search("ぶーぶ", 3) if h["key"] == "page-3"][0]["score"] < MIN_SCORE
+    # 1 文字のクエリは、その文字を含むだけの語には一致しない
+    assert all(h["key"] == "page-1" and h["entry"] == "aa アー" for h in index.search("あ", 3))
+    assert all(h["score"] < MIN_SCORE for h in index.search("ぶ", 3))
+    assert all(h["score"] < MIN_SCORE for h in index.search("ちゃん", 3))
+
+
+def test_sokuon_distinguishes_words():
+    index = build()
+    hit = index.search("くく", 1)[0]
+    assert hit["entry"] == "kuku クク"
+    assert hit["score"] == 1.0
+    assert index.search("くっく", 1)[0]["entry"] == "kukku クック"
+
+
+def test_near_match_never_scores_one():
+    hits = build().search("ぶーぶちゃんだ", 3)
+    assert hits[0]["key"] == "page-3"
+    assert hits[0]["match"] == "ngram"
+    assert hits[0]["score"] < 1.0
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "lexical_index.json")
+    build().save(path)
+    loaded = LexicalIndex.load(path)
+    assert loaded.search("dakko", 1)[0]["entry"] == "dakko ダッコ / dakko 抱っこ"
+
+
+def test_match_entry():
+    assert match_entry("ダッコ", DOCS[3]["text"]) == "dakko ダッコ"
+    assert match_entry("Dakko", DOCS[3]["text"]) == "dakko ダッコ / dakko 抱っこ"
+    assert match_entry("だ", DOCS[3]["text"]) is None
@@ -1,17 +1,28 @@
-import os
-from strands import Agent
-from strands.multiagent.a2a import A2AServer
-from dotenv import load_dotenv
-from tools.web_search import web_search
 import logging
 import os
+import sys
+from dotenv import load_dotenv
+
+# src/agents/common を読むため（tools.web_search も common を使うので先に通す）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.deadline import DeadlineMiddleware  # noqa: E402
+from common.metrics import MetricsMiddleware, agent_metrics_hooks  # noqa: E402
+from common.startup import StartupTimer, warm_up  # noqa: E402
 
 load_dotenv()
 MODEL_ID = os.getenv("BEDROCK_MODEL_ID","")
+# 呼び出し元が X-Request-Timeout-Ms を付けなかったときのデッドライン
+A2A_REQUEST_TIMEOUT = float(os.getenv("A2A_REQUEST_TIMEOUT", 60))
+HOST = os.getenv("WEB_SEARCH_HOST", "127.0.0.1")
+PORT = int(os.getenv("WEB_SEARCH_PORT", 9000))
+# 起動時（リクエスト受付前）に Tavily クライアントを作っておく
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+startup = StartupTimer("web_search")
+
 # Load system prompt from file
 def load_system_prompt():
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -22,14 +33,49 @@ def load_system_prompt():
     with open(prompt_path, "r", encoding="utf-8") as f:
         return f.read()
 
-agent = Agent(
-    tools=[web_search],
-    description="web検索エージェント",
-    system_prompt=load_system_prompt(),
-)
-server = A2AServer(
-    agent=agent, 
-    port=9000,
-)
-
-server.serve()
+def create_app():
+    """A2A サーバのアプリを作る（import しただけではサーバもクライアントも作らない）。
+
+    uvicorn --factory web_search.agent:create_app でも起動できる。
+    """
+    with startup.phase("import strands"):
+        from strands import Agent
+        from strands.multiagent.a2a import A2AServer
+    with startup.phase("import tools"):
+        from tools.web_search import web_search
+
+    with startup.phase("create agent"):
+        agent = Agent(
+            tools=[web_search],
+            description="web検索エージェント",
+            system_prompt=load_system_prompt(),
+            hooks=[agent_metrics_hooks],
+        )
+        server = A2AServer(
+            agent=agent,
+            host=HOST,
+            port=PORT,
+        )
+
+        # リクエストごとのデッドラインを設定・強制するため、A2A アプリにミドルウェアを挟んで起動する
+        app = server.to_starlette_app()
+        app.add_middleware(DeadlineMiddleware, default_timeout=A2A_REQUEST_TIMEOUT, enforce=True)
+        # 呼び出し元の X-Trace-Id を引き継ぎ、GET /metrics でレイテンシを公開する
+        app.add_middleware(MetricsMiddleware)
+    if WARMUP_ON_STARTUP:
+        # uvicorn は startup が終わるまで接続を受け付けない
+        app.add_event_handler("startup", lambda: warm_up(startup, warm_up_steps()))
+    return app
+
+def warm_up_steps():
+    from tools.web_search import warm_up as warm_up_search
+
+    return {"tavily client": warm_up_search}
+
+def main():
+    import uvicorn
+
+    uvicorn.run(create_app(), host=HOST, port=PORT)
+
+if __name__ == "__main__":
+    main()
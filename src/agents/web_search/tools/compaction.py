@@ -0,0 +1,163 @@
+"""web_search ツール出力の圧縮。
+
+Tavily の生レスポンスをそのまま LLM に渡すと入力トークンが膨らむため、
+- URL / 本文ハッシュで重複を除き
+- スコア順に並べ、各結果からクエリに関係の深い文を抜き出し
+- バイト数・推定トークン数の予算内に収まるだけ整形する
+"""
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[。！？!?.])\s*|\n+")
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """ASCII は 4 文字 ≒ 1 トークン、それ以外（日本語など）は 1 文字 ≒ 1 トークンで概算する。"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def canonical_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.lower().startswith("utm_")])
+    return urlunsplit(("", host, parts.path.rstrip("/"), query, ""))
+
+
+def content_fingerprint(content: str) -> str:
+    normalized = " ".join(unicodedata.normalize("NFKC", content).lower().split())
+    return hashlib.sha1(normalized[:500].encode("utf-8")).hexdigest()
+
+
+def best_snippet(content: str, query: str, max_chars: int) -> str:
+    """クエリ語との重なりが多い文を元の順序のまま max_chars まで連結する。"""
+    content = content.strip()
+    if len(content) <= max_chars:
+        return content
+    # 同じ文の繰り返し（ナビゲーションやテンプレート文など）は 1 回だけ残す
+    sentences = list(dict.fromkeys(s.strip() for s in _SENTENCE_SPLIT.split(content) if s and s.strip()))
+    terms = {t.lower() for t in _WORD.findall(query)}
+    # 日本語は分かち書きされないため、語そのものに加えて 2 文字単位でも照合する
+    bigrams = {t[i:i + 2] for t in terms for i in range(len(t) - 1)}
+
+    def score(sentence: str) -> int:
+        lower = sentence.lower()
+        return sum(2 for t in terms if t in lower) + sum(1 for b in bigrams if b in lower)
+
+    ranked = sorted(range(len(sentences)), key=lambda i: (-score(sentences[i]), i))
+    chosen: List[int] = []
+    used = 0
+    for i in ranked:
+        if used + len(sentences[i]) > max_chars and chosen:
+            continue
+        chosen.append(i)
+        used += len(sentences[i]) + 1
+        if used >= max_chars:
+            break
+    snippet = " ".join(sentences[i] for i in sorted(chosen))
+    return snippet[:max_chars] + ("..." if len(snippet) > max_chars or len(chosen) < len(sentences) else "")
+
+
+def truncate_to_budget(text: str, max_bytes: int, max_tokens: Optional[int] = None) -> str:
+    """text がバイト数・推定トークン数の予算を超えるなら、末尾を "..." にして収まる長さまで切り詰める。"""
+    def fits(t: str) -> bool:
+        return len(t.encode("utf-8")) <= max_bytes and (max_tokens is None or estimate_tokens(t) <= max_tokens)
+
+    if fits(text):
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(text[:mid] + "..."):
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "..."
+
+
+@dataclass
+class CompactionReport:
+    raw_bytes: int
+    compact_bytes: int
+    results_in: int
+    results_out: int
+    duplicates: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.raw_bytes - self.compact_bytes
+
+
+def compact_results(
+    resp: Dict[str, Any],
+    query: str,
+    max_bytes: int = 4000,
+    max_tokens: Optional[int] = None,
+    max_results: int = 5,
+    snippet_chars: int = 300,
+    raw_bytes: Optional[int] = None,
+) -> Tuple[str, CompactionReport]:
+    """Tavily のレスポンスを予算内のテキストに整形し、削減量のレポートと共に返す。
+
+    raw_bytes を省略した場合は、従来の出力に含まれていた生 JSON のバイト数を基準にする。
+    """
+    results = resp.get("results", []) or []
+    if raw_bytes is None:
+        raw_bytes = len(json.dumps(resp, ensure_ascii=False, default=str).encode("utf-8"))
+
+    seen_urls = set()
+    seen_content = set()
+    unique: List[Dict[str, Any]] = []
+    for r in sorted(results, key=lambda r: -(r.get("score") or 0.0)):
+        url_key = canonical_url(r.get("url") or "")
+        content_key = content_fingerprint(r.get("content") or "")
+        if (url_key and url_key in seen_urls) or content_key in seen_content:
+            continue
+        seen_urls.add(url_key)
+        seen_content.add(content_key)
+        unique.append(r)
+    duplicates = len(results) - len(unique)
+
+    lines: List[str] = []
+    used_bytes = 0
+    used_tokens = 0
+    for r in unique[:max_results]:
+        title = r.get("title") or "(no title)"
+        url = r.get("url") or ""
+        snippet = best_snippet(r.get("content") or "", query, snippet_chars)
+        entry = f"[{len(lines) + 1}] {title}\nURL: {url}\n{snippet}\n"
+        entry_bytes = len(entry.encode("utf-8")) + 1
+        entry_tokens = estimate_tokens(entry)
+        over_bytes = used_bytes + entry_bytes > max_bytes
+        over_tokens = max_tokens is not None and used_tokens + entry_tokens > max_tokens
+        if over_bytes or over_tokens:
+            if lines:
+                break
+            # 1 件目だけで予算を超える場合も、予算に収まるまで切り詰めて渡す
+            entry = truncate_to_budget(entry, max_bytes - 1, max_tokens)
+            entry_bytes = len(entry.encode("utf-8")) + 1
+            entry_tokens = estimate_tokens(entry)
+        lines.append(entry)
+        used_bytes += entry_bytes
+        used_tokens += entry_tokens
+
+    text = "\n".join(lines).rstrip() if lines else "検索結果はありません。"
+    report = CompactionReport(
+        raw_bytes=raw_bytes,
+        compact_bytes=len(text.encode("utf-8")),
+        results_in=len(results),
+        results_out=len(lines),
+        duplicates=duplicates,
+    )
+    return text, report
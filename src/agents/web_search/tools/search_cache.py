@@ -0,0 +1,124 @@
+"""Tavily 検索結果の TTL キャッシュ + single-flight。
+
+- キー: 正規化したクエリ・time_range・include_domains
+- TTL: time_range ごとに変える（期間が短い検索ほど鮮度が重要）
+- 容量: エントリ数とおおよそのバイト数の両方で上限を設け、古いものから追い出す
+- 同一キーの同時リクエストは 1 回の Tavily 呼び出しにまとめる
+- lookups（common.metrics の Counter）を渡すと、hit / miss / collapsed の件数を /metrics にも出す
+"""
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# time_range -> TTL 秒（None は期間指定なし）
+DEFAULT_TTLS: Dict[Optional[str], float] = {
+    "d": 10 * 60,
+    "w": 30 * 60,
+    "m": 2 * 60 * 60,
+    "y": 6 * 60 * 60,
+    None: 60 * 60,
+}
+
+CacheKey = Tuple[str, Optional[str], Tuple[str, ...]]
+
+
+def make_key(query: str, time_range: Optional[str], include_domains: Optional[Iterable[str]]) -> CacheKey:
+    normalized = " ".join(unicodedata.normalize("NFKC", query).lower().split())
+    domains = tuple(sorted({d.strip().lower() for d in include_domains or [] if d.strip()}))
+    return normalized, time_range or None, domains
+
+
+class SearchCache:
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024,
+                 ttls: Optional[Dict[Optional[str], float]] = None, lookups: Optional[Any] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        self.lookups = lookups
+        self._entries: "OrderedDict[CacheKey, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[CacheKey, Future] = {}
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+
+    def _get_fresh(self, key: CacheKey) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: CacheKey, value: Any) -> None:
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (time.monotonic() + self.ttls.get(key[1], self.ttls[None]), size, value)
+        self._bytes += size
+        self._evict()
+
+    def get_or_fetch(self, key: CacheKey, fetch: Callable[[], Any]) -> Any:
+        """キャッシュにあれば返し、なければ fetch() を 1 回だけ実行して全待機者に共有する。
+
+        fetch が例外を投げた場合は同じ例外を待機者全員に伝え、キャッシュはしない。
+        """
+        with self._lock:
+            value = self._get_fresh(key)
+            if value is not None:
+                self.hits += 1
+                if self.lookups is not None:
+                    self.lookups.inc(result="hit")
+                return value
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                self.misses += 1
+                inflight = Future()
+                self._inflight[key] = inflight
+            else:
+                self.collapsed += 1
+        if self.lookups is not None:
+            self.lookups.inc(result="miss" if leader else "collapsed")
+        if not leader:
+            return inflight.result()
+
+        try:
+            value = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._inflight.pop(key, None)
+        inflight.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "collapsed": self.collapsed,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
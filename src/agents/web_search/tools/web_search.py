@@ -1,40 +1,68 @@
+import logging
 import os
-from typing import List, Dict, Any
-from tavily import TavilyClient
+from typing import TYPE_CHECKING
 from strands import tool
+from common.deadline import Hedger, timeout_for
+from common.metrics import REGISTRY
+from tools.compaction import compact_results
+from tools.search_cache import SearchCache, make_key
+
+if TYPE_CHECKING:
+    from tavily import TavilyClient
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_TIME_RANGES = {"d", "w", "m", "y"}
 
-# グローバルに 1 度だけ初期化（agent 起動前に呼び出される想定）
-_api_key = os.getenv("TAVILY_API_KEY")
-_client: TavilyClient | None = None
-if _api_key:
-    _client = TavilyClient(api_key=_api_key)
+# キャッシュの効き・結果の圧縮量は GET /metrics で見る
+SEARCH_CACHE_LOOKUPS = REGISTRY.counter(
+    "web_search_cache_lookups_total", "Search cache lookups by result (hit / miss / collapsed).", labels=("result",),
+)
+SEARCH_RESULT_BYTES = REGISTRY.counter(
+    "web_search_result_bytes_total", "Search result bytes before (raw) and after (compact) compaction.", labels=("kind",),
+)
+
+# 同一クエリの繰り返し・同時実行をまとめて Tavily 呼び出しを減らす
+_cache = SearchCache(
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 512)),
+    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024)),
+    lookups=SEARCH_CACHE_LOOKUPS,
+)
+
+# LLM に渡す検索結果の予算（重複除去・抜粋後にこの範囲へ収める）
+RESULT_MAX_BYTES = int(os.getenv("SEARCH_RESULT_MAX_BYTES", 4000))
+RESULT_MAX_TOKENS = int(os.getenv("SEARCH_RESULT_MAX_TOKENS", 0)) or None
+RESULT_MAX_ITEMS = int(os.getenv("SEARCH_RESULT_MAX_ITEMS", 5))
+
+# Tavily 呼び出しはリクエストの残り時間で打ち切り、遅いときはヘッジできる（検索は冪等）
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 20))
+search_hedger = Hedger(
+    "tavily.search",
+    hedge=os.getenv("HEDGE_ENABLED", "false").lower() == "true",
+    quantile=float(os.getenv("HEDGE_QUANTILE", 0.95)),
+)
 
-def _ensure_client() -> TavilyClient:
-    print("ensure client")
+# 初回の検索（または warm_up）で 1 度だけ作る。tavily の import もそこまで遅らせる
+_client: "TavilyClient | None" = None
+
+def _ensure_client() -> "TavilyClient":
     global _client
     if _client is None:
         api_key = os.getenv("TAVILY_API_KEY")
         if not api_key:
             raise RuntimeError("環境変数 TAVILY_API_KEY が設定されていません")
+        from tavily import TavilyClient
+
         _client = TavilyClient(api_key=api_key)
     return _client
 
 
-def _format_results(resp: Dict[str, Any]) -> str:
-    results = resp.get("results", [])
-    if not results:
-        return "検索結果はありません。"
-    lines: List[str] = []
-    for i, r in enumerate(results, 1):
-        title = r.get("title") or "(no title)"
-        url = r.get("url") or ""
-        content = (r.get("content") or "").strip()
-        if len(content) > 300:
-            content = content[:300] + "..."
-        lines.append(f"[{i}] {title}\nURL: {url}\n{content}\n")
-    return "\n".join(lines).rstrip()
+def warm_up() -> None:
+    """起動時にクライアントを作っておく（キーがなければ最初の検索でエラーを返す）。"""
+    if _client is None and not os.getenv("TAVILY_API_KEY"):
+        logger.warning("TAVILY_API_KEY is not set; web_search will fail until it is configured")
+        return
+    _ensure_client()
 
 
 # include_domains: list[str] = []
@@ -54,7 +82,6 @@ def web_search(
     Returns:
         Strands Agent 互換の辞書 (status/content)
     """
-    print("run tool")
     if not query or not query.strip():
         return {"status": "error", "content": [{"text": "query は必須です"}]}
     if time_range and time_range not in ALLOWED_TIME_RANGES:
@@ -62,14 +89,34 @@ def web_search(
 
     try:
         client = _ensure_client()
-        resp = client.search(
-            query=query,
-            max_results=10,
-            time_range=time_range,
-            include_domains=include_domains,
+        resp = _cache.get_or_fetch(
+            make_key(query, time_range, include_domains),
+            lambda: search_hedger.call(
+                lambda: client.search(
+                    query=query,
+                    max_results=10,
+                    time_range=time_range,
+                    include_domains=include_domains,
+                    timeout=timeout_for(SEARCH_TIMEOUT),
+                ),
+                SEARCH_TIMEOUT,
+            ),
+        )
+        formatted, report = compact_results(
+            resp,
+            query,
+            max_bytes=RESULT_MAX_BYTES,
+            max_tokens=RESULT_MAX_TOKENS,
+            max_results=RESULT_MAX_ITEMS,
+        )
+        SEARCH_RESULT_BYTES.inc(report.raw_bytes, kind="raw")
+        SEARCH_RESULT_BYTES.inc(report.compact_bytes, kind="compact")
+        logger.info(
+            f"web_search compacted {report.results_in}->{report.results_out} results "
+            f"({report.duplicates} duplicates), {report.raw_bytes}->{report.compact_bytes} bytes "
+            f"(saved {report.saved_bytes}); cache {_cache.stats()}"
         )
-        formatted = _format_results(resp)
-        return {"status": "success", "content": [{"text": formatted}, {"json": resp}]}
+        return {"status": "success", "content": [{"text": formatted}]}
     except Exception as e:
         return {"status": "error", "content": [{"text": f"検索失敗: {type(e).__name__}: {e}"}]}
     
\ No newline at end of file